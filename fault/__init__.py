@@ -12,6 +12,8 @@ from .tester_samples import (SRAMTester, InvTester, BufTester,
 from .random import random_bit, random_bv
 from .util import clog2
 from .spice_target import A2DError
+from .regression import run_regression, write_stimulus_file
+from .tools import tool_versions
 
 from fault.property import (assert_, implies, delay, posedge, repeat, goto,
                             sequence, eventually, onehot0, onehot, countones,
@@ -217,18 +217,74 @@ class Delay(Action):
         return Delay(time=self.time)
 
 
+class Checkpoint(Action):
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+
+    def __str__(self):
+        return f'Checkpoint("{self.name}")'
+
+    def retarget(self, new_circuit, clock):
+        return Checkpoint(self.name)
+
+
+class Restore(Action):
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+
+    def __str__(self):
+        return f'Restore("{self.name}")'
+
+    def retarget(self, new_circuit, clock):
+        return Restore(self.name)
+
+
+class TraceOn(Action):
+    def __str__(self):
+        return 'TraceOn()'
+
+    def retarget(self, new_circuit, clock):
+        return TraceOn()
+
+
+class TraceOff(Action):
+    def __str__(self):
+        return 'TraceOff()'
+
+    def retarget(self, new_circuit, clock):
+        return TraceOff()
+
+
+class ShardBoundary(Action):
+    def __str__(self):
+        return 'ShardBoundary()'
+
+    def retarget(self, new_circuit, clock):
+        return ShardBoundary()
+
+
 class Step(Action):
-    def __init__(self, clock, steps):
+    def __init__(self, clock, steps, watch=None):
         super().__init__()
         # TODO(rsetaluri): Check if `clock` is a clock type?
         self.clock = clock
         self.steps = steps
+        # stop stepping early once this port changes
+        self.watch = watch
 
     def __str__(self):
+        if self.watch is not None:
+            return (f"Step({self.clock.debug_name}, steps={self.steps}, "
+                    f"watch={self.watch.debug_name})")
         return f"Step({self.clock.debug_name}, steps={self.steps})"
 
     def retarget(self, new_circuit, clock):
-        return Step(clock, self.steps)
+        watch = self.watch
+        if watch is not None:
+            watch = new_circuit.interface.ports[str(watch.name)]
+        return Step(clock, self.steps, watch)
 
 
 class Loop(Action):
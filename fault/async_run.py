@@ -0,0 +1,69 @@
+"""
+Support for the asyncio variants of the Tester API (`compile_async`,
+`run_async` and `compile_and_run_async`).
+
+Each compile or run step is executed in a worker thread, so that the event
+loop stays responsive while verilator, make or a simulator runs as a
+subprocess.  The number of steps running at once, across all Testers of the
+process, is bounded by a global limit that defaults to the number of cores
+available.
+"""
+import asyncio
+import functools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from fault.util import available_cores
+
+
+_max_concurrency = None
+# one semaphore per event loop, since asyncio primitives are bound to a loop
+_semaphores = weakref.WeakKeyDictionary()
+_executor = None
+
+
+def set_max_concurrency(n):
+    """
+    Limits the number of compile and run steps executing at once (None for
+    the number of available cores).  Applies to steps started afterwards.
+    """
+    global _max_concurrency, _executor
+    if n is not None and n < 1:
+        raise ValueError(f"Invalid concurrency limit: {n}")
+    _max_concurrency = n
+    _semaphores.clear()
+    if _executor is not None:
+        # running steps finish on the old executor
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+def get_max_concurrency():
+    if _max_concurrency is None:
+        return available_cores()
+    return _max_concurrency
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=get_max_concurrency(),
+                                       thread_name_prefix="fault")
+    return _executor
+
+
+def _semaphore():
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores[loop] = asyncio.Semaphore(get_max_concurrency())
+    return _semaphores[loop]
+
+
+async def run_limited(func, *args, **kwargs):
+    """
+    Calls `func(*args, **kwargs)` in a worker thread once a slot of the
+    global limit is free, and returns its result
+    """
+    async with _semaphore():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _get_executor(), functools.partial(func, *args, **kwargs))
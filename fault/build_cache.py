@@ -0,0 +1,119 @@
+import hashlib
+import os
+import shutil
+import uuid
+from pathlib import Path
+from fault.user_cfg import FaultConfig
+
+
+def default_build_cache_dir():
+    '''
+    Returns the root directory of the build cache.  The location can be
+    changed with the FAULT_BUILD_CACHE environment variable or with the
+    "build_cache_dir" option of the fault config files, and otherwise
+    defaults to ~/.cache/fault.
+    '''
+    if 'FAULT_BUILD_CACHE' in os.environ:
+        return Path(os.environ['FAULT_BUILD_CACHE'])
+    opts = FaultConfig().opts
+    if 'build_cache_dir' in opts:
+        return Path(os.path.expanduser(opts['build_cache_dir']))
+    return Path.home() / '.cache' / 'fault'
+
+
+def _update_hash(hasher, item):
+    # Feed "item" into "hasher" in a way that distinguishes between types, so
+    # that (for example) the list ['ab'] and the string 'ab' hash differently.
+    # Path objects are hashed by the contents of the file they point to.
+    if item is None:
+        hasher.update(b'N')
+    elif isinstance(item, Path):
+        hasher.update(b'P')
+        if item.is_file():
+            with open(item, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    hasher.update(chunk)
+        elif item.is_dir():
+            for child in sorted(item.iterdir()):
+                if child.is_file():
+                    _update_hash(hasher, child.name)
+                    _update_hash(hasher, child)
+        else:
+            _update_hash(hasher, str(item))
+    elif isinstance(item, bytes):
+        hasher.update(b'B' + str(len(item)).encode() + b':' + item)
+    elif isinstance(item, dict):
+        hasher.update(b'D' + str(len(item)).encode() + b':')
+        for key in sorted(item, key=str):
+            _update_hash(hasher, str(key))
+            _update_hash(hasher, item[key])
+    elif isinstance(item, (list, tuple)):
+        hasher.update(b'L' + str(len(item)).encode() + b':')
+        for elem in item:
+            _update_hash(hasher, elem)
+    else:
+        _update_hash(hasher, str(item).encode())
+
+
+def hash_build_inputs(*items):
+    '''
+    Returns a hex digest that uniquely identifies the build inputs "items".
+    Items may be strings, numbers, bytes, lists, tuples, dictionaries, or
+    Path objects (which are hashed by the contents of the file or directory
+    they point to).
+    '''
+    hasher = hashlib.sha256()
+    _update_hash(hasher, list(items))
+    return hasher.hexdigest()
+
+
+class BuildCache:
+    '''
+    Persistent, content-addressed store of build artifacts.  Each entry is a
+    directory keyed by a hash of the inputs used to produce it (see
+    hash_build_inputs).  Entries are written to a temporary location and
+    then renamed into place, so the cache can be shared safely by several
+    processes building the same design at the same time.
+    '''
+
+    def __init__(self, namespace, root=None):
+        if root is None:
+            root = default_build_cache_dir()
+        self.root = Path(root) / namespace
+        os.makedirs(self.root, exist_ok=True)
+
+    def entry(self, key):
+        return self.root / key
+
+    def contains(self, key):
+        return self.entry(key).is_dir()
+
+    def restore(self, key, dst):
+        '''
+        Copy the cached entry "key" to "dst", replacing "dst" if it exists.
+        File modification times are preserved so that make does not consider
+        restored artifacts out of date.  Returns True if the entry was found.
+        '''
+        if not self.contains(key):
+            return False
+        dst = Path(dst)
+        if dst.exists():
+            shutil.rmtree(dst)
+        shutil.copytree(self.entry(key), dst)
+        return True
+
+    def store(self, key, src, ignore=None):
+        '''
+        Copy the directory "src" into the cache as entry "key".  "ignore" has
+        the same meaning as in shutil.copytree.  If another process stored the
+        same entry first, the existing entry is kept.
+        '''
+        if self.contains(key):
+            return
+        tmp = self.root / f'.tmp-{uuid.uuid4().hex}'
+        shutil.copytree(src, tmp, ignore=ignore)
+        try:
+            os.rename(tmp, self.entry(key))
+        except OSError:
+            # lost the race against another process storing the same key
+            shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,149 @@
+"""
+Failure logs of generated test benches.
+
+By default, the generated test benches stop at the first failed expect.  With
+`collect_failures=True`, every failed expect instead appends a record to a
+binary failure log and the simulation keeps running.  After the run, the log
+is parsed into `ExpectFailure` objects, so a single run reports all failures.
+
+Log format (all fields little-endian), one record per failed expect:
+
+    u32(action index) u16(port) u8(kind) followed by kind specific fields:
+        FAILURE_VALUE  u64(got) u64(expected)
+        FAILURE_REAL   f64(got) f64(expected)
+        FAILURE_RANGE  f64(got) f64(above) f64(below)
+
+where port is an index into the list of port names kept by the target that
+generated the test bench, and a missing bound of a range check is NaN.
+Values wider than 64 bits are truncated to their 64 least significant bits.
+
+Without `collect_failures`, failed expects are reported by error messages of
+the simulator, which `parse_failure_messages` turns into the same objects.
+"""
+import math
+import re
+import struct
+
+
+FAILURE_VALUE = 0
+FAILURE_REAL = 1
+FAILURE_RANGE = 2
+
+_RECORD_HEADER = struct.Struct("<IHB")
+_FIELDS = {
+    FAILURE_VALUE: struct.Struct("<QQ"),
+    FAILURE_REAL: struct.Struct("<dd"),
+    FAILURE_RANGE: struct.Struct("<ddd"),
+}
+
+
+class ExpectFailure:
+    """
+    A failed expect of action `index` on `port`.  `expected` is None for range
+    checks, and `above`/`below` are None unless the check has that bound.
+    """
+
+    def __init__(self, index, port, got, expected=None, above=None,
+                 below=None):
+        self.index = index
+        self.port = port
+        self.got = got
+        self.expected = expected
+        self.above = above
+        self.below = below
+
+    def __str__(self):
+        hdr = f"Failed on action={self.index} checking port {self.port}"
+        if self.above is not None and self.below is not None:
+            msg = f"Expected {self.above} to {self.below}, got {self.got}"
+        elif self.above is not None:
+            msg = f"Expected above {self.above}, got {self.got}"
+        elif self.below is not None:
+            msg = f"Expected below {self.below}, got {self.got}"
+        elif isinstance(self.got, float):
+            msg = f"Expected {self.expected}, got {self.got}"
+        else:
+            msg = f"Expected {_hex(self.expected)}, got {_hex(self.got)}"
+        return f"{hdr}.  {msg}."
+
+    def __repr__(self):
+        return (f"ExpectFailure({self.index}, {self.port}, {self.got}, "
+                f"{self.expected}, {self.above}, {self.below})")
+
+
+def _hex(value):
+    # values parsed from messages may contain X or Z digits
+    return f"0x{value:x}" if isinstance(value, int) else str(value)
+
+
+# Error message of a failed expect in a generated test bench (see
+# SystemVerilogTarget.make_expect)
+_FAILURE_MESSAGE = re.compile(
+    r"Failed on action=(?P<index>\d+) checking port (?P<port>.+?)"
+    r"(?: with traceback .*?)?\.  Expected "
+    r"(?:(?P<above>\S+) to (?P<below>\S+)|above (?P<above_only>\S+)|"
+    r"below (?P<below_only>\S+)|(?P<expected>\S+)), "
+    r"got (?P<got>[0-9a-fA-FxXzZ_.+-]+?)\.?$")
+
+
+def _parse_hex(text):
+    try:
+        return int(text.replace("_", ""), 16)
+    except ValueError:
+        return text
+
+
+def parse_failure_messages(text):
+    """
+    Returns the list of `ExpectFailure`s reported by the error messages of
+    failed expects in `text` (the output of a simulation)
+    """
+    failures = []
+    for line in text.splitlines():
+        match = _FAILURE_MESSAGE.search(line.rstrip())
+        if match is None:
+            continue
+        index, port = int(match["index"]), match["port"]
+        if match["expected"] is not None:
+            failure = ExpectFailure(index, port, _parse_hex(match["got"]),
+                                    _parse_hex(match["expected"]))
+        else:
+            above = match["above"] or match["above_only"]
+            below = match["below"] or match["below_only"]
+            failure = ExpectFailure(
+                index, port, float(match["got"]),
+                above=float(above) if above is not None else None,
+                below=float(below) if below is not None else None)
+        failures.append(failure)
+    return failures
+
+
+def read_failure_log(filename, ports):
+    """
+    Returns the list of `ExpectFailure`s recorded in the failure log
+    `filename`, where `ports` maps the port indices of the log to names
+    """
+    with open(filename, "rb") as f:
+        data = f.read()
+    failures = []
+    offset = 0
+    while offset < len(data):
+        index, port, kind = _RECORD_HEADER.unpack_from(data, offset)
+        offset += _RECORD_HEADER.size
+        try:
+            fields = _FIELDS[kind]
+        except KeyError:
+            raise ValueError(f"Corrupt failure log {filename}: unknown kind "
+                             f"{kind} at offset {offset - 1}")
+        values = fields.unpack_from(data, offset)
+        offset += fields.size
+        if kind == FAILURE_RANGE:
+            got, above, below = values
+            failure = ExpectFailure(
+                index, ports[port], got,
+                above=None if math.isnan(above) else above,
+                below=None if math.isnan(below) else below)
+        else:
+            failure = ExpectFailure(index, ports[port], *values)
+        failures.append(failure)
+    return failures
@@ -8,3 +8,11 @@ class A2DError(FaultError):
 
 class ExpectError(FaultError):
     pass
+
+
+class ExpectFailures(ExpectError, AssertionError):
+    def __init__(self, failures):
+        self.failures = failures
+        msg = f"{len(failures)} expect(s) failed:\n"
+        msg += "\n".join(str(failure) for failure in failures)
+        super().__init__(msg)
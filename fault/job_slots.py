@@ -0,0 +1,110 @@
+"""
+Host-wide job slots shared by all fault processes.
+
+When several processes (e.g., pytest-xdist workers) build and simulate at
+the same time, each running "make -j" and simulators as if it had the whole
+machine, the host is oversubscribed and everything slows down.  Builds,
+simulations and SPICE runs therefore hold job slots while they run: a
+simulation holds one slot and make runs with one job per slot it holds.
+
+Slots are lock files in a directory shared by the processes of a user, so
+slots are released by the OS even if a process dies.  The total number of
+slots defaults to the number of CPUs and can be set with the FAULT_JOB_SLOTS
+environment variable or the "job_slots" option of the fault config files
+(0 disables throttling).  The directory can be changed with
+FAULT_JOB_SLOT_DIR or the "job_slot_dir" option.
+"""
+import contextlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from fault.user_cfg import FaultConfig
+try:
+    import fcntl
+except ImportError:
+    # no throttling on platforms without flock
+    fcntl = None
+
+
+def total_job_slots():
+    '''Returns the number of job slots of the host (0 if disabled)'''
+    if 'FAULT_JOB_SLOTS' in os.environ:
+        return int(os.environ['FAULT_JOB_SLOTS'])
+    opts = FaultConfig().opts
+    if 'job_slots' in opts:
+        return int(opts['job_slots'])
+    return os.cpu_count() or 1
+
+
+def job_slot_dir():
+    '''Returns the directory holding the lock files of the job slots'''
+    if 'FAULT_JOB_SLOT_DIR' in os.environ:
+        return Path(os.environ['FAULT_JOB_SLOT_DIR'])
+    opts = FaultConfig().opts
+    if 'job_slot_dir' in opts:
+        return Path(os.path.expanduser(opts['job_slot_dir']))
+    user = os.getuid() if hasattr(os, 'getuid') else 'user'
+    return Path(tempfile.gettempdir()) / f'fault-job-slots-{user}'
+
+
+def _try_lock(path):
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _release(fds):
+    for fd in fds:
+        # closing the file releases the lock
+        os.close(fd)
+
+
+def _try_acquire(directory, total, num, extra):
+    # Grabs free slots until num + extra are held.  Either at least num
+    # slots are returned, or none (so that processes waiting for several
+    # slots don't hold some of them while waiting)
+    fds = []
+    for k in range(total):
+        fd = _try_lock(directory / f'slot-{k}.lock')
+        if fd is not None:
+            fds.append(fd)
+            if len(fds) == num + extra:
+                break
+    if len(fds) < num:
+        _release(fds)
+        return []
+    return fds
+
+
+@contextlib.contextmanager
+def hold_job_slots(num=1, extra=0, poll_interval=0.5):
+    '''
+    Holds `num` job slots, waiting until they are free, plus up to `extra`
+    more slots if they are free right away.  Yields the number of slots
+    held, which is what a job may use (e.g., as the number of make jobs).
+    `num` is clamped to the total number of slots.
+    '''
+    total = total_job_slots()
+    if total <= 0 or fcntl is None or num + extra == 0:
+        yield num + extra
+        return
+    num = min(num, total)
+    directory = job_slot_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    delay = 0.01
+    while True:
+        fds = _try_acquire(directory, total, num, extra)
+        if fds:
+            break
+        time.sleep(delay)
+        delay = min(2 * delay, poll_interval)
+    try:
+        yield len(fds)
+    finally:
+        _release(fds)
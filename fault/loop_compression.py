@@ -0,0 +1,228 @@
+"""
+Loop compression for generated test benches.
+
+Testers built from test vectors (e.g. `generate_random_test_vectors`,
+`SequenceTester` or the cell testers) contain long runs of actions with the
+same shape (the same sequence of pokes, evals, steps and expects on the same
+ports) that only differ in the constants being poked and expected.  This pass
+finds such runs and replaces them by a single loop over a constant table, so
+the size of the generated code no longer grows with the number of vectors.
+Expects of AnyValue (don't-cares) in a run are only checked in the iterations
+marked by an extra column of the table.
+"""
+import magma as m
+from hwtypes import BitVector, Bit
+import fault.actions as actions
+from fault.select_path import SelectPath
+from fault.value import AnyValue
+
+
+# Runs with fewer iterations than this are left unrolled
+MIN_LOOP_ITERS = 4
+# Maximum number of actions in the body of a compressed loop
+MAX_LOOP_BODY = 64
+# Table entries are stored as 64-bit unsigned integers
+TABLE_WIDTH = 64
+
+
+class CompressedLoop(actions.Action):
+    """
+    `n_iter` repetitions of `body`, starting at action index `start` of the
+    original action list.  Pokes and expects in `body` whose values vary
+    across iterations refer to column `k` of row `loop_var` of the constant
+    table `table_name` through the string returned by `table_ref`.  `table`
+    is None if no value varies across iterations.
+    """
+
+    def __init__(self, start, n_iter, body, table, table_name, loop_var):
+        self.start = start
+        self.n_iter = n_iter
+        self.body = body
+        self.table = table
+        self.table_name = table_name
+        self.loop_var = loop_var
+
+    def index(self, j):
+        """
+        Expression computing the original index of action `j` of the body
+        """
+        return f"({self.start} + {len(self.body)} * {self.loop_var} + {j})"
+
+    def __str__(self):
+        return f"CompressedLoop({self.n_iter}, {self.body})"
+
+    def retarget(self, new_circuit, clock):
+        raise NotImplementedError("CompressedLoop is only used for code "
+                                  "generation and cannot be retargeted")
+
+
+def table_ref(table_name, loop_var, column):
+    return f"{table_name}[{loop_var}][{column}]"
+
+
+def _port_key(port):
+    # Ports are compared by identity, accessing a top-level port through the
+    # circuit wrapper (tester.circuit.I) is the same as using the port itself
+    if isinstance(port, SelectPath):
+        if len(port.path) > 2:
+            return None
+        port = port[-1]
+    if not isinstance(port, (m.Digital, m.Array)):
+        return None
+    if isinstance(port, m.Array) and not issubclass(port.T, m.Digital):
+        return None
+    return id(port)
+
+
+def _port_width(port):
+    if isinstance(port, SelectPath):
+        port = port[-1]
+    if isinstance(port, m.Digital):
+        return 1
+    return len(port)
+
+
+def _const_value(port, value):
+    """
+    Returns `value` as an unsigned integer if it is a constant that can be
+    stored in a table, otherwise None
+    """
+    width = _port_width(port)
+    if width > TABLE_WIDTH:
+        return None
+    if isinstance(value, Bit):
+        return int(value)
+    if isinstance(value, BitVector):
+        if value.num_bits > TABLE_WIDTH:
+            return None
+        return value.as_uint()
+    if isinstance(value, int):
+        # includes bool
+        return int(value) & ((1 << width) - 1)
+    return None
+
+
+def _action_key(action):
+    """
+    Returns a hashable key describing the shape of `action`, or None if the
+    action cannot be part of a compressed loop.  Two actions with the same key
+    only differ in their constant value.
+    """
+    if isinstance(action, actions.Poke):
+        port = _port_key(action.port)
+        if port is None or action.delay is not None or \
+                _const_value(action.port, action.value) is None:
+            return None
+        return ("poke", port)
+    if isinstance(action, actions.Expect):
+        port = _port_key(action.port)
+        if port is None or action.above is not None or \
+                action.below is not None or action.msg is not None or \
+                action.traceback is not None:
+            return None
+        if action.value is not AnyValue and \
+                _const_value(action.port, action.value) is None:
+            return None
+        return ("expect", port, action.strict)
+    if isinstance(action, actions.Eval):
+        return ("eval",)
+    if isinstance(action, actions.Step):
+        port = _port_key(action.clock)
+        if port is None or action.watch is not None:
+            return None
+        return ("step", port, action.steps)
+    return None
+
+
+def _find_run(keys, start, min_iters, max_body):
+    """
+    Returns (period, n_iter) of the longest run of repeated key sequences
+    beginning at `start`, or None if there is no run of at least `min_iters`
+    iterations.
+    """
+    best = None
+    for period in range(1, max_body + 1):
+        end = start + period
+        if end > len(keys) or keys[end - 1] is None:
+            break
+        length = period
+        while start + length < len(keys) and \
+                keys[start + length] == keys[start + length - period]:
+            length += 1
+        n_iter = length // period
+        if n_iter >= min_iters and \
+                (best is None or n_iter * period > best[0] * best[1]):
+            best = (period, n_iter)
+    return best
+
+
+def compress_actions(action_list, min_iters=MIN_LOOP_ITERS,
+                     max_body=MAX_LOOP_BODY, offset=0):
+    """
+    Returns a list of (index, action) pairs where runs of repeated action
+    shapes in `action_list` are replaced by CompressedLoop actions.  The
+    index is `offset` plus the position of the (first) action in
+    `action_list`, so error messages refer to the same actions as without
+    compression.
+    """
+    keys = [_action_key(action) for action in action_list]
+    result = []
+    i = 0
+    while i < len(action_list):
+        run = None
+        if keys[i] is not None:
+            run = _find_run(keys, i, min_iters, max_body)
+        if run is None:
+            result.append((offset + i, action_list[i]))
+            i += 1
+            continue
+        period, n_iter = run
+        result.append((offset + i, _make_loop(action_list, i, period, n_iter,
+                                              f"fault_table_{i}",
+                                              f"fault_loop_{i}", offset)))
+        i += period * n_iter
+    return result
+
+
+def _make_loop(action_list, start, period, n_iter, table_name, loop_var,
+               offset=0):
+    # Collect the constants of each body action across iterations, values
+    # that are the same in every iteration are left inline
+    columns = []
+    body = []
+    for j in range(period):
+        action = action_list[start + j]
+        if not isinstance(action, (actions.Poke, actions.Expect)):
+            body.append(action)
+            continue
+        values = [action_list[start + k * period + j].value
+                  for k in range(n_iter)]
+        values = [value if value is AnyValue else
+                  _const_value(action.port, value) for value in values]
+        if all(value == values[0] for value in values):
+            body.append(action)
+            continue
+        if isinstance(action, actions.Poke):
+            body.append(actions.Poke(
+                action.port, table_ref(table_name, loop_var, len(columns))))
+            columns.append(values)
+            continue
+        expect = actions.Expect(
+            action.port, table_ref(table_name, loop_var, len(columns)),
+            strict=action.strict)
+        if AnyValue not in values:
+            body.append(expect)
+            columns.append(values)
+            continue
+        # don't-cares: the expected value (0 if don't-care) and whether it
+        # is checked
+        columns.append([0 if value is AnyValue else value
+                        for value in values])
+        care = table_ref(table_name, loop_var, len(columns))
+        columns.append([int(value is not AnyValue) for value in values])
+        body.append(actions.If(care, [expect]))
+    table = None
+    if columns:
+        table = [[column[k] for column in columns] for k in range(n_iter)]
+    return CompressedLoop(offset + start, n_iter, body, table, table_name,
+                          loop_var)
@@ -0,0 +1,82 @@
+"""
+Cache of the files generated by magma for a circuit.
+
+Generating Verilog for a large design takes a long time, and the same
+circuit is typically compiled again for every target and test.  Entries of
+the cache are keyed by a hash of the circuit definition (including the
+definitions it instantiates and the Verilog sources they are defined from),
+the magma output format and options, and the versions of magma and coreir.
+"""
+import os
+import shutil
+import tempfile
+from importlib import metadata
+from pathlib import Path
+from fault.build_cache import BuildCache, hash_build_inputs
+
+
+def _package_version(name):
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _definitions(circuit):
+    # The circuit and every definition instanced below it, once each
+    seen = {}
+    stack = [circuit]
+    while stack:
+        defn = stack.pop()
+        if id(defn) in seen:
+            continue
+        seen[id(defn)] = defn
+        stack.extend(type(inst) for inst in getattr(defn, 'instances', []))
+    return list(seen.values())
+
+
+def circuit_key_items(circuit):
+    '''
+    Returns the items identifying the definition of `circuit` for
+    hash_build_inputs
+    '''
+    items = []
+    for defn in sorted(_definitions(circuit), key=lambda d: str(d.name)):
+        items.append(repr(defn))
+        # circuits defined from Verilog are identified by their source
+        for attr in ['verilog_file_name', 'verilogFile']:
+            value = getattr(defn, attr, None)
+            if isinstance(value, str) and value:
+                path = Path(value)
+                items.append(path if path.is_file() else value)
+    return items
+
+
+def magma_cache_key(circuit, basename, output, opts):
+    return hash_build_inputs(
+        circuit_key_items(circuit),
+        basename,
+        output,
+        opts,
+        _package_version('magma-lang'),
+        _package_version('coreir')
+    )
+
+
+def compile_cached(compile_fn, directory, basename, key, cache_dir=None):
+    '''
+    Makes the files generated by `compile_fn(prefix)` for the file prefix
+    `basename` available in `directory`, copying them from the entry `key`
+    of the cache if present, and otherwise generating and storing them.
+    Returns True on a cache hit.
+    '''
+    cache = BuildCache("magma", cache_dir)
+    hit = cache.contains(key)
+    if not hit:
+        # generate the files in isolation, so that only they are stored
+        with tempfile.TemporaryDirectory(dir=cache.root) as tmp:
+            compile_fn(os.path.join(tmp, basename))
+            cache.store(key, tmp)
+    for name in os.listdir(cache.entry(key)):
+        shutil.copy2(cache.entry(key) / name, Path(directory) / name)
+    return hit
@@ -110,7 +110,11 @@ class MagmaSimulatorTarget(Target):
                 if self.clock is not action.clock:
                     raise RuntimeError(f"Using different clocks: {self.clock}, "
                                        f"{action.clock}")
+                if action.watch is not None:
+                    raise NotImplementedError(action)
                 simulator.evaluate()
                 simulator.advance(action.steps)
+            elif isinstance(action, fault.actions.ShardBoundary):
+                continue
             else:
                 raise NotImplementedError(action)
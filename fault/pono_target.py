@@ -18,9 +18,12 @@ def get_width(port):
 class PonoTarget(VerilogTarget):
     def __init__(self, circuit, directory="build/", skip_compile=False,
                  include_verilog_libraries=[], magma_output="coreir-verilog",
-                 circuit_name=None, magma_opts={}, solver="btor"):
+                 circuit_name=None, magma_opts={}, solver="btor",
+                 use_magma_cache=False, build_cache_dir=None):
         super().__init__(circuit, circuit_name, directory, skip_compile,
-                         include_verilog_libraries, magma_output, magma_opts)
+                         include_verilog_libraries, magma_output, magma_opts,
+                         use_magma_cache=use_magma_cache,
+                         build_cache_dir=build_cache_dir)
         self.state_index = 0
         self.curr_state_pokes = []
         self.step_offset = 0
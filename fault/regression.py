@@ -0,0 +1,154 @@
+"""
+Run many independent tests of the same circuit against a single compiled
+Verilator model.
+
+The model is built once with the data-driven driver (see
+`fault.verilator_stream`), then each test is encoded into its own stimulus
+file and the simulations are run concurrently, bounded by the number of
+available cores.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import fault.actions as actions
+from fault.subprocess_run import subprocess_run
+from fault.util import available_cores
+from fault.tester.base import TesterBase
+from fault.verilator_stream import encode_stimulus, stream_ports
+from fault.verilator_target import VerilatorTarget
+
+
+class RegressionResult:
+    """
+    Outcome of a single test run by `run_regression`
+    """
+
+    def __init__(self, name, returncode, stdout, stderr):
+        self.name = name
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+
+    @property
+    def passed(self):
+        return self.returncode == 0
+
+    def __str__(self):
+        status = "passed" if self.passed else "failed"
+        return f"RegressionResult({self.name}, {status})"
+
+    def __repr__(self):
+        return str(self)
+
+
+def write_stimulus_file(circuit, action_list, filename):
+    """
+    Encode `action_list` for `circuit` and write it to `filename`, so that it
+    can be passed to `run_regression` later
+    """
+    with open(filename, "wb") as f:
+        f.write(encode_stimulus(action_list, stream_ports(circuit)))
+
+
+def _normalize_tests(tests):
+    # Returns a list of (name, action list or stimulus file) pairs
+    if isinstance(tests, dict):
+        items = list(tests.items())
+    else:
+        items = []
+        for k, test in enumerate(tests):
+            if isinstance(test, (str, Path)):
+                name = Path(test).stem
+            else:
+                name = f"test_{k}"
+            items.append((name, test))
+    result = []
+    for name, test in items:
+        if isinstance(test, TesterBase):
+            test = test.actions
+        elif isinstance(test, (str, Path)):
+            test = Path(test).resolve()
+        result.append((name, test))
+    return result
+
+
+def run_regression(tests, circuit=None, directory="build/", max_workers=None,
+                   disp_type="on_error", **kwargs):
+    """
+    Run independent tests of the same circuit concurrently against one
+    verilated model, returning a list of RegressionResult objects (in the
+    order of `tests`).  A failing test does not stop the other tests.
+
+    `tests`: list (or dictionary mapping names to tests) of Tester objects,
+    action lists, or paths of stimulus files written by `write_stimulus_file`
+    `circuit`: the circuit under test, defaults to the circuit of the first
+    Tester in `tests`.  All Testers must test this circuit, since they share
+    its model.
+    `directory`: directory used to build the model and store the stimulus
+    files of each test
+    `max_workers`: maximum number of concurrent simulations, defaults to the
+    number of available cores
+    `kwargs`: other keyword arguments of VerilatorTarget (e.g. `flags`,
+    `use_build_cache`)
+    """
+    values = tests.values() if isinstance(tests, dict) else tests
+    testers = [test for test in values if isinstance(test, TesterBase)]
+    if circuit is None:
+        if not testers:
+            raise ValueError("A circuit is required when no Tester objects "
+                             "are given")
+        circuit = testers[0]._circuit
+    for tester in testers:
+        if tester._circuit is not circuit:
+            raise ValueError(f"Cannot run a test of {tester._circuit.name} "
+                             f"against the model of {circuit.name}")
+    tests = _normalize_tests(tests)
+    if max_workers is None:
+        max_workers = available_cores()
+
+    # Build the model and the generic driver once
+    target = VerilatorTarget(circuit, directory=directory, data_driven=True,
+                             disp_type=disp_type, **kwargs)
+    target.generate_test_bench([])
+    target.build_executable()
+    ports = stream_ports(circuit)
+
+    test_dir = Path(target.directory).resolve() / "regression"
+    os.makedirs(test_dir, exist_ok=True)
+    exe = f"./obj_dir/V{target.circuit_name}"
+
+    def run_test(k, name, test):
+        # names may repeat (e.g. stimulus files with the same name in
+        # different directories), so files are prefixed by the test index
+        value_file = test_dir / f"{k}_{name}_values.txt"
+        if isinstance(test, Path):
+            stimulus_file = test
+        else:
+            stimulus_file = test_dir / f"{k}_{name}.bin"
+            with open(stimulus_file, "wb") as f:
+                f.write(encode_stimulus(test, ports))
+        result = subprocess_run([exe, str(stimulus_file), str(value_file)],
+                                cwd=target.directory, disp_type=disp_type,
+                                chk_ret_code=False, job_slots=1)
+        if result.returncode == 0 and not isinstance(test, Path):
+            get_value_actions = [action for action in test
+                                 if isinstance(action, actions.GetValue)]
+            if get_value_actions:
+                with open(value_file, "r") as f:
+                    lines = f.readlines()
+                for line, action in zip(lines, get_value_actions):
+                    action.update_from_line(line)
+        return RegressionResult(name, result.returncode, result.stdout,
+                                result.stderr)
+
+    logging.info(f"Running {len(tests)} tests with {max_workers} workers")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_test, k, name, test)
+                   for k, (name, test) in enumerate(tests)]
+        results = [future.result() for future in futures]
+    failed = [result.name for result in results if not result.passed]
+    if failed:
+        logging.info(f"{len(failed)} of {len(results)} tests failed: "
+                     f"{', '.join(failed)}")
+    return results
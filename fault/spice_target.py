@@ -10,7 +10,8 @@ from fault.ms_types import RealInOut
 from fault.result_parse import nut_parse, hspice_parse, psf_parse
 from fault.subprocess_run import subprocess_run
 from fault.pwl import pwc_to_pwl
-from fault.actions import Poke, Expect, Delay, Print, GetValue, Eval
+from fault.actions import (Poke, Expect, Delay, Print, GetValue, Eval,
+                           ShardBoundary)
 from fault.select_path import SelectPath
 from .fault_errors import A2DError, ExpectError
 
@@ -230,7 +231,7 @@ class SpiceTarget(Target):
         # run the simulation commands
         if not self.no_run:
             subprocess_run(cmd, cwd=self.directory, env=self.sim_env,
-                           disp_type=self.disp_type)
+                           disp_type=self.disp_type, job_slots=1)
 
         # process the results
         for raw_file in raw_files:
@@ -336,7 +337,7 @@ class SpiceTarget(Target):
                 gets.append((t, action))
             elif isinstance(action, Delay):
                 t += action.time
-            elif isinstance(action, Eval):
+            elif isinstance(action, (Eval, ShardBoundary)):
                 continue
             else:
                 raise NotImplementedError(action)
@@ -1,7 +1,13 @@
+import os
 import shlex
 import re
-from subprocess import Popen, PIPE, CompletedProcess
+import selectors
+import signal
+import time
+from collections import deque
+from subprocess import Popen, PIPE, CompletedProcess, TimeoutExpired
 from fault.user_cfg import FaultConfig
+from fault.job_slots import hold_job_slots
 
 
 # Terminal formatting codes
@@ -12,10 +18,23 @@ BRIGHT = '\x1b[1m'
 RESET_ALL = '\x1b[0m'
 
 
+class SubprocessRunError(AssertionError):
+    '''
+    Raised by subprocess_run if the subprocess failed.  `result` is a
+    CompletedProcess with the output of the subprocess (its tail if a log file
+    was written), so that callers can report what went wrong.
+    '''
+
+    def __init__(self, errors, result):
+        super().__init__('\n'.join(errors))
+        self.result = result
+
+
 class PrintDisplay:
-    def __init__(self, mode):
+    def __init__(self, mode, max_lines=None):
         self.mode = mode
-        self.lines = []
+        # in 'on_error' mode, only the last max_lines lines are kept
+        self.lines = deque(maxlen=max_lines)
 
     def print(self, line):
         line = line.rstrip()
@@ -31,30 +50,62 @@ class PrintDisplay:
             for line in self.lines:
                 print(line)
 
-    def process_output(self, ouput_str, name):
-        # generic line-processing function to display lines
-        # as they are produced as output in and check for errors.
+    def open_tag(self, name):
+        self.print(MAGENTA + BRIGHT + f'<{name}>' + RESET_ALL)
+
+    def close_tag(self, name):
+        self.print(MAGENTA + BRIGHT + f'</{name}>' + RESET_ALL)
+
 
-        retval = ''
-        any_line = False
-        for line in ouput_str.splitlines():
-            # Add line to value to be returned
-            retval += line
+def stream_lines(p, timeout=None):
+    # Yields (stream name, line) pairs from the STDOUT and STDERR pipes of
+    # the process "p" as they are produced.  If the output is not complete
+    # after "timeout" seconds, a final (None, None) pair is yielded.
+    deadline = None if timeout is None else time.monotonic() + timeout
+    sel = selectors.DefaultSelector()
+    sel.register(p.stdout, selectors.EVENT_READ, 'STDOUT')
+    sel.register(p.stderr, selectors.EVENT_READ, 'STDERR')
+    partial = {'STDOUT': b'', 'STDERR': b''}
+    try:
+        while sel.get_map():
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    yield None, None
+                    return
+            for key, _ in sel.select(remaining):
+                name = key.data
+                data = os.read(key.fd, 1 << 16)
+                if not data:
+                    sel.unregister(key.fileobj)
+                    if partial[name]:
+                        yield name, partial[name].decode(errors='replace')
+                    continue
+                *lines, partial[name] = (partial[name] + data).split(b'\n')
+                for line in lines:
+                    yield name, line.decode(errors='replace')
+    finally:
+        sel.close()
 
-            # Display opening text if needed
-            if not any_line:
-                any_line = True
-                self.print(MAGENTA + BRIGHT + f'<{name}>' + RESET_ALL)
 
-            # display if desired
-            self.print(line)
+def signal_process_group(p, sig):
+    # The subprocess is started in a new session, so signaling its process
+    # group also reaches the children of a shell (shell=True)
+    try:
+        os.killpg(p.pid, sig)
+    except ProcessLookupError:
+        pass
 
-        # Display closing text if needed
-        if any_line:
-            self.print(MAGENTA + BRIGHT + f'</{name}>' + RESET_ALL)
 
-        # Return the full output contents for further processing
-        return retval
+def stop_process(p, grace_period=5):
+    # Ask the process to terminate, then kill it if it doesn't
+    signal_process_group(p, signal.SIGTERM)
+    try:
+        p.wait(timeout=grace_period)
+    except TimeoutExpired:
+        signal_process_group(p, signal.SIGKILL)
+        p.wait()
 
 
 def error_detected(text, err_str):
@@ -76,7 +127,9 @@ def error_detected(text, err_str):
 
 
 def subprocess_run(args, cwd=None, env=None, disp_type='on_error', err_str=None,
-                   chk_ret_code=True, shell=False, use_fault_cfg=True):
+                   chk_ret_code=True, shell=False, use_fault_cfg=True,
+                   max_errors=1, timeout=None, log_file=None, tail_lines=1000,
+                   job_slots=0, stop_str=None):
     # "Deluxe" version of subprocess.run that can display STDOUT lines as they
     # come in, looks for errors in STDOUT and STDERR (raising an exception if
     # one is found), and can check the return code from the subprocess
@@ -111,13 +164,31 @@ def subprocess_run(args, cwd=None, env=None, disp_type='on_error', err_str=None,
     #        Verilator)
     # use_fault_cfg: If True (default) and env is None, then use FaultConfig
     #                to fill in default environment variables.
+    # max_errors: Output is checked for "err_str" as it is produced, and the
+    #             subprocess is terminated as soon as "max_errors" lines
+    #             matching it were found.  If None, the subprocess always runs
+    #             to completion.
+    # stop_str: If not None, only lines matching this pattern (same format
+    #           as "err_str") count towards "max_errors", while lines matching
+    #           "err_str" are still reported as errors.  This allows to stop
+    #           on lines that carry the actual error message, rather than on
+    #           a header that precedes it.
+    # timeout: If not None, the subprocess is terminated (and an
+    #          AssertionError raised) if it runs for longer than "timeout"
+    #          seconds.
+    # log_file: If not None, every line of STDOUT and STDERR is written to
+    #           this file as it is produced, and only the last "tail_lines"
+    #           lines of each are kept in memory (and returned).
+    # job_slots: Number of host-wide job slots (see fault.job_slots) held
+    #            while the subprocess runs, waiting for them if needed.
 
     # set defaults
     if env is None and use_fault_cfg:
         env = FaultConfig().get_sim_env()
+    max_lines = None if log_file is None else tail_lines
 
     # set up printing
-    display = PrintDisplay(mode=disp_type)
+    display = PrintDisplay(mode=disp_type, max_lines=max_lines)
 
     # print out the command in a format that can be copy-pasted
     # directly into a terminal (i.e., with proper quoting of arguments)
@@ -130,27 +201,83 @@ def subprocess_run(args, cwd=None, env=None, disp_type='on_error', err_str=None,
 
     # run the subprocess
     err_msg = []
-    with Popen(args, cwd=cwd, env=env, stdout=PIPE, stderr=PIPE, bufsize=1,
-               universal_newlines=True, shell=shell) as p:
+    output = {'STDOUT': deque(maxlen=max_lines),
+              'STDERR': deque(maxlen=max_lines)}
+    found_err = {'STDOUT': False, 'STDERR': False}
+    num_errors = 0
+    aborted = False
+    log = open(log_file, 'w') if log_file is not None else None
+    try:
+        with hold_job_slots(job_slots), \
+                Popen(args, cwd=cwd, env=env, stdout=PIPE, stderr=PIPE,
+                      bufsize=0, shell=shell, start_new_session=True) as p:
+            # STDOUT is displayed (and all output checked for errors) line by
+            # line as it is produced, so that failing runs can be stopped
+            # early.  The selector runs in this thread since pytest does not
+            # detect exceptions in child threads.
+            lines = stream_lines(p, timeout=timeout)
+            try:
+                for name, line in lines:
+                    if name is None:
+                        err_msg += [f'Timed out after {timeout} seconds.']
+                        aborted = True
+                        break
+                    if name == 'STDOUT':
+                        if not output['STDOUT']:
+                            display.open_tag('STDOUT')
+                        display.print(line)
+                    output[name].append(line)
+                    if log is not None:
+                        log.write(line + '\n')
 
-        # print out STDOUT, then STDERR
-        # threads could be used here but pytest does not detect exceptions
-        # in child threads, so for now the outputs are printed sequentially
-        stdout, stderr = p.communicate()
-        stdout = display.process_output(stdout, name='STDOUT')
-        stderr = display.process_output(stderr, name='STDERR')
+                    # look for errors in STDOUT or STDERR
+                    counted = False
+                    if err_str is not None and error_detected(line, err_str):
+                        found_err[name] = True
+                        counted = stop_str is None
+                    if stop_str is not None and error_detected(line, stop_str):
+                        counted = True
+                    if counted:
+                        num_errors += 1
+                        if max_errors is not None and num_errors >= max_errors:
+                            aborted = True
+                            break
+            except BaseException:
+                # the subprocess is in its own session and doesn't receive
+                # a Ctrl-C from the terminal, so stop it explicitly
+                stop_process(p)
+                raise
+            lines.close()
+            if aborted:
+                stop_process(p)
+            else:
+                p.wait()
 
-        # get return code and check result if desired
+        if output['STDOUT']:
+            display.close_tag('STDOUT')
+        if output['STDERR']:
+            display.open_tag('STDERR')
+            for line in output['STDERR']:
+                display.print(line)
+            display.close_tag('STDERR')
+    finally:
+        if log is not None:
+            log.close()
+    stdout = '\n'.join(output['STDOUT'])
+    stderr = '\n'.join(output['STDERR'])
 
-        if chk_ret_code and p.returncode:
-            err_msg += [f'Got return code {p.returncode}.']
+    # get return code and check result if desired (a terminated process
+    # fails because of the error that stopped it)
+    if chk_ret_code and p.returncode and not aborted:
+        err_msg += [f'Got return code {p.returncode}.']
+    for name in ['STDOUT', 'STDERR']:
+        if found_err[name]:
+            err_msg += [f'Found error pattern "{err_str}" in {name}.']
+    if aborted and num_errors:
+        err_msg += [f'Stopped the process after {num_errors} error(s).']
 
-        # look for errors in STDOUT or STDERR
-        if err_str is not None:
-            if error_detected(stdout, err_str):
-                err_msg += [f'Found error pattern "{err_str}" in STDOUT.']
-            if error_detected(stderr, err_str):
-                err_msg += [f'Found error pattern "{err_str}" in STDERR.']
+    result = CompletedProcess(args=args, returncode=p.returncode,
+                              stdout=stdout, stderr=stderr)
 
     # if any errors were found, print out STDOUT and STDERR if they haven't
     # already been printed, then print out what the error(s) were and
@@ -160,8 +287,7 @@ def subprocess_run(args, cwd=None, env=None, disp_type='on_error', err_str=None,
         print(RED + BRIGHT + f'Found {len(err_msg)} error(s):' + RESET_ALL)
         for k, e in enumerate(err_msg):
             print(RED + BRIGHT + f'{k+1}) {e}' + RESET_ALL)
-        raise AssertionError
+        raise SubprocessRunError(err_msg, result)
 
     # if there were no errors, then return directly
-    return CompletedProcess(args=args, returncode=p.returncode,
-                            stdout=stdout, stderr=stderr)
+    return result
@@ -6,17 +6,28 @@ from .util import (is_valid_file_mode, file_mode_allows_reading,
 import magma as m
 from pathlib import Path
 import fault.actions as actions
-from fault.actions import FileOpen, FileClose, GetValue, Loop, If
+from fault.actions import (FileOpen, FileClose, GetValue, Loop, If,
+                           ShardBoundary)
 from hwtypes import (BitVector, AbstractBitVectorMeta, AbstractBit,
                      AbstractBitVector, Bit)
 import fault.value_utils as value_utils
 from fault.select_path import SelectPath
 from fault.wrapper import PortWrapper
-from fault.subprocess_run import subprocess_run
+from fault.subprocess_run import subprocess_run, SubprocessRunError
 import fault
 import fault.expression as expression
 from fault.ms_types import RealType
+from fault.failure_log import (FAILURE_VALUE, FAILURE_REAL, FAILURE_RANGE,
+                               parse_failure_messages)
+import fault.value_file as value_file
+from fault.build_cache import BuildCache, hash_build_inputs
+from fault.tools import tool_version
+from fault.fault_errors import ExpectFailures
+import copy
 import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from numbers import Number
 
 
@@ -61,7 +72,12 @@ class SystemVerilogTarget(VerilogTarget):
                  disp_type='on_error', waveform_file=None, coverage=False,
                  use_kratos=False, use_sva=False, skip_run=False,
                  no_top_module=False, vivado_use_system_verilog=True,
-                 disable_ndarray=False, fsdb_dumpvars_args=""):
+                 disable_ndarray=False, fsdb_dumpvars_args="",
+                 compress_loops=False, collect_failures=False,
+                 get_value_format='text', timeout=None,
+                 use_magma_cache=False, build_cache_dir=None,
+                 reuse_snapshot=False, vector_files=False, shard_jobs=None,
+                 max_errors=1, dump_scope=None, dump_depth=None):
         """
         circuit: a magma circuit
 
@@ -142,6 +158,17 @@ class SystemVerilogTarget(VerilogTarget):
         waveform_file: name of file to dump waveforms (default is
                        "waveform.vcd" for ncsim and "waveform.vpd" for vcs)
 
+        dump_scope: If not None, only dump the waveforms of this instance,
+                    given by its hierarchical path within the DUT (e.g.
+                    "core.alu")
+
+        dump_depth: If not None, number of levels of hierarchy dumped,
+                    counting the dumped scope as the first one (as in
+                    $dumpvars).  By default, all levels are dumped.
+
+        Dumping can also be paused around regions that are not under debug
+        with `tester.trace_off()` and `tester.trace_on()`.
+
         use_kratos: If True, set the environment up for debugging in kratos
 
         skip_run: If True, generate all the files (testbench, tcl, etc.) but do
@@ -163,6 +190,67 @@ class SystemVerilogTarget(VerilogTarget):
 
         fsdb_dumpvars_args: (optional) arguments to the `fsdbDumpvars()`
                             function
+
+        compress_loops: If True, replace runs of actions that only differ in
+                        the constants being poked and expected (e.g. test
+                        vectors) by loops over constant tables in the
+                        generated testbench.
+
+        collect_failures: If True, failed expects do not raise $error but
+                          are written to a binary failure log (see
+                          fault.failure_log) and the simulation keeps
+                          running.  After the run, all failures are raised
+                          together in a single ExpectFailures exception.
+
+        get_value_format: 'text' (default) writes the results of get_value
+                          as lines of text, 'binary' as 8-byte slots that
+                          are read back without parsing (see
+                          fault.value_file) and are also available as NumPy
+                          arrays through get_value_arrays.  'binary' does
+                          not support ports wider than 64 bits.
+
+        timeout: If not None, the simulation is stopped (and fails) after
+                 running for this many seconds.
+
+        use_magma_cache: If True, reuse the Verilog generated by magma for the
+                         same circuit definition and options from the build
+                         cache (see fault.magma_cache).
+
+        build_cache_dir: Root directory of the build cache (see
+                         fault.build_cache.default_build_cache_dir for the
+                         default).
+
+        reuse_snapshot: If True, compile the DUT once per set of sources and
+                        options, and reuse the compiled design across runs
+                        (stored in the build cache), so that only the
+                        testbench is compiled for each test.  A testbench
+                        identical to the one of the last run in the same
+                        directory is not recompiled at all (ncsim/xcelium
+                        run the existing snapshot with -R).  vcs uses
+                        partition compile and iverilog reuses a cached
+                        .vvp file.  Not supported for vivado.
+
+        vector_files: If True, compress runs of pokes and expects into loops
+                      (see compress_loops) whose stimulus and expected
+                      values are loaded from hex files with $readmemh
+                      instead of being part of the testbench, so the size of
+                      the testbench does not grow with the number of
+                      vectors.
+
+        shard_jobs: If not None, split the test at the boundaries marked
+                    with tester.shard() and simulate each shard in its own
+                    directory (<directory>/shard_<k>), running up to this
+                    many simulations at once.  Failures, get_value results
+                    and the simulation logs of the shards are merged in
+                    order (the logs into <directory>/shards.log).  Each
+                    shard starts from a fresh simulation, with the pokes
+                    at the start of the test (e.g., of the clock) applied.
+
+        max_errors: The output of the simulator is watched as it runs, and
+                    the simulation is stopped once this many expects or
+                    assertions failed (None to always run it to completion).
+                    Failed expects reported by then are raised together as
+                    ExpectFailures.
         """
         # set default for list of external sources
         if include_verilog_libraries is None:
@@ -182,6 +270,9 @@ class SystemVerilogTarget(VerilogTarget):
         # set default for magma compilation options
         magma_opts = magma_opts if magma_opts is not None else {}
 
+        # vector files hold the tables of compressed loops
+        compress_loops = compress_loops or vector_files
+
         if simulator == "iverilog":
             disable_ndarray = True
         if disable_ndarray:
@@ -191,7 +282,12 @@ class SystemVerilogTarget(VerilogTarget):
         # call the super constructor
         super().__init__(circuit, circuit_name, directory, skip_compile,
                          include_verilog_libraries, magma_output,
-                         magma_opts, coverage=coverage, use_kratos=use_kratos)
+                         magma_opts, coverage=coverage, use_kratos=use_kratos,
+                         compress_loops=compress_loops,
+                         collect_failures=collect_failures,
+                         get_value_format=get_value_format,
+                         use_magma_cache=use_magma_cache,
+                         build_cache_dir=build_cache_dir)
 
         # set default for top_module.  this comes after the super constructor
         # invocation, because that is where the self.circuit_name is assigned
@@ -209,6 +305,8 @@ class SystemVerilogTarget(VerilogTarget):
                              " target")
         if simulator not in {"vcs", "ncsim", "xcelium", "iverilog", "vivado"}:
             raise ValueError(f"Unsupported simulator {simulator}")
+        if reuse_snapshot and simulator == "vivado":
+            raise ValueError("reuse_snapshot is not supported for vivado")
 
         # save settings
         self.simulator = simulator
@@ -237,7 +335,21 @@ class SystemVerilogTarget(VerilogTarget):
         self.use_input_wires = use_input_wires
         self.parameters = parameters if parameters is not None else {}
         self.disp_type = disp_type
+        self.timeout = timeout
+        self.reuse_snapshot = reuse_snapshot
+        self.vector_files = vector_files
+        if shard_jobs is not None and shard_jobs < 1:
+            raise ValueError(f"Invalid number of shard jobs: {shard_jobs}")
+        self.shard_jobs = shard_jobs
+        self.max_errors = max_errors
+        # file receiving the output of the simulation (set for shards)
+        self.sim_log_file = None
+        self.build_cache_dir = build_cache_dir
         self.waveform_file = waveform_file
+        self.dump_scope = dump_scope
+        self.dump_depth = dump_depth
+        # whether the test bench pauses dumping (see make_trace_off)
+        self.dump_windows = False
         self.use_sva = use_sva
         self.waveform_type = waveform_type
         if self.waveform_file is None and self.dump_waveforms:
@@ -424,6 +536,48 @@ class SystemVerilogTarget(VerilogTarget):
         self.add_decl('integer', action.loop_var, exist_ok=True)
         return super().make_loop(i, action)
 
+    def make_table(self, name, rows):
+        if self.vector_files:
+            return self.make_table_file(name, rows)
+        # tables are declared at the module level with an assignment pattern
+        entries = []
+        for row in rows:
+            values = ", ".join(f"64'd{value}" for value in row)
+            entries.append(f"'{{{values}}}")
+        entries = f',\n{2*self.TAB}'.join(entries)
+        dims = f"[0:{len(rows) - 1}][0:{len(rows[0]) - 1}]"
+        self.add_decl('logic [63:0]',
+                      f"{name} {dims} = '{{\n{2*self.TAB}{entries}\n"
+                      f"{self.TAB}}}")
+        return []
+
+    def make_table_file(self, name, rows):
+        # one line per row, the columns of which are packed into a single
+        # memory word, so that table[row][column] reads the same as the
+        # unpacked tables
+        if not rows or not rows[0]:
+            return []
+        path = self.directory / f'{name}.hex'
+        with open(path, 'w') as f:
+            for row in rows:
+                f.write(''.join(f'{value:016x}' for value in row) + '\n')
+        self.add_decl(f'logic [0:{len(rows[0]) - 1}][63:0]',
+                      f'{name} [0:{len(rows) - 1}]')
+        return [f'$readmemh("{self.sim_file_path(path)}", {name});']
+
+    def sim_file_path(self, path):
+        '''
+        Returns the name the test bench uses for `path`.  Files are referred
+        to relative to the build directory, in which the simulator runs, so
+        that the test bench does not depend on where it is built.  Vivado
+        simulates in a directory of its project instead, so absolute paths
+        are used for it.
+        '''
+        path = Path(path).resolve()
+        if self.simulator == 'vivado':
+            return str(path)
+        return os.path.relpath(path, Path(self.directory).resolve())
+
     def make_join(self, i, action):
         code = ["fork"]
         for p in action.processes:
@@ -454,8 +608,14 @@ class SystemVerilogTarget(VerilogTarget):
         fd = self.fd_var(action.file)
         self.add_decl('integer', fd)
 
+        # the files written by the target are named like the vector files,
+        # so that the test bench does not depend on the build directory
+        name = action.file.name
+        if action.file is self.value_file or action.file is self.failure_file:
+            name = self.sim_file_path(name)
+
         # return the command
-        return [f'{fd} = $fopen("{action.file.name}", "{action.file.mode}");']
+        return [f'{fd} = $fopen("{name}", "{action.file.mode}");']
 
     def make_file_close(self, i, action):
         fd = self.fd_var(action.file)
@@ -466,17 +626,23 @@ class SystemVerilogTarget(VerilogTarget):
             f'File mode "{action.file.mode}" is not compatible with reading.'
 
         idx = '__i'
+        chunk_size = action.file.chunk_size
         fd = self.fd_var(action.file)
         in_ = self.in_var(action.file)
+        self.add_decl('integer', '__fread_count', exist_ok=True)
+
+        # $fread fills the variable with the whole chunk at once, first byte
+        # in the most significant position
+        if action.file.endianness == 'big' or chunk_size == 1:
+            return [f'__fread_count = $fread({in_}, {fd});']
 
+        # little endian: read into a scratch variable and swap the bytes
+        raw = f'{in_}_raw'
+        self.add_decl(f'reg [{(chunk_size * 8) - 1}:0]', raw, exist_ok=True)
+        swap = f'{in_}[8 * {idx} +: 8] = {raw}[8 * ({chunk_size - 1} - {idx}) +: 8];'  # noqa
         return self.generate_action_code(i, [
-            f'{in_} = 0;',
-            Loop(loop_var=idx,
-                 n_iter=action.file.chunk_size,
-                 count='down' if action.file.endianness == 'big' else 'up',
-                 actions=[
-                     f'{in_} |= $fgetc({fd}) << (8 * {idx});'
-                 ])
+            f'__fread_count = $fread({raw}, {fd});',
+            Loop(loop_var=idx, n_iter=chunk_size, actions=[swap])
         ])
 
     def write_byte(self, fd, expr):
@@ -492,8 +658,17 @@ class SystemVerilogTarget(VerilogTarget):
         idx = '__i'
         fd = self.fd_var(action.file)
         value = self.make_name(action.value)
-        byte_expr = f"({value} >> (8 * {idx})) & 8'hFF"
 
+        if self.simulator != 'iverilog':
+            # write the whole chunk with a single call
+            order = range(action.file.chunk_size)
+            if action.file.endianness == 'big':
+                order = reversed(order)
+            byte_exprs = [f"({value} >> {8 * k}) & 8'hFF" for k in order]
+            fmt = '%c' * action.file.chunk_size
+            return [f'$fwrite({fd}, "{fmt}", {", ".join(byte_exprs)});']
+
+        byte_expr = f"({value} >> (8 * {idx})) & 8'hFF"
         return self.generate_action_code(i, [
             Loop(loop_var=idx,
                  n_iter=action.file.chunk_size,
@@ -503,10 +678,33 @@ class SystemVerilogTarget(VerilogTarget):
                  ])
         ])
 
+    def write_bytes(self, i, fd, value, num_bytes):
+        """
+        Writes the `num_bytes` least significant bytes of `value` to `fd`,
+        least significant byte first
+        """
+        if isinstance(value, int):
+            return [self.write_byte(fd, (value >> (8 * k)) & 0xFF)
+                    for k in range(num_bytes)]
+        idx = '__k'
+        byte_expr = f"(({value}) >> (8 * {idx})) & 8'hFF"
+        return self.generate_action_code(i, Loop(
+            loop_var=idx, n_iter=num_bytes,
+            actions=[self.write_byte(fd, byte_expr)]))
+
     def make_get_value(self, i, action):
         fd_var = self.fd_var(self.value_file)
         fmt = action.get_format()
         value = self.make_name(action.port)
+        if self.get_value_format == 'binary':
+            if action.real_number_port:
+                value = f'$realtobits({value})'
+            elif not isinstance(action.port, m.Digital) and \
+                    len(action.port) > value_file.MAX_SLOT_BITS:
+                raise NotImplementedError(
+                    f'Binary get_value of {action.port.name}, which is '
+                    f'wider than {value_file.MAX_SLOT_BITS} bits')
+            return self.write_bytes(i, fd_var, value, value_file.SLOT_SIZE)
         return [f'$fwrite({fd_var}, "{fmt}\\n", {value});']
 
     def make_assert(self, i, action):
@@ -543,7 +741,13 @@ class SystemVerilogTarget(VerilogTarget):
 
         # determine the condition and error body
         err_hdr = ''
-        err_hdr += f'Failed on action={i} checking port {debug_name}'
+        if isinstance(i, str):
+            # index of an action in a compressed loop, computed at runtime
+            err_hdr += f'Failed on action=%0d checking port {debug_name}'
+            idx_args = [i]
+        else:
+            err_hdr += f'Failed on action={i} checking port {debug_name}'
+            idx_args = []
         if action.traceback is not None:
             err_hdr += f' with traceback {action.traceback}'
         if action.above is not None:
@@ -579,9 +783,24 @@ class SystemVerilogTarget(VerilogTarget):
                 err_msg += "\\n" + action.msg[0]
                 err_args += self._make_print_args(action.msg[1:])
 
+        if self.collect_failures:
+            # log the failure and keep going
+            port = action.port
+            if isinstance(port, SelectPath):
+                port = port[-1]
+            if action.above is not None or action.below is not None:
+                kind = FAILURE_RANGE
+                fields = [name, action.above, action.below]
+            elif isinstance(port, RealType):
+                kind, fields = FAILURE_REAL, [name, value]
+            else:
+                kind, fields = FAILURE_VALUE, [name, value]
+            record = self.make_failure_record(i, debug_name, kind, fields)
+            return self.make_if(i, If(f'!{cond}', record))
+
         # construct the body of the $error call
         err_fmt_str = f'"{err_hdr}.  {err_msg}."'
-        err_body = [err_fmt_str] + err_args
+        err_body = [err_fmt_str] + idx_args + err_args
         err_body = ', '.join([str(elem) for elem in err_body])
 
         if self.use_sva:
@@ -590,16 +809,97 @@ class SystemVerilogTarget(VerilogTarget):
             # return a snippet of verilog implementing the assertion
             return self.make_if(i, If(f'!{cond}', [f'$error({err_body});']))
 
+    def make_failure_record(self, i, port, kind, fields):
+        fd = self.fd_var(self.failure_file)
+        values = [(i, 4), (self.failure_port_id(port), 2), (kind, 1)]
+        for field in fields:
+            if field is None:
+                # NaN marks a missing bound
+                values.append(("64'h7FF8000000000000", 8))
+            elif kind == FAILURE_VALUE:
+                values.append((field, 8))
+            else:
+                values.append((f'$realtobits({field})', 8))
+
+        code = []
+        for value, num_bytes in values:
+            code += self.write_bytes(i, fd, value, num_bytes)
+        return code
+
     def make_eval(self, i, action):
         # Emulate eval by inserting a delay
         return ['#1;']
 
+    def dump_args(self):
+        '''
+        Returns the arguments selecting the depth and scope of the dumped
+        signals (as for $dumpvars)
+        '''
+        depth = self.dump_depth if self.dump_depth is not None else 0
+        scope = 'dut'
+        if self.dump_scope is not None:
+            scope += f'.{self.dump_scope}'
+        return f'{depth}, {scope}'
+
+    def uses_dump_tasks(self):
+        # ncsim/xcelium normally dump through TCL probes, which cannot be
+        # paused by the test bench
+        return self.simulator in {"iverilog", "vivado"} or \
+            (self.simulator in {"ncsim", "xcelium"} and self.dump_windows)
+
+    def make_dump_start(self):
+        if not self.dump_waveforms:
+            return []
+        scoped = self.dump_scope is not None or self.dump_depth is not None
+        if self.simulator == "vcs":
+            if self.waveform_type == "vpd":
+                args = self.dump_args() if scoped else ''
+                return [f'$vcdplusfile("{self.waveform_file}");',
+                        f'$vcdpluson({args});',
+                        f'$vcdplusmemon();']
+            if self.waveform_type == "fsdb":
+                args = self.fsdb_dumpvars_args
+                if scoped and not args:
+                    args = self.dump_args()
+                return [f'$fsdbDumpfile("{self.waveform_file}");',
+                        f'$fsdbDumpvars({args});']
+        elif self.uses_dump_tasks():
+            # https://iverilog.fandom.com/wiki/GTKWAVE
+            return [f'$dumpfile("{self.waveform_file}");',
+                    f'$dumpvars({self.dump_args()});']
+        return []
+
+    def make_trace_on(self, i, action):
+        self.dump_windows = True
+        if not self.dump_waveforms:
+            return []
+        if self.simulator == "vcs":
+            if self.waveform_type == "fsdb":
+                return ['$fsdbDumpon;']
+            scoped = self.dump_scope is not None or \
+                self.dump_depth is not None
+            return [f'$vcdpluson({self.dump_args() if scoped else ""});']
+        return ['$dumpon;']
+
+    def make_trace_off(self, i, action):
+        self.dump_windows = True
+        if not self.dump_waveforms:
+            return []
+        if self.simulator == "vcs":
+            if self.waveform_type == "fsdb":
+                return ['$fsdbDumpoff;']
+            return ['$vcdplusoff;']
+        return ['$dumpoff;']
+
     def make_step(self, i, action):
+        if action.watch is not None:
+            raise NotImplementedError(f"{action} is not supported by "
+                                      f"SystemVerilogTarget")
         name = verilog_name(action.clock.name, self.disable_ndarray)
-        code = []
-        for step in range(action.steps):
-            code.append(f"#{self.clock_step_delay} {name} ^= 1;")
-        return code
+        toggle = f"#{self.clock_step_delay} {name} ^= 1;"
+        if action.steps == 1:
+            return [toggle]
+        return [f"repeat ({action.steps}) {toggle}"]
 
     def generate_recursive_port_code(self, name, type_, power_args):
         port_list = []
@@ -684,20 +984,6 @@ class SystemVerilogTarget(VerilogTarget):
         # build up the body of the initial block
         initial_body = []
 
-        # set up probing
-        if self.dump_waveforms and self.simulator == "vcs":
-            if self.waveform_type == "vpd":
-                initial_body += [f'$vcdplusfile("{self.waveform_file}");',
-                                 f'$vcdpluson();',
-                                 f'$vcdplusmemon();']
-            if self.waveform_type == "fsdb":
-                initial_body += [f'$fsdbDumpfile("{self.waveform_file}");',
-                                 f'$fsdbDumpvars({self.fsdb_dumpvars_args});']
-        elif self.dump_waveforms and self.simulator in {"iverilog", "vivado"}:
-            # https://iverilog.fandom.com/wiki/GTKWAVE
-            initial_body += [f'$dumpfile("{self.waveform_file}");',
-                             f'$dumpvars(0, dut);']
-
         # if we're using the GetValue feature, then we need to open a file to
         # which GetValue results will be written
         if any(isinstance(action, GetValue) for action in actions):
@@ -705,8 +991,14 @@ class SystemVerilogTarget(VerilogTarget):
             actions += [FileClose(self.value_file)]
 
         # handle all of user-specified actions in the testbench
-        for i, action in enumerate(actions):
+        self.dump_windows = False
+        initial_body += self.make_failure_log_open()
+        for i, action in self.enumerate_actions(actions):
             initial_body += self.generate_action_code(i, action)
+        initial_body += self.make_failure_log_close()
+
+        # set up probing (which depends on whether the actions pause it)
+        initial_body = self.make_dump_start() + initial_body
 
         # format the paramter list
         param_list = [f'.{name}({value})'
@@ -757,29 +1049,62 @@ class SystemVerilogTarget(VerilogTarget):
         return self.write_test_bench(actions=actions, power_args=power_args)
 
     def run(self, actions, power_args=None):
-        # assemble list of sources files
-        vlog_srcs = []
+        # simulate independent parts of the test concurrently
+        if self.shard_jobs is not None and not self.ext_test_bench and \
+                any(isinstance(action, ShardBoundary) for action in actions):
+            return self.run_shards(actions, power_args)
+
+        # assemble list of sources files, separating the testbench from the
+        # design so that the design can be compiled on its own
+        tb_srcs = []
         if not self.ext_test_bench:
             tb_file = self.generate_test_bench(actions, power_args)
-            vlog_srcs += [tb_file]
+            tb_srcs += [tb_file]
+        dut_srcs = []
         if not self.ext_model_file:
-            vlog_srcs += [self.verilog_file]
-        vlog_srcs += self.include_verilog_libraries
+            dut_srcs += [self.verilog_file]
+        dut_srcs += self.include_verilog_libraries
+        vlog_srcs = tb_srcs + dut_srcs
+
+        # when reusing a snapshot, check whether the snapshot in the build
+        # directory was compiled from the same design and testbench
+        if self.reuse_snapshot:
+            dut_key, tb_key = self.snapshot_keys(dut_srcs, tb_srcs)
+            reuse = (self.snapshot_stamp('snapshot.key') ==
+                     self.snapshot_key(dut_key, tb_key) and
+                     self.snapshot_stamp('testbench.key') == tb_key)
+            lib_dir = self.SNAPSHOT_DIR
+        else:
+            lib_dir = None
 
         # generate simulator commands
+        dut_cmd = None
         if self.simulator == 'ncsim' or self.simulator == "incisive":
             # Compile and run simulation
             cmd_file = self.write_cadence_tcl()
-            sim_cmd = self.ncsim_cmd(sources=vlog_srcs, cmd_file=cmd_file)
-            sim_err_str = None
+            if lib_dir is None:
+                sim_cmd = self.ncsim_cmd(sources=vlog_srcs, cmd_file=cmd_file)
+            else:
+                dut_cmd = self.ncsim_cmd(sources=dut_srcs, cmd_file=None,
+                                         lib_dir=lib_dir, compile_only=True)
+                sim_cmd = self.ncsim_cmd(sources=tb_srcs, cmd_file=cmd_file,
+                                         lib_dir=lib_dir, reuse=reuse)
+            sim_err_str = self.CADENCE_ERR_STR
             # Skip "bin_cmd"
             bin_cmd = None
             bin_err_str = None
         elif self.simulator == 'xcelium':
             # Compile and run simulation
             cmd_file = self.write_cadence_tcl()
-            sim_cmd = self.xcelium_cmd(sources=vlog_srcs, cmd_file=cmd_file)
-            sim_err_str = None
+            if lib_dir is None:
+                sim_cmd = self.xcelium_cmd(sources=vlog_srcs,
+                                           cmd_file=cmd_file)
+            else:
+                dut_cmd = self.xcelium_cmd(sources=dut_srcs, cmd_file=None,
+                                           lib_dir=lib_dir, compile_only=True)
+                sim_cmd = self.xcelium_cmd(sources=tb_srcs, cmd_file=cmd_file,
+                                           lib_dir=lib_dir, reuse=reuse)
+            sim_err_str = self.CADENCE_ERR_STR
             # Skip "bin_cmd"
             bin_cmd = None
             bin_err_str = None
@@ -794,14 +1119,16 @@ class SystemVerilogTarget(VerilogTarget):
         elif self.simulator == 'vcs':
             # Compile simulation
             # TODO: what error strings are expected at this stage?
-            sim_cmd, bin_file = self.vcs_cmd(sources=vlog_srcs)
+            sim_cmd, bin_file = self.vcs_cmd(sources=vlog_srcs,
+                                             lib_dir=lib_dir)
             sim_err_str = None
             # Run simulation
             bin_cmd = [bin_file]
             bin_err_str = ['Error', 'Fatal']
         elif self.simulator == 'iverilog':
             # Compile simulation
-            sim_cmd, bin_file = self.iverilog_cmd(sources=vlog_srcs)
+            sim_cmd, bin_file = self.iverilog_cmd(sources=vlog_srcs,
+                                                  lib_dir=lib_dir)
             sim_err_str = ['syntax error', 'I give up.']
             # Run simulation
             bin_cmd = ['vvp', '-N', bin_file]
@@ -816,18 +1143,279 @@ class SystemVerilogTarget(VerilogTarget):
         if self.skip_run:
             return
 
-        # compile the simulation
-        subprocess_run(sim_cmd, cwd=self.directory, env=self.sim_env,
-                       err_str=sim_err_str, disp_type=self.disp_type)
-
-        # run the simulation binary (if applicable)
-        if bin_cmd is not None:
-            subprocess_run(bin_cmd, cwd=self.directory, env=self.sim_env,
-                           err_str=bin_err_str, disp_type=self.disp_type)
+        # the simulation is watched for failures as it runs, and stopped
+        # after max_errors of them
+        sim_kwargs = dict(max_errors=self.max_errors,
+                          stop_str=self.STOP_PATTERN,
+                          log_file=self.sim_log_file)
+        try:
+            # compile the simulation (ncsim, xcelium and vivado also run it)
+            compile_kwargs = sim_kwargs if bin_cmd is None else {}
+            if lib_dir is None:
+                subprocess_run(sim_cmd, cwd=self.directory, env=self.sim_env,
+                               err_str=sim_err_str, disp_type=self.disp_type,
+                               timeout=self.timeout, job_slots=1,
+                               **compile_kwargs)
+            elif not reuse or bin_cmd is None:
+                # ncsim/xcelium compile and run in the same command, so it
+                # is issued even when the snapshot is reused
+                self.compile_snapshot(dut_key, tb_key, reuse, dut_cmd,
+                                      sim_cmd, sim_err_str, compile_kwargs)
+
+            # run the simulation binary (if applicable)
+            if bin_cmd is not None:
+                subprocess_run(bin_cmd, cwd=self.directory, env=self.sim_env,
+                               err_str=bin_err_str, disp_type=self.disp_type,
+                               timeout=self.timeout, job_slots=1,
+                               **sim_kwargs)
+        except SubprocessRunError as e:
+            # report the expects that failed before the simulation stopped
+            self.failures = parse_failure_messages(
+                e.result.stdout + '\n' + e.result.stderr)
+            if not self.failures:
+                raise
+            raise ExpectFailures(self.failures) from e
 
         # post-process GetValue actions
         self.post_process_get_value_actions(actions)
 
+        # report all failed expects at once
+        self.check_failure_log()
+
+    # Errors and fatal errors reported by ncsim/xcelium
+    CADENCE_ERR_STR = ['*E,', '*F,']
+
+    # Output of failed expects and assertions of the generated test bench,
+    # and of fatal errors of the simulators, counting towards max_errors.
+    # The simulators print their own header line before the message of an
+    # $error, so stopping on the message makes sure that it was received.
+    STOP_PATTERN = re.compile(r'Failed on action=| failed$|\bFATAL\b|'
+                              r'\bFatal\b|\*F,')
+
+    # Directory (relative to the build directory) holding the compiled
+    # design when reuse_snapshot is enabled
+    SNAPSHOT_DIR = 'fault_snapshot'
+
+    # Files of the snapshot directory that only apply to the build directory
+    # they were produced in, and are not stored in the build cache
+    SNAPSHOT_LOCAL_FILES = ('testbench.key', 'simv', 'simv.daidir')
+
+    def snapshot_keys(self, dut_srcs, tb_srcs):
+        '''
+        Returns the build cache keys of the compiled design and of the
+        testbench compiled against it
+        '''
+        tool = {'ncsim': 'irun', 'xcelium': 'xrun', 'vcs': 'vcs',
+                'iverilog': 'iverilog'}.get(self.simulator)
+        dut_key = hash_build_inputs(
+            self.simulator,
+            tool_version(tool) if tool is not None else None,
+            [self.directory / Path(src) for src in dut_srcs],
+            [Path(lib) for lib in self.ext_libs],
+            [Path(dir_) for dir_ in self.inc_dirs],
+            self.defines,
+            self.flags,
+            self.timescale,
+            self.top_module,
+            self.dump_waveforms,
+            self.waveform_type,
+            self.coverage,
+            self.use_kratos,
+            self.no_warning
+        )
+        tb_key = hash_build_inputs(dut_key, [Path(src) for src in tb_srcs])
+        return dut_key, tb_key
+
+    def snapshot_key(self, dut_key, tb_key):
+        '''Returns the build cache key of the snapshot directory'''
+        # iverilog cannot link separately compiled units, so the whole .vvp
+        # file is cached, keyed by the testbench as well
+        return tb_key if self.simulator == 'iverilog' else dut_key
+
+    def snapshot_stamp(self, name):
+        path = self.directory / self.SNAPSHOT_DIR / name
+        if not path.is_file():
+            return None
+        with open(path, 'r') as f:
+            return f.read()
+
+    def write_snapshot_stamp(self, name, key):
+        with open(self.directory / self.SNAPSHOT_DIR / name, 'w') as f:
+            f.write(key)
+
+    def compile_snapshot(self, dut_key, tb_key, reuse, dut_cmd, sim_cmd,
+                         sim_err_str, sim_kwargs=None):
+        '''
+        Compiles the testbench against the snapshot of the design, first
+        restoring the design from the build cache or compiling it if needed.
+        '''
+        lib_dir = self.directory / self.SNAPSHOT_DIR
+        cache = BuildCache("system-verilog", self.build_cache_dir)
+        key = self.snapshot_key(dut_key, tb_key)
+
+        if not reuse:
+            restored = self.snapshot_stamp('snapshot.key') == key
+            if not restored:
+                restored = cache.restore(key, lib_dir)
+            if not restored:
+                if lib_dir.exists():
+                    shutil.rmtree(lib_dir)
+                os.makedirs(lib_dir)
+            # the snapshot no longer matches the testbench of the last run
+            if self.snapshot_stamp('testbench.key') is not None:
+                os.remove(lib_dir / 'testbench.key')
+            if restored and self.simulator == 'iverilog':
+                self.write_snapshot_stamp('testbench.key', tb_key)
+                return
+            if not restored and dut_cmd is not None:
+                subprocess_run(dut_cmd, cwd=self.directory, env=self.sim_env,
+                               err_str=sim_err_str, disp_type=self.disp_type,
+                               timeout=self.timeout, job_slots=1)
+                self.store_snapshot(cache, key)
+
+        subprocess_run(sim_cmd, cwd=self.directory, env=self.sim_env,
+                       err_str=sim_err_str, disp_type=self.disp_type,
+                       timeout=self.timeout, job_slots=1,
+                       **(sim_kwargs or {}))
+
+        if not reuse:
+            self.store_snapshot(cache, key)
+            self.write_snapshot_stamp('testbench.key', tb_key)
+
+    def store_snapshot(self, cache, key):
+        # no-op if the entry was already stored (e.g., it was restored)
+        self.write_snapshot_stamp('snapshot.key', key)
+        cache.store(key, self.directory / self.SNAPSHOT_DIR,
+                    ignore=shutil.ignore_patterns(*self.SNAPSHOT_LOCAL_FILES))
+
+    def split_shards(self, test_actions):
+        '''
+        Returns (offset, actions) of each shard of `test_actions`, where
+        offset is the index of the first action of the shard
+        '''
+        shards = [(0, [])]
+        for i, action in enumerate(test_actions):
+            if isinstance(action, ShardBoundary):
+                shards.append((i + 1, []))
+            else:
+                shards[-1][1].append(action)
+        return [shard for shard in shards if shard[1]]
+
+    def make_shard(self, k, offset):
+        '''Returns a copy of the target simulating shard `k`'''
+        shard = copy.copy(self)
+        # shards run in concurrent threads, so they must not share mutable
+        # options with each other
+        for attr in ['flags', 'defines', 'parameters', 'sim_env',
+                     'magma_opts', 'assumptions', 'guarantees']:
+            setattr(shard, attr, copy.copy(getattr(self, attr)))
+        shard.directory = self.directory / f'shard_{k}'
+        os.makedirs(shard.directory, exist_ok=True)
+        # sources are given relative to the build directory
+        shard.verilog_file = (self.directory / self.verilog_file).resolve()
+        shard.include_verilog_libraries = [
+            (self.directory / Path(src)).resolve()
+            for src in self.include_verilog_libraries]
+        shard.ext_libs = [(self.directory / Path(lib)).resolve()
+                          for lib in self.ext_libs]
+        shard.inc_dirs = [(self.directory / Path(dir_)).resolve()
+                          for dir_ in self.inc_dirs]
+        shard.ncsim_cmd = shard.cadence_cmd("irun")
+        shard.xcelium_cmd = shard.cadence_cmd("xrun")
+        # state built up while generating and running the test bench
+        shard.declarations = {}
+        shard.assigns = {}
+        shard.clock_drivers = []
+        shard.failures = []
+        shard.failure_ports = []
+        shard.get_value_actions = []
+        for attr in ['value_file', 'failure_file']:
+            file = copy.copy(getattr(self, attr))
+            file.name = str(shard.directory / os.path.basename(file.name))
+            setattr(shard, attr, file)
+        shard.action_offset = self.action_offset + offset
+        shard.shard_jobs = None
+        shard.sim_log_file = shard.directory / 'sim.log'
+        # the output of concurrent shards is shown once they all finished
+        if self.disp_type == 'realtime':
+            shard.disp_type = 'on_error'
+        return shard
+
+    def run_shards(self, test_actions, power_args=None):
+        '''
+        Simulates the shards of `test_actions` (see tester.shard())
+        concurrently and merges their results in order
+        '''
+        # the pokes initializing the test (e.g., of the clock) also
+        # initialize every later shard.  They are numbered as if they were
+        # the actions right before the boundary, so that the actions of the
+        # shard keep their own indices.  Pokes cannot fail, so these indices
+        # never show up in failures.
+        init = []
+        for action in test_actions:
+            if not isinstance(action, actions.Poke):
+                break
+            init.append(action)
+
+        shards = []
+        for offset, shard_actions in self.split_shards(test_actions):
+            if offset > 0:
+                shard_actions = init + shard_actions
+                offset -= len(init)
+            elif len(shard_actions) == len(init):
+                # nothing but the initialization before the first boundary
+                continue
+            shards.append((self.make_shard(len(shards), offset),
+                           shard_actions))
+
+        def run_shard(shard, shard_actions):
+            # errors are reported once all shards finished
+            try:
+                shard.run(shard_actions, power_args)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.shard_jobs) as executor:
+            futures = [executor.submit(run_shard, *shard) for shard in shards]
+            errors = [future.result() for future in futures]
+
+        if self.skip_run:
+            return
+
+        # merge the logs
+        with open(self.directory / 'shards.log', 'w') as log:
+            for k, (shard, _) in enumerate(shards):
+                log.write(f'# shard {k} ({shard.directory})\n')
+                if os.path.isfile(shard.sim_log_file):
+                    with open(shard.sim_log_file, 'r') as f:
+                        log.write(f.read())
+        if self.disp_type == 'realtime':
+            with open(self.directory / 'shards.log', 'r') as f:
+                print(f.read(), end='')
+
+        # merge the get_value results, so that they read as the results of a
+        # single simulation
+        self.get_value_actions = []
+        for shard, _ in shards:
+            self.get_value_actions += shard.get_value_actions
+        if self.get_value_actions:
+            with open(self.value_file.name, 'wb') as value_file:
+                for shard, _ in shards:
+                    if shard.get_value_actions:
+                        with open(shard.value_file.name, 'rb') as f:
+                            shutil.copyfileobj(f, value_file)
+
+        # report errors of the shards in order, and all failed expects at
+        # once
+        self.failures = []
+        for error in errors:
+            if isinstance(error, ExpectFailures):
+                self.failures += error.failures
+            elif error is not None:
+                raise error
+        if self.failures:
+            raise ExpectFailures(self.failures)
+
     def write_test_bench(self, actions, power_args):
         # determine the path of the testbench file
         tb_file = self.directory / Path(f'{self.circuit_name}_tb.sv')
@@ -874,9 +1462,16 @@ class SystemVerilogTarget(VerilogTarget):
     def write_cadence_tcl(self):
         # construct the TCL commands to run the Incisive/Xcelium simulation
         tcl_cmds = []
-        if self.dump_waveforms:
+        if self.dump_waveforms and not self.uses_dump_tasks():
             tcl_cmds += [f'database -open -vcd vcddb -into {self.waveform_file} -default -timescale ps']  # noqa
-            tcl_cmds += [f'probe -create -all -vcd -depth all']
+            probe = 'probe -create'
+            if self.dump_scope is not None or self.dump_depth is not None:
+                scope = f'{self.top_module}.dut'
+                if self.dump_scope is not None:
+                    scope += f'.{self.dump_scope}'
+                probe += f' {scope}'
+            depth = self.dump_depth if self.dump_depth is not None else 'all'
+            tcl_cmds += [f'{probe} -all -vcd -depth {depth}']
         tcl_cmds += [f'run {self.num_cycles}ns']
         tcl_cmds += ['assertion -summary -final']
         tcl_cmds += [f'quit']
@@ -967,7 +1562,11 @@ class SystemVerilogTarget(VerilogTarget):
         return retval
 
     def cadence_cmd(self, tool_name):
-        def cmd_fn(sources, cmd_file):
+        # option naming the library directory of compiled units
+        lib_opt = '-xmlibdirname' if tool_name == 'xrun' else '-nclibdirname'
+
+        def cmd_fn(sources, cmd_file, lib_dir=None, compile_only=False,
+                   reuse=False):
             cmd = []
 
             # binary name
@@ -976,22 +1575,38 @@ class SystemVerilogTarget(VerilogTarget):
             # add any extra flags
             cmd += self.flags
 
+            # compiled design library (see reuse_snapshot)
+            if lib_dir is not None:
+                cmd += [lib_opt, f'{lib_dir}']
+
+            # run the existing snapshot without compiling or elaborating
+            if reuse:
+                cmd += ['-R', '-input', f'{cmd_file}']
+                return cmd
+
+            # only compile the sources into the library
+            if compile_only:
+                cmd += ['-compile']
+
             # send name of top module to the simulator
-            if not self.no_top_module:
+            if not self.no_top_module and not compile_only:
                 cmd += ['-top', f'{self.top_module}']
 
             # timescale
             cmd += ['-timescale', f'{self.timescale}']
 
             # TCL commands
-            cmd += ['-input', f'{cmd_file}']
+            if not compile_only:
+                cmd += ['-input', f'{cmd_file}']
 
             # source files
             cmd += [f'{src}' for src in sources]
 
-            # library files
-            for lib in self.ext_libs:
-                cmd += ['-v', f'{lib}']
+            # library files, which are compiled along with the design when
+            # using a snapshot
+            if lib_dir is None or compile_only:
+                for lib in self.ext_libs:
+                    cmd += ['-v', f'{lib}']
 
             # include directory search path
             for dir_ in self.inc_dirs:
@@ -1042,7 +1657,7 @@ class SystemVerilogTarget(VerilogTarget):
         # return arg list
         return cmd
 
-    def vcs_cmd(self, sources):
+    def vcs_cmd(self, sources, lib_dir=None):
         cmd = []
 
         # binary name
@@ -1095,10 +1710,18 @@ class SystemVerilogTarget(VerilogTarget):
         if not self.no_top_module:
             cmd += ['-top', f'{self.top_module}']
 
+        # keep the compiled partitions in the snapshot directory, so that
+        # only changed partitions (i.e. the testbench) are recompiled
+        bin_file = './simv'
+        if lib_dir is not None:
+            bin_file = f'{lib_dir}/simv'
+            cmd += ['-partcomp', f'-partcomp_dir={lib_dir}/partitionlib']
+            cmd += [f'-Mdir={lib_dir}/csrc', '-o', bin_file]
+
         # return arg list and binary file location
-        return cmd, './simv'
+        return cmd, bin_file
 
-    def iverilog_cmd(self, sources):
+    def iverilog_cmd(self, sources, lib_dir=None):
         cmd = []
 
         # binary name
@@ -1109,6 +1732,8 @@ class SystemVerilogTarget(VerilogTarget):
 
         # output file
         bin_file = f'{self.circuit_name}_tb'
+        if lib_dir is not None:
+            bin_file = f'{lib_dir}/{bin_file}'
         cmd += [f'-o{bin_file}']
 
         # look for *.v and *.sv files, if we're using library directories
@@ -43,9 +43,28 @@ def _process_port(port):
 
 
 class PythonTester(InteractiveTester):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, backend="python", backend_opts=None, **kwargs):
+        """
+        `backend`: simulator used to evaluate the circuit, "python" for
+        magma's PythonSimulator or "verilator" for a persistent verilated
+        model (see `fault.verilator_simulator.VerilatorSimulator`)
+        `backend_opts`: optional dictionary of keyword arguments for the
+        backend simulator (e.g. `directory` or `flags` for verilator)
+
+        Other arguments are passed to TesterBase
+        """
         super().__init__(*args, **kwargs)
-        self.simulator = PythonSimulator(self._circuit, self.clock)
+        if backend_opts is None:
+            backend_opts = {}
+        if backend == "python":
+            self.simulator = PythonSimulator(self._circuit, self.clock,
+                                             **backend_opts)
+        elif backend == "verilator":
+            from fault.verilator_simulator import VerilatorSimulator
+            self.simulator = VerilatorSimulator(self._circuit, self.clock,
+                                                **backend_opts)
+        else:
+            raise NotImplementedError(backend)
 
     def eval(self):
         self.simulator.evaluate()
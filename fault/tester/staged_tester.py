@@ -29,6 +29,7 @@ import fault.expression as expression
 import os
 import inspect
 from fault.config import get_test_dir
+from fault.async_run import run_limited
 import tempfile
 from hwtypes import BitVector
 
@@ -178,14 +179,54 @@ class Tester(TesterBase):
         self.actions.append(action)
         return action
 
-    def step(self, steps=1):
+    def checkpoint(self, name):
         """
-        Step the clock `steps` times.
+        Save the state of the simulation to the file `name` (relative to the
+        directory the simulation is run in), so that later tests can start
+        from it with `restore`.  Only supported by the verilator target with
+        `savable=True`.
+        """
+        self.actions.append(actions.Checkpoint(name))
+
+    def restore(self, name):
+        """
+        Replace the state of the simulation by the one saved to the file
+        `name` by `checkpoint` in a simulation of the same model
+        """
+        self.actions.append(actions.Restore(name))
+
+    def trace_on(self):
+        """
+        Resume dumping waveforms (if tracing is enabled)
+        """
+        self.actions.append(actions.TraceOn())
+
+    def trace_off(self):
+        """
+        Pause dumping waveforms until the next `trace_on`, e.g. to only
+        capture the region under debug
+        """
+        self.actions.append(actions.TraceOff())
+
+    def shard(self):
+        """
+        Mark that the actions that follow do not depend on the state left by
+        the previous ones (e.g., they start with a reset), so that the
+        system-verilog target with `shard_jobs` can simulate them in a
+        separate simulator process.  Other targets ignore the boundary.
+        """
+        self.actions.append(actions.ShardBoundary())
+
+    def step(self, steps=1, watch=None):
+        """
+        Step the clock `steps` times.  If `watch` is a port, stop stepping
+        early as soon as its value changes (only supported by the verilator
+        target).
         """
         if self.clock is None:
             raise RuntimeError("Stepping tester without a clock (did you "
                                "specify a clock during initialization?)")
-        self.actions.append(actions.Step(self.clock, steps))
+        self.actions.append(actions.Step(self.clock, steps, watch))
 
     def serialize(self):
         """
@@ -289,6 +330,49 @@ class Tester(TesterBase):
                 kwargs['directory'] = self._make_directory(kwargs['directory'])
             self._compile_and_run(target=target, **kwargs)
 
+    def compile_async(self, target="verilator", **kwargs):
+        """
+        Version of `compile` that can be awaited.  Building the target runs
+        in a worker thread, counting towards the global limit of concurrent
+        steps (see fault.async_run.set_max_concurrency).
+
+        The build directory is resolved before the returned coroutine is
+        scheduled, so that `set_test_dir('callee_file_dir')` refers to the
+        file calling `compile_async` rather than to the event loop.
+        """
+        if "directory" in kwargs:
+            kwargs["directory"] = self._make_directory(kwargs["directory"])
+        return run_limited(self._compile, target, **kwargs)
+
+    async def run_async(self, target="verilator"):
+        """
+        Version of `run` that can be awaited, executed in a worker thread like
+        `compile_async`
+        """
+        await run_limited(self.run, target)
+
+    def compile_and_run_async(self, target="verilator", tmp_dir=False,
+                              **kwargs):
+        """
+        Version of `compile_and_run` that can be awaited.  Compilation and
+        simulation hold separate slots of the global limit, so that the build
+        of one test overlaps with the simulation of another.  Like
+        `compile_async`, the build directory is resolved when called.
+        """
+        if not tmp_dir and 'directory' in kwargs:
+            kwargs['directory'] = self._make_directory(kwargs['directory'])
+        return self._compile_and_run_async(target, tmp_dir, **kwargs)
+
+    async def _compile_and_run_async(self, target, tmp_dir, **kwargs):
+        if tmp_dir:
+            with tempfile.TemporaryDirectory(dir='.') as directory:
+                kwargs['directory'] = directory
+                await run_limited(self._compile, target, **kwargs)
+                await self.run_async(target)
+        else:
+            await run_limited(self._compile, target, **kwargs)
+            await self.run_async(target)
+
     def retarget(self, new_circuit, clock=None):
         """
         Generates a new instance of the Tester object that targets
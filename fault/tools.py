@@ -0,0 +1,82 @@
+"""
+Process-wide discovery of the simulators used by fault.
+
+Probing a tool for its version spawns a subprocess, which adds up when
+thousands of targets are constructed by a test suite.  The results are cached
+for the lifetime of the process, keyed by the PATH used to run the tool and
+the modification time of its executable, so installing a different version or
+changing the PATH is picked up on the next query.
+"""
+import os
+import re
+import shutil
+from fault.subprocess_run import subprocess_run
+from fault.user_cfg import FaultConfig
+
+
+# Command that prints the version of each tool, and the pattern extracting
+# the version from its output
+TOOL_VERSION_PROBES = {
+    'verilator': (['verilator', '--version'], r'Verilator\s+([\d.]+)'),
+    'iverilog': (['iverilog', '-V'], r'Icarus Verilog version\s+([\d.]+)'),
+    'vcs': (['vcs', '-ID'],
+            r'vcs script version\s*:\s*([A-Z]-[\d.]+(?:-SP\d+)?)'),
+    'irun': (['irun', '-version'], r'irun\S*\s+([\d.]+-\w\d+)'),
+    'xrun': (['xrun', '-version'], r'xrun\S*\s+([\d.]+-\w\d+)'),
+    'ngspice': (['ngspice', '--version'], r'ngspice-(\d+)'),
+}
+
+# (tool, PATH) -> (executable, mtime, version)
+_version_cache = {}
+
+
+def _tool_path():
+    # the PATH that subprocess_run will use to launch the tool
+    return FaultConfig().get_sim_env().get('PATH', os.defpath)
+
+
+def which(tool):
+    '''Returns the path of the executable of "tool", or None if not found'''
+    return shutil.which(tool, path=_tool_path())
+
+
+def tool_version(tool, disp_type='on_error'):
+    '''
+    Returns the version string of "tool" (one of TOOL_VERSION_PROBES), or
+    None if the tool is not installed.  The version is only probed once per
+    executable.
+    '''
+    cmd, pattern = TOOL_VERSION_PROBES[tool]
+    path = _tool_path()
+    exe = shutil.which(cmd[0], path=path)
+    if exe is None:
+        return None
+    mtime = os.stat(exe).st_mtime_ns
+
+    key = (tool, path)
+    cached = _version_cache.get(key)
+    if cached is not None and cached[:2] == (exe, mtime):
+        return cached[2]
+
+    # some tools exit with a non-zero code after printing their version
+    # (e.g., iverilog without source files), so the return code is ignored.
+    # shell=True since some tools are actually scripts (e.g., verilator)
+    result = subprocess_run(cmd, shell=True, disp_type=disp_type,
+                            chk_ret_code=False)
+    match = re.search(pattern, result.stdout + result.stderr)
+    version = match.group(1) if match is not None else None
+    _version_cache[key] = (exe, mtime, version)
+    return version
+
+
+def tool_versions():
+    '''
+    Returns a dictionary mapping each known tool to its version, or None if
+    the tool is not installed
+    '''
+    return {tool: tool_version(tool) for tool in TOOL_VERSION_PROBES}
+
+
+def clear_tool_cache():
+    '''Forgets all discovered tool versions'''
+    _version_cache.clear()
@@ -1,8 +1,35 @@
+import copy
 import os
 from pathlib import Path
 import logging
 
 
+# Options parsed from each config file, keyed by the resolved path of the
+# file and reused until its modification time changes
+_cfg_file_cache = {}
+
+
+def _read_cfg_file(loc, yaml):
+    try:
+        mtime = loc.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    key = loc.resolve()
+    cached = _cfg_file_cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    opts = None
+    with open(loc, 'r') as f:
+        try:
+            opts = yaml.safe_load(f)
+        except yaml.YAMLError as yaml_err:
+            logging.warning(f'Skipping config file {loc} due to a parsing error.  Error message:')  # noqa
+            logging.warning(f'{yaml_err}')
+    _cfg_file_cache[key] = (mtime, opts)
+    return opts
+
+
 class FaultConfig:
     def __init__(self):
         # initialize
@@ -21,14 +48,10 @@ class FaultConfig:
 
         locs = [Path.home() / '.faultrc', Path('.') / 'fault.yml']
         for loc in locs:
-            if loc.exists():
-                with open(loc, 'r') as f:
-                    try:
-                        new_opts = yaml.safe_load(f)
-                        self.opts.update(new_opts)
-                    except yaml.YAMLError as yaml_err:
-                        logging.warning(f'Skipping config file {loc} due to a parsing error.  Error message:')  # noqa
-                        logging.warning(f'{yaml_err}')
+            new_opts = _read_cfg_file(loc, yaml)
+            if new_opts:
+                # copied so that changes to opts don't leak into the cache
+                self.opts.update(copy.deepcopy(new_opts))
 
     def get_sim_env(self):
         env = os.environ.copy()
@@ -1,4 +1,5 @@
 from math import ceil, log2
+import os
 
 
 def clog2(x):
@@ -32,3 +33,12 @@ def file_mode_allows_writing(file_mode):
     '''Return True if the given "file_mode" allows writing'''
     return file_mode in {'w', 'wb', 'a', 'ab', 'r+', 'rb+', 'w+', 'wb+', 'a+',
                          'ab+'}
+
+
+def available_cores():
+    '''Return the number of cores the current process may run on'''
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # not available on macOS
+        return os.cpu_count() or 1
@@ -0,0 +1,72 @@
+"""
+Binary transport of GetValue results.
+
+By default, generated test benches write one formatted line of text per
+GetValue action, which is slow to write and to parse when millions of values
+are sampled.  With `get_value_format="binary"`, every GetValue action instead
+writes one 8-byte little-endian slot: an unsigned 64-bit integer for digital
+ports, or an IEEE double for real-valued ports.  The file is a single column
+of slots in the order the GetValue actions were run, so it can be read (or
+memory-mapped) as one NumPy array and split into per-port columns without
+parsing.
+"""
+from collections import OrderedDict
+import numpy as np
+
+
+# Size in bytes of the value of a single GetValue action
+SLOT_SIZE = 8
+# Widest digital port whose value fits in a slot
+MAX_SLOT_BITS = 64
+
+
+def read_slots(filename, mmap=False):
+    """
+    Returns the slots of the binary value file `filename` as an array of
+    unsigned 64-bit integers.  If `mmap` is True, the file is memory-mapped
+    instead of read into memory.
+    """
+    if mmap:
+        return np.memmap(filename, dtype='<u8', mode='r')
+    return np.fromfile(filename, dtype='<u8')
+
+
+def _column(slots, real):
+    return slots.view('<f8') if real else slots
+
+
+def fill_get_values(filename, get_value_actions):
+    """
+    Sets the value of each of `get_value_actions` from the binary value file
+    `filename`
+    """
+    slots = read_slots(filename)
+    ints = slots.tolist()
+    reals = slots.view('<f8').tolist()
+    for k, action in enumerate(get_value_actions):
+        if action.real_number_port:
+            action.value = reals[k]
+        else:
+            action.value = ints[k]
+
+
+def get_value_arrays(filename, get_value_actions, mmap=False):
+    """
+    Returns an ordered dictionary mapping the name of each port sampled by
+    `get_value_actions` to a NumPy array of its samples (uint64 for digital
+    ports, float64 for real-valued ports), read from the binary value file
+    `filename`.  If all actions sample the same port and `mmap` is True, the
+    array is a view of the memory-mapped file.
+    """
+    slots = read_slots(filename, mmap=mmap)
+    columns = OrderedDict()
+    for k, action in enumerate(get_value_actions):
+        key = str(action.port.name)
+        if key not in columns:
+            columns[key] = (action.real_number_port, [])
+        columns[key][1].append(k)
+    if len(columns) == 1:
+        (key, (real, _)), = columns.items()
+        return OrderedDict([(key, _column(slots, real))])
+    return OrderedDict((key, _column(slots[indices], real))
+                       for key, (real, indices) in columns.items())
@@ -51,14 +51,16 @@ class VectorBuilder:
         elif isinstance(action, actions.Eval):
             self.__eval()
         elif isinstance(action, actions.Step):
+            if action.watch is not None:
+                raise NotImplementedError(action)
             indices = self.__indices(action.clock)
             val = self.__get(indices)
             for step in range(action.steps):
                 val ^= BitVector[1](1)
                 self.__eval()
                 self.__set(indices, val)
-        elif isinstance(action, actions.Print):
-            # Skip Print actions for test vectors
+        elif isinstance(action, (actions.Print, actions.ShardBoundary)):
+            # Skip Print actions and shard boundaries for test vectors
             return
         else:
             raise NotImplementedError(action)
@@ -0,0 +1,120 @@
+import os
+import struct
+import subprocess
+import magma as m
+from magma.scope import Scope
+from fault.actions import Poke, Eval, Step
+from fault.verilator_stream import StimulusEncoder, stream_ports, OP_END
+from fault.verilator_target import VerilatorTarget
+
+
+class VerilatorSimulator:
+    """
+    Simulator backed by a long-lived verilated model, with the same interface
+    as magma's PythonSimulator (set_value, get_value, evaluate, advance).
+
+    The model is driven by the data-driven verilator driver (see
+    `fault.verilator_stream`) running as a server process: pokes, evals and
+    steps are buffered and only sent over a pipe when a value is read back,
+    so a batch of commands costs a single round trip.
+    """
+
+    def __init__(self, circuit, clock=None, directory="build/", flags=None,
+                 disp_type="on_error", **kwargs):
+        """
+        `circuit`: the magma circuit to simulate
+        `clock`: optional, the clock port toggled by `advance`
+        `directory`: directory used to build the verilated model
+        `flags`: flags passed to verilator
+        `kwargs`: other keyword arguments of VerilatorTarget (e.g.
+        `magma_output`, `magma_opts`, `use_build_cache`)
+        """
+        self.circuit = circuit
+        self.clock = clock
+        self.target = VerilatorTarget(circuit, directory=directory,
+                                      flags=flags, disp_type=disp_type,
+                                      data_driven=True, **kwargs)
+        self.target.generate_test_bench([])
+        self.target.build_executable()
+        self.ports = stream_ports(circuit)
+        self.encoder = StimulusEncoder(self.ports)
+        self.encoder.header()
+
+        # Responses are written to a dedicated pipe so that they are not
+        # mixed with output of the design (e.g. $display)
+        read_fd, write_fd = os.pipe()
+        exe = f"./obj_dir/V{self.target.circuit_name}"
+        self.proc = subprocess.Popen([exe, "-", f"/dev/fd/{write_fd}"],
+                                     cwd=self.target.directory,
+                                     stdin=subprocess.PIPE,
+                                     pass_fds=(write_fd,))
+        os.close(write_fd)
+        self.responses = os.fdopen(read_fd, "rb")
+
+    @staticmethod
+    def _check_scope(scope):
+        if scope is not None and scope != Scope():
+            raise NotImplementedError("Accessing internal signals is not "
+                                      "supported by the verilator simulator")
+
+    def _flush(self):
+        if self.encoder.data:
+            self.proc.stdin.write(self.encoder.data)
+            self.proc.stdin.flush()
+            self.encoder.data = bytearray()
+
+    def set_value(self, port, value, scope=None):
+        self._check_scope(scope)
+        if isinstance(port, m.Array) and issubclass(port.T, m.Digital) and \
+                isinstance(value, list):
+            value = sum(int(bit) << i for i, bit in enumerate(value))
+        self.encoder.encode_action(0, Poke(port, value))
+
+    def get_value(self, port, scope=None):
+        self._check_scope(scope)
+        if isinstance(port, m.Array) and not issubclass(port.T, m.Digital):
+            return [self.get_value(elem) for elem in port]
+        if isinstance(port, m.Tuple):
+            return [self.get_value(elem) for elem in port]
+        stream_port, offset, mask = self.encoder.peek(port)
+        self._flush()
+        data = self.responses.read(4 * stream_port.words)
+        if len(data) != 4 * stream_port.words:
+            raise RuntimeError(f"Verilator simulation of "
+                               f"{self.target.circuit_name} exited "
+                               f"unexpectedly")
+        value = 0
+        for k, word in enumerate(struct.unpack(f"={stream_port.words}I",
+                                               data)):
+            value |= word << (32 * k)
+        value = (value & mask) >> offset
+        if isinstance(port, m.Digital):
+            return bool(value)
+        # Return a list of bools like PythonSimulator
+        return [bool((value >> i) & 1) for i in range(len(port))]
+
+    def evaluate(self):
+        self.encoder.encode_action(0, Eval())
+
+    def advance(self, n=1):
+        if self.clock is None:
+            raise ValueError("A clock is required to advance the simulation")
+        self.encoder.encode_action(0, Step(self.clock, n))
+
+    def close(self):
+        """
+        Terminate the simulation process
+        """
+        if self.proc.poll() is None:
+            self.encoder.u8(OP_END)
+            self._flush()
+            self.proc.stdin.close()
+            self.proc.wait()
+        self.responses.close()
+
+    def __del__(self):
+        if hasattr(self, "proc"):
+            try:
+                self.close()
+            except (OSError, ValueError):
+                pass
@@ -0,0 +1,773 @@
+"""
+Data-driven Verilator test benches.
+
+Instead of turning every action into C++ source, the data-driven mode builds a
+generic driver once per DUT.  The driver interprets a compact binary stream of
+pokes, evals, steps, and expects written by Python, so changing the test only
+changes the stream and the driver does not need to be recompiled.
+
+Stream format (all integers little-endian):
+
+    header: b"FLTS" u32(version)
+    record: u8(opcode) followed by opcode specific fields:
+        POKE      u16(port) u32[n](value) u32[n](mask)
+        EVAL
+        STEP      u16(port) u32(steps)
+        EXPECT    u32(action index) u16(port) u32[n](value) u32[n](mask) fmt
+        PRINT     fmt
+        GET_VALUE u16(port)
+        PEEK      u16(port)
+        END
+
+where n is the number of 32-bit words in the port and fmt is a format program:
+
+    u16(number of segments), then for each segment
+        u16(length) u8[length](literal text) u16(port)
+        and, if port != NO_PORT, u8(bit select) u8(bit offset)
+        u8(length) u8[length](printf conversion)
+"""
+import math
+import re
+import struct
+import magma as m
+from hwtypes import BitVector, Bit
+import fault
+import fault.actions as actions
+import fault.value_utils as value_utils
+from fault.ms_types import RealType
+from fault.select_path import SelectPath
+from fault.verilog_utils import verilator_name
+
+
+STREAM_MAGIC = b"FLTS"
+STREAM_VERSION = 1
+
+OP_END = 0
+OP_POKE = 1
+OP_EVAL = 2
+OP_STEP = 3
+OP_EXPECT = 4
+OP_PRINT = 5
+OP_GET_VALUE = 6
+OP_PEEK = 7
+
+NO_PORT = 0xFFFF
+
+
+class StreamPort:
+    """
+    A top-level signal of the verilated model that can be poked or peeked by
+    the data-driven driver.
+    """
+
+    def __init__(self, index, name, width):
+        self.index = index
+        self.name = name
+        self.width = width
+
+    @property
+    def words(self):
+        return max(1, math.ceil(self.width / 32))
+
+    @property
+    def is_wide(self):
+        # verilator stores signals wider than 64 bits in arrays of words
+        return self.width > 64
+
+    def __repr__(self):
+        return f"StreamPort({self.index}, {self.name}, {self.width})"
+
+
+def stream_ports(circuit):
+    """
+    Returns a dictionary mapping verilator names to StreamPort objects for all
+    signals of `circuit` that can be accessed by the data-driven driver.
+    Arrays of non-bit types and tuples are flattened the same way they are
+    flattened by the code-generating driver.  Real-valued ports are skipped.
+    """
+    ports = {}
+
+    def visit(port):
+        type_ = type(port)
+        if issubclass(type_, RealType):
+            return
+        if issubclass(type_, m.Digital):
+            width = 1
+        elif issubclass(type_, m.Array) and issubclass(type_.T, m.Digital):
+            width = len(type_)
+        elif issubclass(type_, m.Array):
+            for j in range(type_.N):
+                visit(port[j])
+            return
+        elif issubclass(type_, m.Tuple):
+            for key in type_.keys():
+                visit(port[key])
+            return
+        else:
+            raise NotImplementedError(type_)
+        name = verilator_name(port.name)
+        ports[name] = StreamPort(len(ports), name, width)
+
+    for port in circuit.interface.ports.values():
+        visit(port)
+    return ports
+
+
+class StimulusEncoder:
+    """
+    Encodes a list of actions into the binary stimulus stream consumed by the
+    data-driven driver.  Raises NotImplementedError for actions that need the
+    code-generating driver (control flow, internal signals, files, etc.)
+    """
+
+    def __init__(self, ports):
+        self.ports = ports
+        self.data = bytearray()
+
+    def u8(self, value):
+        self.data += struct.pack("<B", value)
+
+    def u16(self, value):
+        self.data += struct.pack("<H", value)
+
+    def u32(self, value):
+        self.data += struct.pack("<I", value)
+
+    def words(self, value, count):
+        for k in range(count):
+            self.u32((value >> (32 * k)) & 0xFFFFFFFF)
+
+    def text(self, value, length_fmt="<H"):
+        encoded = value.encode()
+        self.data += struct.pack(length_fmt, len(encoded)) + encoded
+
+    def header(self):
+        self.data += STREAM_MAGIC
+        self.u32(STREAM_VERSION)
+
+    def resolve_port(self, port):
+        """
+        Returns the StreamPort for `port` and a mask selecting the bits of the
+        StreamPort that are accessed (ports may be single bits of a bit
+        vector).
+        """
+        if isinstance(port, SelectPath) and len(port.path) <= 2:
+            # top-level port accessed through the circuit wrapper
+            port = port[-1]
+        if isinstance(port, (fault.WrappedVerilogInternalPort, SelectPath,
+                             actions.Var)):
+            raise NotImplementedError(
+                f"Accessing {port} is not supported by the data-driven "
+                f"verilator driver")
+        name = port.name
+        offset = 0
+        if isinstance(name, m.ref.ArrayRef) and \
+                issubclass(name.array.T, m.Digital):
+            offset = name.index
+        try:
+            stream_port = self.ports[verilator_name(name)]
+        except KeyError:
+            raise NotImplementedError(
+                f"Port {port} is not supported by the data-driven verilator "
+                f"driver")
+        if isinstance(name, m.ref.ArrayRef) and \
+                issubclass(name.array.T, m.Digital):
+            mask = 1 << offset
+        else:
+            mask = (1 << stream_port.width) - 1
+        return stream_port, offset, mask
+
+    @staticmethod
+    def const_value(value, width):
+        if isinstance(value, Bit):
+            value = int(value)
+        elif isinstance(value, BitVector):
+            value = value.as_uint()
+        elif isinstance(value, bool):
+            value = int(value)
+        if not isinstance(value, int):
+            raise NotImplementedError(
+                f"Value {value} is not supported by the data-driven "
+                f"verilator driver")
+        return value & ((1 << width) - 1)
+
+    def port_value(self, port, value):
+        stream_port, offset, mask = self.resolve_port(port)
+        width = 1 if offset or mask == 1 else stream_port.width
+        value = self.const_value(value, width) << offset
+        return stream_port, value, mask
+
+    def format_program(self, format_str, ports):
+        """
+        Encode a printf-style format string with its port arguments.  Each
+        conversion is rewritten to accept an unsigned 64-bit integer.
+        """
+        segments = []
+        literal = ""
+        ports = list(ports)
+        pos = 0
+        for match in re.finditer(r"%%|%[-+ #0]*[0-9]*(\.[0-9]+)?[a-zA-Z]",
+                                 format_str):
+            literal += format_str[pos:match.start()]
+            pos = match.end()
+            if match.group() == "%%":
+                literal += "%"
+                continue
+            if not ports:
+                raise ValueError(f"Not enough arguments for format string "
+                                 f"{format_str}")
+            port = ports.pop(0)
+            stream_port, offset, mask = self.resolve_port(port)
+            conversion = match.group()
+            conversion = re.sub(r"l*([diouxX])$", r"ll\1", conversion)
+            bit_select = int(mask != (1 << stream_port.width) - 1)
+            segments.append((literal, stream_port.index, bit_select, offset,
+                             conversion))
+            literal = ""
+        literal += format_str[pos:]
+        if literal:
+            segments.append((literal, NO_PORT, 0, 0, None))
+
+        self.u16(len(segments))
+        for literal, port, bit_select, offset, conversion in segments:
+            self.text(literal)
+            self.u16(port)
+            if port != NO_PORT:
+                self.u8(bit_select)
+                self.u8(offset)
+                self.text(conversion, "<B")
+
+    def peek(self, port):
+        port, offset, mask = self.resolve_port(port)
+        self.u8(OP_PEEK)
+        self.u16(port.index)
+        return port, offset, mask
+
+    def encode(self, action_list):
+        self.header()
+        for i, action in enumerate(action_list):
+            self.encode_action(i, action)
+        self.u8(OP_END)
+        return bytes(self.data)
+
+    def encode_action(self, i, action):
+        if isinstance(action, actions.PortAction) and \
+                isinstance(action.port, m.Array) and \
+                not issubclass(action.port.T, m.Digital):
+            for j in range(action.port.N):
+                self.encode_action(i, type(action)(action.port[j],
+                                                   action.value[j]))
+        elif isinstance(action, actions.Poke):
+            if action.delay is not None:
+                raise NotImplementedError("Poke delays are not supported by "
+                                          "the verilator target")
+            port, value, mask = self.port_value(action.port, action.value)
+            self.u8(OP_POKE)
+            self.u16(port.index)
+            self.words(value, port.words)
+            self.words(mask, port.words)
+        elif isinstance(action, actions.Eval):
+            self.u8(OP_EVAL)
+        elif isinstance(action, actions.Step):
+            if action.watch is not None:
+                raise NotImplementedError(
+                    "Step with watch is not supported by the data-driven "
+                    "driver")
+            port, _, _ = self.resolve_port(action.clock)
+            self.u8(OP_STEP)
+            self.u16(port.index)
+            self.u32(action.steps)
+        elif isinstance(action, actions.Expect):
+            self.encode_expect(i, action)
+        elif isinstance(action, actions.Print):
+            self.u8(OP_PRINT)
+            # Print escapes newlines for use in generated source code
+            format_str = action.format_str.replace("\\n", "\n")
+            self.format_program(format_str, action.ports)
+        elif isinstance(action, actions.GetValue):
+            if action.real_number_port:
+                raise NotImplementedError(
+                    "GetValue of real-valued ports is not supported by the "
+                    "data-driven verilator driver")
+            port, _, _ = self.resolve_port(action.port)
+            self.u8(OP_GET_VALUE)
+            self.u16(port.index)
+        elif isinstance(action, actions.ShardBoundary):
+            # shards are only simulated separately by the SV target
+            pass
+        else:
+            raise NotImplementedError(
+                f"{action} is not supported by the data-driven verilator "
+                f"driver, use the default code-generating driver instead")
+
+    def encode_expect(self, i, action):
+        if value_utils.is_any(action.value):
+            return
+        if action.above is not None or action.below is not None:
+            raise NotImplementedError(
+                "Range expects are not supported by the data-driven "
+                "verilator driver")
+        port, value, mask = self.port_value(action.port, action.value)
+        self.u8(OP_EXPECT)
+        self.u32(i)
+        self.u16(port.index)
+        self.words(value, port.words)
+        self.words(mask, port.words)
+        if action.msg is None:
+            self.format_program("", ())
+        elif isinstance(action.msg, str):
+            self.format_program(action.msg, ())
+        else:
+            self.format_program(action.msg[0], action.msg[1:])
+
+
+def encode_stimulus(action_list, ports):
+    """
+    Returns the binary stimulus stream for `action_list`, given the
+    dictionary of StreamPort objects returned by `stream_ports`.
+    """
+    return StimulusEncoder(ports).encode(action_list)
+
+
+src_tpl = """\
+#include "math.h"
+#include <cstdint>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+{includes}
+
+// Generic data-driven driver generated by fault.  The actions of a test are
+// read from a binary stimulus stream (see fault/verilator_stream.py), so this
+// file only depends on the interface of the DUT.
+
+#define FAULT_MAX_WORDS {max_words}
+
+vluint64_t main_time = 0;       // Current simulation time
+
+double sc_time_stamp () {{       // Called by $time in Verilog
+    return main_time;
+}}
+
+// function to write_coverage
+#ifdef _VERILATED_COV_H_
+void write_coverage() {{
+     VerilatedCov::write("logs/coverage.dat");
+}}
+
+#endif
+
+#if VM_TRACE
+{tracer_class}* tracer;
+#endif
+
+static V{circuit_name}* top;
+static FILE* stimulus;
+static FILE* value_file = NULL;
+static const char* value_file_name = "{value_file_name}";
+
+static void fault_read(void* dst, size_t size) {{
+    if (fread(dst, 1, size, stimulus) != size) {{
+        std::cerr << "Unexpected end of stimulus stream" << std::endl;
+        exit(1);
+    }}
+}}
+
+static uint32_t fault_read_u8() {{
+    unsigned char b;
+    fault_read(&b, 1);
+    return b;
+}}
+
+static uint32_t fault_read_u16() {{
+    unsigned char b[2];
+    fault_read(b, 2);
+    return b[0] | (b[1] << 8);
+}}
+
+static uint32_t fault_read_u32() {{
+    unsigned char b[4];
+    fault_read(b, 4);
+    return b[0] | (b[1] << 8) | (b[2] << 16) | ((uint32_t) b[3] << 24);
+}}
+
+static void fault_read_words(uint32_t* dst, int n) {{
+    for (int k = 0; k < n; k++) {{
+        dst[k] = fault_read_u32();
+    }}
+}}
+
+static const char* fault_port_names[] = {{
+{port_names}
+}};
+
+static const int fault_port_words[] = {{
+{port_words}
+}};
+
+static void fault_unknown_port(int port) {{
+    std::cerr << "Unknown port " << port << " in stimulus stream" << std::endl;
+    exit(1);
+}}
+
+static void fault_poke(int port, const uint32_t* value, const uint32_t* mask) {{
+    switch (port) {{
+{poke_cases}
+        default:
+            fault_unknown_port(port);
+    }}
+}}
+
+static void fault_peek(int port, uint32_t* value) {{
+    switch (port) {{
+{peek_cases}
+        default:
+            fault_unknown_port(port);
+    }}
+}}
+
+static uint64_t fault_peek_u64(int port) {{
+    uint32_t value[FAULT_MAX_WORDS] = {{0}};
+    fault_peek(port, value);
+    uint64_t result = value[0];
+    if (fault_port_words[port] > 1) {{
+        result |= ((uint64_t) value[1]) << 32;
+    }}
+    return result;
+}}
+
+static void fault_print_hex(std::ostream& os, const uint32_t* value, int n) {{
+    char buf[9];
+    os << "0x";
+    bool leading = true;
+    for (int k = n - 1; k >= 0; k--) {{
+        if (leading && value[k] == 0 && k > 0) {{
+            continue;
+        }}
+        snprintf(buf, sizeof(buf), leading ? "%x" : "%08x", value[k]);
+        os << buf;
+        leading = false;
+    }}
+}}
+
+// Reads a format program from the stream and prints it if "emit" is true
+static void fault_print(bool emit) {{
+    char literal[1 << 16];
+    char conversion[256];
+    uint32_t nsegments = fault_read_u16();
+    for (uint32_t s = 0; s < nsegments; s++) {{
+        uint32_t length = fault_read_u16();
+        fault_read(literal, length);
+        literal[length] = 0;
+        uint32_t port = fault_read_u16();
+        if (emit) {{
+            fputs(literal, stdout);
+        }}
+        if (port != {no_port}) {{
+            uint32_t bit_select = fault_read_u8();
+            uint32_t offset = fault_read_u8();
+            uint32_t conv_length = fault_read_u8();
+            fault_read(conversion, conv_length);
+            conversion[conv_length] = 0;
+            if (emit) {{
+                unsigned long long value = fault_peek_u64(port) >> offset;
+                if (bit_select) {{
+                    value &= 1;
+                }}
+                printf(conversion, value);
+            }}
+        }}
+    }}
+}}
+
+static void fault_step(int port, uint32_t steps) {{
+    uint32_t value[FAULT_MAX_WORDS] = {{0}};
+    uint32_t mask[FAULT_MAX_WORDS] = {{1}};
+    top->eval();
+    for (uint32_t s = 0; s < steps; s++) {{
+#if VM_TRACE
+        tracer->dump(main_time);
+#endif
+        fault_peek(port, value);
+        value[0] ^= 1;
+        fault_poke(port, value, mask);
+        top->eval();
+        main_time += 5;
+    }}
+}}
+
+static void fault_expect() {{
+    uint32_t value[FAULT_MAX_WORDS] = {{0}};
+    uint32_t mask[FAULT_MAX_WORDS] = {{0}};
+    uint32_t got[FAULT_MAX_WORDS] = {{0}};
+    uint32_t i = fault_read_u32();
+    int port = fault_read_u16();
+    int n = fault_port_words[port];
+    fault_read_words(value, n);
+    fault_read_words(mask, n);
+    fault_peek(port, got);
+    bool ok = true;
+    for (int k = 0; k < n; k++) {{
+        got[k] &= mask[k];
+        value[k] &= mask[k];
+        ok = ok && (got[k] == value[k]);
+    }}
+    if (ok) {{
+        fault_print(false);
+        return;
+    }}
+    std::cerr << std::endl;  // end the current line
+    std::cerr << "Got      : ";
+    fault_print_hex(std::cerr, got, n);
+    std::cerr << std::endl;
+    std::cerr << "Expected : ";
+    fault_print_hex(std::cerr, value, n);
+    std::cerr << std::endl;
+    std::cerr << "i        : " << std::dec << i << std::endl;
+    std::cerr << "Port     : " << fault_port_names[port] << std::endl;
+    fault_print(true);
+#if VM_TRACE
+    // Dump one more timestep so we see the current values
+    tracer->dump(main_time);
+    tracer->close();
+#endif
+    exit(1);
+}}
+
+static void fault_open_value_file() {{
+    if (value_file == NULL) {{
+        value_file = fopen(value_file_name, "w");
+        if (value_file == NULL) {{
+            std::cout << "Could not open file " << value_file_name << std::endl;
+            exit(1);
+        }}
+    }}
+}}
+
+// Writes the raw words of a port to the value file, used to answer the
+// controlling process in interactive mode
+static void fault_peek_binary(int port) {{
+    uint32_t value[FAULT_MAX_WORDS] = {{0}};
+    fault_open_value_file();
+    fault_peek(port, value);
+    fwrite(value, sizeof(uint32_t), fault_port_words[port], value_file);
+    fflush(value_file);
+}}
+
+static void fault_get_value(int port) {{
+    fault_open_value_file();
+    // Print the value in decimal by repeatedly dividing it by 10^9, so that
+    // values wider than 64 bits are supported
+    uint32_t value[FAULT_MAX_WORDS] = {{0}};
+    uint32_t digits[FAULT_MAX_WORDS * 2];
+    int n = fault_port_words[port];
+    int ndigits = 0;
+    fault_peek(port, value);
+    bool nonzero;
+    do {{
+        uint64_t rem = 0;
+        nonzero = false;
+        for (int k = n - 1; k >= 0; k--) {{
+            uint64_t cur = (rem << 32) | value[k];
+            value[k] = (uint32_t) (cur / 1000000000);
+            rem = cur % 1000000000;
+            nonzero = nonzero || value[k];
+        }}
+        digits[ndigits++] = (uint32_t) rem;
+    }} while (nonzero);
+    fprintf(value_file, "%u", digits[ndigits - 1]);
+    for (int k = ndigits - 2; k >= 0; k--) {{
+        fprintf(value_file, "%09u", digits[k]);
+    }}
+    fprintf(value_file, "\\n");
+}}
+
+int main(int argc, char **argv) {{
+  Verilated::commandArgs(argc, argv);
+  // Usage: V{circuit_name} [stimulus file] [value file] [+verilator args]
+  const char* stimulus_file_name = "{stimulus_file_name}";
+  int positional = 0;
+  for (int k = 1; k < argc; k++) {{
+    if (argv[k][0] == '+') {{
+      continue;
+    }}
+    if (positional == 0) {{
+      stimulus_file_name = argv[k];
+    }} else if (positional == 1) {{
+      value_file_name = argv[k];
+    }}
+    positional++;
+  }}
+  if (strcmp(stimulus_file_name, "-") == 0) {{
+    // interactive mode, actions are sent by a controlling process
+    stimulus = stdin;
+  }} else {{
+    stimulus = fopen(stimulus_file_name, "rb");
+  }}
+  if (stimulus == NULL) {{
+    std::cout << "Could not open file " << stimulus_file_name << std::endl;
+    return 1;
+  }}
+  char magic[4];
+  fault_read(magic, 4);
+  uint32_t version = fault_read_u32();
+  if (memcmp(magic, "{magic}", 4) != 0 || version != {version}) {{
+    std::cerr << "Invalid stimulus stream " << stimulus_file_name << std::endl;
+    return 1;
+  }}
+
+  top = new V{circuit_name};
+#if VM_TRACE
+  Verilated::traceEverOn(true);
+  tracer = new {tracer_class};
+  top->trace(tracer, {trace_depth});{trace_scope}
+  mkdir("logs", S_IRWXU | S_IRWXG | S_IROTH | S_IXOTH);
+  tracer->open("logs/{circuit_name}.{trace_ext}");
+#endif
+
+  uint32_t value[FAULT_MAX_WORDS];
+  uint32_t mask[FAULT_MAX_WORDS];
+  bool done = false;
+  while (!done) {{
+    int op = fault_read_u8();
+    switch (op) {{
+      case {op_poke}: {{
+        int port = fault_read_u16();
+        fault_read_words(value, fault_port_words[port]);
+        fault_read_words(mask, fault_port_words[port]);
+        fault_poke(port, value, mask);
+        break;
+      }}
+      case {op_eval}:
+        top->eval();
+#if VM_TRACE
+        tracer->dump(main_time);
+        main_time++;
+#endif
+        break;
+      case {op_step}: {{
+        int port = fault_read_u16();
+        fault_step(port, fault_read_u32());
+        break;
+      }}
+      case {op_expect}:
+        fault_expect();
+        break;
+      case {op_print}:
+        fault_print(true);
+        break;
+      case {op_get_value}:
+        fault_get_value(fault_read_u16());
+        break;
+      case {op_peek}:
+        fault_peek_binary(fault_read_u16());
+        break;
+      case {op_end}:
+        done = true;
+        break;
+      default:
+        std::cerr << "Unknown opcode " << op << " in stimulus stream"
+                  << std::endl;
+        return 1;
+    }}
+  }}
+  fclose(stimulus);
+  if (value_file != NULL) {{
+    fclose(value_file);
+  }}
+
+#if VM_TRACE
+  tracer->dump(main_time);
+  tracer->close();
+#endif
+
+#ifdef _VERILATED_COV_H_
+    write_coverage();
+#endif
+
+}}
+"""  # nopep8
+
+
+def _make_poke_case(port):
+    lines = [f"        case {port.index}:"]
+    if port.is_wide:
+        lines += [
+            f"            for (int k = 0; k < {port.words}; k++) {{",
+            f"                top->{port.name}[k] = (top->{port.name}[k] & "
+            f"~mask[k]) | (value[k] & mask[k]);",
+            "            }"
+        ]
+    else:
+        value = "(((uint64_t) value[1]) << 32 | value[0])" \
+            if port.words > 1 else "value[0]"
+        mask = "(((uint64_t) mask[1]) << 32 | mask[0])" \
+            if port.words > 1 else "mask[0]"
+        lines += [f"            top->{port.name} = (top->{port.name} & "
+                  f"~{mask}) | ({value} & {mask});"]
+    lines += ["            break;"]
+    return lines
+
+
+def _make_peek_case(port):
+    lines = [f"        case {port.index}:"]
+    if port.is_wide:
+        lines += [
+            f"            for (int k = 0; k < {port.words}; k++) {{",
+            f"                value[k] = top->{port.name}[k];",
+            "            }"
+        ]
+    else:
+        lines += [f"            value[0] = (uint32_t) top->{port.name};"]
+        if port.words > 1:
+            lines += [f"            value[1] = (uint32_t) "
+                      f"(((uint64_t) top->{port.name}) >> 32);"]
+    lines += ["            break;"]
+    return lines
+
+
+def generate_stream_driver(circuit_name, ports, includes,
+                           stimulus_file_name, value_file_name,
+                           tracer_class="VerilatedVcdC", trace_ext="vcd",
+                           trace_depth=99, trace_scope=""):
+    """
+    Returns the source code of the generic driver for a DUT named
+    `circuit_name` with the StreamPort objects `ports`.  The tracer arguments
+    select the waveform format and the traced signals (see VerilatorTarget).
+    """
+    ports = sorted(ports.values(), key=lambda port: port.index)
+    poke_cases = []
+    peek_cases = []
+    for port in ports:
+        poke_cases += _make_poke_case(port)
+        peek_cases += _make_peek_case(port)
+    port_names = [f'    "{port.name}",' for port in ports]
+    port_words = [f'    {port.words},' for port in ports]
+    max_words = max([port.words for port in ports] + [2])
+    includes_src = "\n".join(["#include " + i for i in includes])
+    return src_tpl.format(
+        includes=includes_src,
+        circuit_name=circuit_name,
+        max_words=max_words,
+        port_names="\n".join(port_names),
+        port_words="\n".join(port_words),
+        poke_cases="\n".join(poke_cases),
+        peek_cases="\n".join(peek_cases),
+        stimulus_file_name=stimulus_file_name,
+        value_file_name=value_file_name,
+        tracer_class=tracer_class,
+        trace_ext=trace_ext,
+        trace_depth=trace_depth,
+        trace_scope=trace_scope,
+        magic=STREAM_MAGIC.decode(),
+        version=STREAM_VERSION,
+        no_port=NO_PORT,
+        op_poke=OP_POKE,
+        op_eval=OP_EVAL,
+        op_step=OP_STEP,
+        op_expect=OP_EXPECT,
+        op_print=OP_PRINT,
+        op_get_value=OP_GET_VALUE,
+        op_peek=OP_PEEK,
+        op_end=OP_END
+    )
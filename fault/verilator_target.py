@@ -2,29 +2,42 @@ import fault
 from pathlib import Path
 import magma as m
 from .util import (is_valid_file_mode, file_mode_allows_reading,
-                   file_mode_allows_writing)
+                   file_mode_allows_writing, available_cores)
 import fault.actions as actions
-from fault.actions import Poke, Eval, FileOpen, FileClose, GetValue, Loop, If
+from fault.actions import (Poke, Eval, FileOpen, FileClose, GetValue, Loop,
+                           If, Var)
 from fault.verilog_target import VerilogTarget
 from fault.verilog_utils import verilator_name
 import fault.value_utils as value_utils
 from fault.verilator_utils import (verilator_make_cmd, verilator_comp_cmd,
-                                   verilator_version)
+                                   verilator_version, TRACE_FORMATS)
 from fault.select_path import SelectPath
 from fault.wrapper import PortWrapper, InstanceWrapper
 import math
 from hwtypes import BitVector, AbstractBitVectorMeta, Bit, SIntVector
 from fault.random import constrained_random_bv
 from fault.subprocess_run import subprocess_run
+from fault.job_slots import hold_job_slots
+from fault.build_cache import BuildCache, hash_build_inputs
+from fault.failure_log import FAILURE_VALUE, FAILURE_REAL, FAILURE_RANGE
+import fault.value_file as value_file
+from fault.verilator_stream import (stream_ports, encode_stimulus,
+                                    generate_stream_driver)
 from fault.ms_types import RealType
 import fault.utils as utils
 import fault.expression as expression
 import platform
 import os
 import glob
+import json
+import logging
+import shutil
+import time
 
 
 max_bits = 64 if platform.architecture()[0] == "64bit" else 32
+# Size in bytes of the stdio buffer of files opened by the test bench
+file_buffer_size = 1 << 20
 
 
 src_tpl = """\
@@ -49,20 +62,23 @@ void write_coverage() {{
 
 #endif
 
+{wide_hex_def}
+
 #if VM_TRACE
-VerilatedVcdC* tracer;
+{tracer_def}
+FaultTracer* tracer;
 #endif
-
+{globals}
 int main(int argc, char **argv) {{
   Verilated::commandArgs(argc, argv);
-  V{circuit_name}* top = new V{circuit_name};
+  {top_init}
   {kratos_start_call}
 #if VM_TRACE
   Verilated::traceEverOn(true);
-  tracer = new VerilatedVcdC;
-  top->trace(tracer, 99);
+  tracer = new FaultTracer;
+  top->trace(tracer, {trace_depth});{trace_scope}
   mkdir("logs", S_IRWXU | S_IRWXG | S_IROTH | S_IXOTH);
-  tracer->open("logs/{circuit_name}.vcd");
+  tracer->open("logs/{circuit_name}.{trace_ext}");
 #endif
 
 {main_body}
@@ -81,6 +97,48 @@ int main(int argc, char **argv) {{
 """  # nopep8
 
 
+chunk_tpl = """\
+#include "math.h"
+{includes}
+
+// Actions {first} to {last} of the driver, called from {circuit_name}_driver.cpp
+{wide_hex_def}
+
+extern vluint64_t main_time;
+#if VM_TRACE
+{tracer_def}
+extern FaultTracer* tracer;
+#endif
+extern V{circuit_name}* top;
+
+void {function_name}() {{
+{body}
+}}
+"""  # nopep8
+
+
+# Formats the 32-bit words of a port wider than max_bits as one hex number
+wide_hex_def = """\
+template <typename T>
+static std::string fault_wide_hex(const T &words, int num_words) {
+  std::ostringstream out;
+  out << "0x" << std::hex << words[num_words - 1];
+  for (int k = num_words - 2; k >= 0; k--)
+    out << std::setfill('0') << std::setw(8) << words[k];
+  return out.str();
+}"""
+
+
+# Tracer whose dumps can be paused with tester.trace_off()
+tracer_tpl = """\
+struct FaultTracer : public {tracer_class} {{
+  bool enabled = true;
+  void dump(vluint64_t time) {{
+    if (enabled) {tracer_class}::dump(time);
+  }}
+}};"""
+
+
 class VerilatorTarget(VerilogTarget):
 
     # Language properties of C used in generating code blocks
@@ -93,7 +151,15 @@ class VerilatorTarget(VerilogTarget):
                  include_directories=None, magma_output="coreir-verilog",
                  circuit_name=None, magma_opts=None, skip_verilator=False,
                  disp_type='on_error', coverage=False, use_kratos=False,
-                 defines=None, parameters=None, ext_model_file=None):
+                 defines=None, parameters=None, ext_model_file=None,
+                 use_build_cache=False, build_cache_dir=None,
+                 data_driven=False, compress_loops=False,
+                 driver_chunk_size=None, collect_failures=False,
+                 get_value_format='text', savable=False, pgo_training=None,
+                 lto=False, march_native=False, threads=None,
+                 thread_tuning_actions=None, thread_counts=None,
+                 trace_format='vcd', trace_depth=99, trace_scope=None,
+                 timeout=None, use_magma_cache=False):
         """
         Params:
             `include_verilog_libraries`: a list of verilog libraries to include
@@ -103,6 +169,91 @@ class VerilatorTarget(VerilogTarget):
             `include_directories`: a list of directories to include using the
             -I flag. From the the verilator docs:
                 -I<dir>                    Directory to search for includes
+
+            `use_build_cache`: if True, reuse verilated and compiled models
+            from a persistent cache shared across tests and processes.  The
+            cache is keyed on the contents of the Verilog sources, the
+            verilator command line (flags, defines, parameters) and the
+            verilator version.  On a hit, verilation and compilation of the
+            model are skipped and only the driver is rebuilt.
+
+            `build_cache_dir`: root directory of the build cache (see
+            `fault.build_cache.default_build_cache_dir` for the default)
+
+            `data_driven`: if True, generate a generic driver that reads the
+            test actions from a binary stimulus file (see
+            `fault.verilator_stream`) instead of a driver with the actions
+            compiled in.  The driver only depends on the interface of the
+            circuit, so it is compiled once and reused by tests that only
+            differ in their stimulus.  Only pokes and expects of top-level
+            ports, evals, steps, prints and get values are supported.
+
+            `compress_loops`: if True, replace runs of actions that only
+            differ in the constants being poked and expected (e.g. test
+            vectors) by loops over constant tables in the generated driver
+
+            `driver_chunk_size`: if not None, split the actions of the driver
+            into functions of at most `driver_chunk_size` actions, each in its
+            own source file, so that large drivers are compiled in parallel
+            and each function stays small enough for the C++ compiler to
+            optimize quickly.  Drivers that declare variables or open files
+            (e.g. for get_value) are not split.
+
+            `collect_failures`: if True, failed expects do not stop the
+            simulation but are written to a binary failure log (see
+            `fault.failure_log`).  After the run, all failures are raised
+            together in a single ExpectFailures exception.  Not supported
+            together with `data_driven`.
+
+            `get_value_format`: 'text' (default) writes the results of
+            get_value as lines of text, 'binary' as 8-byte slots that are
+            read back without parsing (see `fault.value_file`) and are also
+            available as NumPy arrays through `get_value_arrays`.  'binary'
+            does not support ports wider than 64 bits or `data_driven`.
+
+            `savable`: if True, verilate the model with --savable so that
+            tests can save its state with `tester.checkpoint(name)` and later
+            tests can start from that state with `tester.restore(name)`
+            instead of replaying a long preamble (reset, configuration, ...)
+
+            `pgo_training`: if not None, a Tester (or list of actions) used as
+            training test for a profile-guided optimization build with gcc.
+            Before the first run, the model is built with -fprofile-generate
+            and the training test is run, then the model and driver are
+            rebuilt with -fprofile-use.  With the build cache, the optimized
+            model is cached so the training only happens once per design.
+
+            `lto`: if True, compile and link the model and driver with -flto
+
+            `march_native`: if True, compile the model and driver with
+            -march=native
+
+            `threads`: number of threads of the verilated model (verilator
+            --threads), or "auto" to benchmark `thread_tuning_actions` (a
+            Tester or a short list of actions) on models built with each of
+            `thread_counts` threads (default: powers of two up to the number
+            of available cores) and use the fastest.  The choice is recorded
+            in the build directory and reused until the design changes.
+
+            `trace_format`: format of the waveforms written when tracing is
+            enabled with the --trace flag, 'vcd' (default) or 'fst'
+            (compressed, written with --trace-fst)
+
+            `trace_depth`: number of levels of hierarchy below the top
+            module that are traced
+
+            `trace_scope`: if not None, only trace the signals below this
+            hierarchical scope (e.g. "TOP.top.core")
+
+            Tracing can also be paused around regions that are not under
+            debug with `tester.trace_off()` and `tester.trace_on()`.
+
+            `timeout`: if not None, the simulation is stopped (and fails)
+            after running for this many seconds
+
+            `use_magma_cache`: if True, reuse the Verilog generated by magma
+            for the same circuit definition and options from the build cache
+            (see `fault.magma_cache`)
         """
 
         # Set defaults
@@ -117,9 +268,33 @@ class VerilatorTarget(VerilogTarget):
                 skip_compile = True
         magma_opts.setdefault("verilator_compat", True)
 
+        if data_driven and collect_failures:
+            raise ValueError("collect_failures is not supported by the "
+                             "data-driven driver")
+        if trace_format not in TRACE_FORMATS:
+            raise ValueError(f"Unsupported trace_format: {trace_format}")
+        if data_driven and get_value_format != 'text':
+            raise ValueError("get_value_format must be 'text' for the "
+                             "data-driven driver")
+
         # Save settings
         self.disp_type = disp_type
         self.use_kratos = use_kratos
+        self.data_driven = data_driven
+        self.savable = savable
+        self.trace_format = trace_format
+        self.trace_depth = trace_depth
+        self.trace_scope = trace_scope
+        self.timeout = timeout
+        self.pgo_training = pgo_training
+        self.lto = lto
+        self.march_native = march_native
+        # whether the objects of the model were built with the PGO profile
+        self.pgo_trained = False
+        self.pgo_rebuild = False
+        self.driver_chunk_size = driver_chunk_size
+        # (name, source) of the additional files of a split driver
+        self.driver_chunks = []
         self.parameters = parameters if parameters is not None else {}
 
         # Try to import kratos_runtime, if needed
@@ -135,7 +310,16 @@ class VerilatorTarget(VerilogTarget):
         # Call super constructor
         super().__init__(circuit, circuit_name, directory, skip_compile,
                          include_verilog_libraries, magma_output, magma_opts,
-                         coverage=coverage)
+                         coverage=coverage, compress_loops=compress_loops,
+                         collect_failures=collect_failures,
+                         get_value_format=get_value_format,
+                         use_magma_cache=use_magma_cache,
+                         build_cache_dir=build_cache_dir)
+
+        # FST tracing is enabled with its own flag
+        if flags is not None and trace_format == 'fst':
+            flags = ['--trace-fst' if flag == '--trace' else flag
+                     for flag in flags]
 
         # Determine the path to the Verilog file being tested
         if ext_model_file is not None:
@@ -143,31 +327,70 @@ class VerilatorTarget(VerilogTarget):
         else:
             verilog_filename = self.verilog_file.name
 
-        # Compile the design using `verilator`, if not skip
-        if not skip_verilator:
-            driver_file = self.directory / Path(
-                f"{self.circuit_name}_driver.cpp")
-            comp_cmd = verilator_comp_cmd(
-                top=self.circuit_name,
-                verilog_filename=verilog_filename,
-                include_verilog_libraries=self.include_verilog_libraries,
-                include_directories=include_directories,
-                driver_filename=driver_file.name,
-                verilator_flags=flags,
-                coverage=self.coverage,
-                use_kratos=use_kratos,
-                defines=defines,
-                parameters=parameters
-            )
-            # shell=True since 'verilator' is actually a shell script
-            subprocess_run(comp_cmd, cwd=self.directory, shell=True,
-                           disp_type=self.disp_type)
-
         # Initialize variables
         self.verilator_version = verilator_version(disp_type=self.disp_type)
 
+        driver_file = self.directory / Path(f"{self.circuit_name}_driver.cpp")
+        comp_args = dict(
+            top=self.circuit_name,
+            verilog_filename=verilog_filename,
+            include_verilog_libraries=self.include_verilog_libraries,
+            include_directories=include_directories,
+            driver_filename=driver_file.name,
+            verilator_flags=flags,
+            coverage=self.coverage,
+            use_kratos=use_kratos,
+            defines=defines,
+            parameters=parameters,
+            savable=savable
+        )
+
+        # Pick the fastest number of threads if requested
+        if threads == "auto":
+            if thread_tuning_actions is None:
+                raise ValueError('threads="auto" requires '
+                                 'thread_tuning_actions')
+            if skip_verilator:
+                raise ValueError('threads="auto" rebuilds the model and '
+                                 'cannot be used with skip_verilator')
+            threads = self.tune_threads(comp_args, thread_tuning_actions,
+                                        thread_counts)
+        self.threads = threads
+        comp_cmd = verilator_comp_cmd(threads=threads, **comp_args)
+
+        # Look up the verilated model in the build cache
+        self.build_cache = None
+        self.build_cache_key = None
+        if use_build_cache:
+            if include_directories is None:
+                include_directories = []
+            self.build_cache = BuildCache("verilator", build_cache_dir)
+            self.build_cache_key = hash_build_inputs(
+                comp_cmd,
+                self.verilator_version,
+                self.directory / verilog_filename,
+                [self.directory / lib
+                 for lib in self.include_verilog_libraries],
+                [self.directory / dir_ for dir_ in include_directories],
+                self.opt_flags(),
+                self.pgo_training_actions()
+            )
+
+        # Compile the design using `verilator`, if not skip
+        if not skip_verilator:
+            obj_dir = self.directory / "obj_dir"
+            if self.build_cache is not None and \
+                    self.build_cache.restore(self.build_cache_key, obj_dir):
+                logging.info(f"Restored verilated model of "
+                             f"{self.circuit_name} from build cache")
+                self.pgo_trained = True
+            else:
+                # shell=True since 'verilator' is actually a shell script
+                subprocess_run(comp_cmd, cwd=self.directory, shell=True,
+                               disp_type=self.disp_type, job_slots=1)
+
     def _make_assert(self, got, expected, i, port, user_msg,
-                     below=None, above=None, style='hex'):
+                     below=None, above=None, style='hex', cond=None):
         kratos_exit_call = ""
         if self.use_kratos:
             kratos_exit_call = "teardown_runtime();"
@@ -179,7 +402,9 @@ class VerilatorTarget(VerilogTarget):
             user_msg_str += f"printf(\"{user_msg[0]}\"{arg_str});"
 
         # determine the condition to use
-        if above is not None:
+        if cond is not None:
+            pass
+        elif above is not None:
             if below is not None:
                 # must be in range
                 cond = f'(({above} <= {got}) && ({got} <= {below}))'  # noqa
@@ -199,9 +424,28 @@ class VerilatorTarget(VerilogTarget):
             fmt = '"0x" << std::hex'
         elif style == 'scientific':
             fmt = 'std::scientific'
+        elif style == 'wide':
+            # got and expected are already formatted by fault_wide_hex
+            fmt = 'std::dec'
         else:
             raise Exception(f'Unknown style: ' + style)
 
+        if self.collect_failures:
+            # log the failure and keep going
+            if above is not None or below is not None:
+                record = self.make_failure_record(
+                    i, port.strip('"'), FAILURE_RANGE, [got, above, below])
+            elif style == 'scientific':
+                record = self.make_failure_record(
+                    i, port.strip('"'), FAILURE_REAL, [got, expected])
+            else:
+                record = self.make_failure_record(
+                    i, port.strip('"'), FAILURE_VALUE, [got, expected])
+            code = [f'if (!({cond})) {{']
+            code += [f'{self.TAB}{line}' for line in record]
+            code += [f'{self.TAB}{user_msg_str}', '}']
+            return '\n'.join(code)
+
         return f'''\
 if (!({cond})) {{
     std::cerr << std::endl;  // end the current line
@@ -220,6 +464,43 @@ if (!({cond})) {{
 }}
     '''
 
+    @staticmethod
+    def num_wide_words(value):
+        # Verilator stores ports wider than 64 bits as arrays of 32-bit words
+        return math.ceil(value.num_bits / 32)
+
+    def make_wide_words(self, value):
+        """
+        Declares the words of the wide constant `value`, least significant
+        word first, as the array "fault_wide"
+        """
+        num_words = self.num_wide_words(value)
+        words = ", ".join(
+            f"0x{(value.as_uint() >> (32 * k)) & 0xFFFFFFFF:x}U"
+            for k in range(num_words))
+        return [f"static const vluint32_t fault_wide[{num_words}] = "
+                f"{{{words}}};"]
+
+    def make_failure_record(self, i, port, kind, fields):
+        fd = self.fd_var(self.failure_file)
+        if kind == FAILURE_VALUE:
+            field_type = 'vluint64_t'
+        else:
+            field_type = 'double'
+        fields = ', '.join('NAN' if field is None else
+                           f'({field_type}) ({field})' for field in fields)
+        code = [
+            f'vluint32_t failure_index = {i};',
+            f'vluint16_t failure_port = {self.failure_port_id(port)};',
+            f'vluint8_t failure_kind = {kind};',
+            f'{field_type} failure_fields[] = {{{fields}}};'
+        ]
+        for var in ['failure_index', 'failure_port', 'failure_kind']:
+            code.append(f'fwrite(&{var}, sizeof({var}), 1, {fd});')
+        code.append(f'fwrite(failure_fields, sizeof(failure_fields), 1, '
+                    f'{fd});')
+        return ['{'] + [f'{self.TAB}{line}' for line in code] + ['}']
+
     def get_verilator_prefix(self):
         if self.verilator_version > 3.874:
             return f"{self.circuit_name}"
@@ -260,10 +541,10 @@ if (!({cond})) {{
         if isinstance(value, actions.Var):
             return value.name
         if isinstance(value, actions.FileRead):
-            mask = "FF" * value.file.chunk_size
-            value = " | ".join(f"{value.file.name_without_ext}_in[{i}]"
+            in_ = self.in_var(value.file)
+            value = " | ".join(f"((vluint64_t) {in_}[{i}] << {8 * i})"
                                for i in range(value.file.chunk_size))
-            return f"({value}) & 0x{mask}"
+            return f"({value})"
         return value
 
     def process_signed_values(self, port, value):
@@ -357,16 +638,14 @@ if (!({cond})) {{
 
         if isinstance(action.value, BitVector) and \
                 action.value.num_bits > max_bits:
-            pokes = []
-            # For some reason, verilator chunks it by 32 instead of max_bits
-            slice_range = 32
-            for i in range(math.ceil(action.value.num_bits / slice_range)):
-                value = action.value[i * slice_range:min(
-                    (i + 1) * slice_range, action.value.num_bits)]
-                pokes += [f"top->{name}[{i}] = {value};"]
             if is_reg_poke:
                 raise NotImplementedError()
-            return pokes
+            words = self.make_wide_words(action.value)
+            code = words + [
+                f"for (int k = 0; k < {self.num_wide_words(action.value)}; "
+                f"k++) top->{name}[k] = fault_wide[k];"
+            ]
+            return ["{"] + [f"{self.TAB}{line}" for line in code] + ["}"]
         else:
             value = action.value
             value = self.process_value(action.port, value)
@@ -449,17 +728,28 @@ if (!({cond})) {{
 
         if isinstance(action.value, BitVector) and \
                 action.value.num_bits > max_bits:
-            asserts = []
-            # For some reason, verilator chunks it by 32 instead of max_bits
-            slice_range = 32
-            for j in range(math.ceil(action.value.num_bits / slice_range)):
-                value = action.value[j * slice_range:min(
-                    (j + 1) * slice_range, action.value.num_bits)]
-                asserts.append(self._make_assert(
-                    f"((unsigned int) top->{name}[{j}])",
-                    f"((unsigned int) {value})", i, f"\"{debug_name}\"",
-                    user_msg))
-            return asserts
+            # compare all words in one loop and report the full value
+            num_words = self.num_wide_words(action.value)
+            got = f"top->{name}"
+            code = self.make_wide_words(action.value) + [
+                "bool fault_wide_ok = true;",
+                f"for (int k = 0; k < {num_words}; k++) "
+                f"fault_wide_ok &= ({got}[k] == fault_wide[k]);"
+            ]
+            if self.collect_failures:
+                # the failure log keeps the 64 least significant bits
+                got, expected = [f"(((vluint64_t) {words}[1] << 32) | "
+                                 f"{words}[0])"
+                                 for words in (got, "fault_wide")]
+                style = 'hex'
+            else:
+                got = f"fault_wide_hex({got}, {num_words})"
+                expected = f"fault_wide_hex(fault_wide, {num_words})"
+                style = 'wide'
+            code += self._make_assert(got, expected, i, f'"{debug_name}"',
+                                      user_msg, style=style,
+                                      cond="fault_wide_ok").splitlines()
+            return ["{"] + [f"{self.TAB}{line}" for line in code] + ["}"]
         else:
             value = self.process_value(action.port, value)
             port_value = f"top->{name}"
@@ -505,20 +795,55 @@ if (!({cond})) {{
 
     def make_step(self, i, action):
         name = verilator_name(action.clock.name)
-        code = []
-        code.append("top->eval();")
-        for step in range(action.steps):
-            code.append("#if VM_TRACE")
-            code.append("tracer->dump(main_time);")
-            code.append("#endif")
-            code.append(f"top->{name} ^= 1;")
-            code.append("top->eval();")
-            code.append("main_time += 5;")
-        return code
+        return ["top->eval();"] + self.make_clock_toggles(i, name, action)
+
+    def make_clock_toggles(self, i, name, action):
+        """
+        Returns code toggling clock `name` `action.steps` times.  More than
+        one toggle is emitted as a loop, so that the size of the driver does
+        not depend on the number of steps.
+        """
+        toggle = [
+            "#if VM_TRACE",
+            "tracer->dump(main_time);",
+            "#endif",
+            f"top->{name} ^= 1;",
+            "top->eval();",
+            "main_time += 5;"
+        ]
+        if action.watch is None:
+            if action.steps == 1:
+                return toggle
+            return self.make_step_loop(i, action.steps, toggle)
+
+        # stop toggling as soon as the watched port changes
+        watch = action.watch
+        if not isinstance(watch, m.Digital) and len(watch) > max_bits:
+            raise NotImplementedError(f"Watching {watch.debug_name}, which "
+                                      f"is wider than {max_bits} bits")
+        watch = self.process_bitwise_expect(
+            watch, f"top->{verilator_name(watch.name)}")
+        watch = f"({watch})"
+        toggle.append(f"if ({watch} != watch_start) break;")
+        code = [f"vluint64_t watch_start = {watch};"]
+        code += self.make_step_loop(i, action.steps, toggle)
+        return ["{"] + [f"{self.TAB}{line}" for line in code] + ["}"]
+
+    def make_step_loop(self, i, steps, body):
+        loop = self.make_loop(i, Loop(steps, "fault_step", []))
+        return loop[:-1] + [f"{self.TAB}{line}" for line in body] + loop[-1:]
 
     def make_join(self, i, action):
         raise NotImplementedError("fork/join not implemented for Verilator")
 
+    def make_table(self, name, rows):
+        code = [f"static const uint64_t {name}[{len(rows)}][{len(rows[0])}] "
+                f"= {{"]
+        for row in rows:
+            code.append(f"{self.TAB}{{{', '.join(f'{v}ULL' for v in row)}}},")
+        code.append("};")
+        return code
+
     def make_file_open(self, i, action):
         # make sure the file mode is supported
         if not is_valid_file_mode(action.file.mode):
@@ -527,7 +852,8 @@ if (!({cond})) {{
         # declare the file read variable if the file mode allows reading
         if file_mode_allows_reading(action.file.mode):
             in_ = self.in_var(action.file)
-            decl_rd_var = [f'char {in_}[{action.file.chunk_size}] = {{0}};']
+            decl_rd_var = [
+                f'unsigned char {in_}[{action.file.chunk_size}] = {{0}};']
         else:
             decl_rd_var = []
 
@@ -539,61 +865,60 @@ if (!({cond})) {{
             If(f'{fd} == NULL', [
                 f'std::cout << "{err_msg}" << std::endl;',
                 f'return 1;'
-            ])
+            ]),
+            # large buffer so that chunks are read and written in bulk
+            f'setvbuf({fd}, NULL, _IOFBF, {file_buffer_size});'
         ])
 
     def make_file_close(self, i, action):
         fd_var = self.fd_var(action.file)
         return [f'fclose({fd_var});']
 
-    def write_byte(self, fd, expr):
-        return f'fputc({expr}, {fd})'
-
     def make_file_write(self, i, action):
         assert file_mode_allows_writing(action.file.mode), \
             f'File mode {action.file.mode} is not compatible with writing.'
 
         idx = 'i'
+        chunk_size = action.file.chunk_size
         fd = self.fd_var(action.file)
         value = f'top->{verilator_name(action.value.name)}'
-        byte_expr = f'({value} >> ({idx} * 8)) & 0xFF'
+        if action.file.endianness == 'big':
+            byte_idx = f'{chunk_size - 1} - {idx}'
+        else:
+            byte_idx = idx
         err_msg = f'Error writing to {action.file.name_without_ext}'
 
-        return self.generate_action_code(i, [
-            Loop(loop_var=idx,
-                 n_iter=action.file.chunk_size,
-                 count='down' if action.file.endianness == 'big' else 'up',
-                 actions=[
-                     'int result = ' + self.write_byte(fd, byte_expr) + ';',
-                     If(f'result == EOF', [
-                         f'std::cout << "{err_msg}" << std::endl;',
-                         'break;'
-                     ]),
-                 ])
+        # assemble the chunk in memory and write it with a single call
+        code = self.generate_action_code(i, [
+            f'unsigned char chunk[{chunk_size}];',
+            Loop(loop_var=idx, n_iter=chunk_size, actions=[
+                f'chunk[{byte_idx}] = ({value} >> ({idx} * 8)) & 0xFF;'
+            ]),
+            If(f'fwrite(chunk, 1, {chunk_size}, {fd}) != {chunk_size}', [
+                f'std::cout << "{err_msg}" << std::endl;'
+            ])
         ])
+        return ['{'] + [f'{self.TAB}{line}' for line in code] + ['}']
 
     def make_file_read(self, i, action):
         assert file_mode_allows_reading(action.file.mode), \
             f'File mode {action.file.mode} is not compatible with reading.'
 
-        idx = 'i'
+        chunk_size = action.file.chunk_size
         fd = self.fd_var(action.file)
         in_ = self.in_var(action.file)
         err_msg = f'Reached end of file {action.file.name_without_ext}'
 
-        return self.generate_action_code(i, [
-            Loop(loop_var=idx,
-                 n_iter=action.file.chunk_size,
-                 count='down' if action.file.endianness == 'big' else 'up',
-                 actions=[
-                     f'int result = fgetc({fd});',
-                     If(f'result == EOF', [
-                         f'std::cout << "{err_msg}" << std::endl;',
-                         'break;'
-                     ]),
-                     f'{in_}[{idx}] = result;'
-                 ])
+        # read the whole chunk at once; the bytes of the input variable are
+        # stored least significant first
+        code = self.generate_action_code(i, [
+            If(f'fread({in_}, 1, {chunk_size}, {fd}) != {chunk_size}', [
+                f'std::cout << "{err_msg}" << std::endl;'
+            ])
         ])
+        if action.file.endianness == 'big' and chunk_size > 1:
+            code += [f'std::reverse({in_}, {in_} + {chunk_size});']
+        return code
 
     def make_var(self, i, action):
         if isinstance(action._type, AbstractBitVectorMeta):
@@ -620,8 +945,57 @@ if (!({cond})) {{
         fd_var = self.fd_var(self.value_file)
         fmt = action.get_format()
         value = f'top->{verilator_name(action.port.name)}'
+        if self.get_value_format == 'binary':
+            if action.real_number_port:
+                slot_type = 'double'
+            elif not isinstance(action.port, m.Digital) and \
+                    len(action.port) > value_file.MAX_SLOT_BITS:
+                raise NotImplementedError(
+                    f'Binary get_value of {action.port.name}, which is '
+                    f'wider than {value_file.MAX_SLOT_BITS} bits')
+            else:
+                slot_type = 'vluint64_t'
+            return [
+                '{',
+                f'{self.TAB}{slot_type} slot = {value};',
+                f'{self.TAB}fwrite(&slot, sizeof(slot), 1, {fd_var});',
+                '}'
+            ]
         return [f'fprintf({fd_var}, "{fmt}\\n", {value});']
 
+    def _check_savable(self, action):
+        if not self.savable:
+            raise ValueError(f"{action} requires a model built with "
+                             f"savable=True")
+
+    def make_checkpoint(self, i, action):
+        self._check_savable(action)
+        return [
+            '{',
+            f'{self.TAB}VerilatedSave os;',
+            f'{self.TAB}os.open("{action.name}");',
+            f'{self.TAB}os << main_time;',
+            f'{self.TAB}os << *top;',
+            '}'
+        ]
+
+    def make_restore(self, i, action):
+        self._check_savable(action)
+        return [
+            '{',
+            f'{self.TAB}VerilatedRestore os;',
+            f'{self.TAB}os.open("{action.name}");',
+            f'{self.TAB}os >> main_time;',
+            f'{self.TAB}os >> *top;',
+            '}'
+        ]
+
+    def make_trace_on(self, i, action):
+        return ["#if VM_TRACE", "tracer->enabled = true;", "#endif"]
+
+    def make_trace_off(self, i, action):
+        return ["#if VM_TRACE", "tracer->enabled = false;", "#endif"]
+
     def make_assert(self, i, action):
         expr_str = self.compile_expression(action.expr)
         return f"""
@@ -646,30 +1020,14 @@ if (!({expr_str})) {{
             '"verilated.h"',
             '<iostream>',
             '<fstream>',
-            '<verilated_vcd_c.h>',
+            '<algorithm>',
+            '<iomanip>',
+            '<sstream>',
+            f'<{self.trace_header}>',
             '<sys/types.h>',
             '<sys/stat.h>',
         ]
 
-        # if we're using the GetValue feature, then we need to open/close a
-        # file in which GetValue results will be written
-        if any(isinstance(action, GetValue) for action in actions):
-            actions = [FileOpen(self.value_file)] + actions
-            actions += [FileClose(self.value_file)]
-
-        main_body = ""
-        for i, action in enumerate(actions):
-            code = self.generate_action_code(i, action)
-            for line in code:
-                main_body += f"  {line}\n"
-
-        for i in range(num_tests):
-            main_body += self.add_assumptions(circuit, actions, i)
-            code = self.make_eval(i, Eval())
-            for line in code:
-                main_body += f"  {line}\n"
-            main_body += self.add_guarantees(circuit, actions, i)
-
         # Add includes from sub-modules (for internal wire selects).
         headers = glob.glob(os.path.join(self.directory, "obj_dir") + "/V*.h")
         headers = list(map(os.path.basename, headers))
@@ -678,6 +1036,9 @@ if (!({expr_str})) {{
         if self.coverage:
             includes += ["\"verilated_cov.h\""]
 
+        if self.savable:
+            includes += ["\"verilated_save.h\""]
+
         includes_src = "\n".join(["#include " + i for i in includes])
         if self.use_kratos:
             includes_src += "\nvoid initialize_runtime();\n"
@@ -688,32 +1049,168 @@ if (!({expr_str})) {{
             kratos_start_call = ""
             kratos_exit_call = ""
 
+        # if we're using the GetValue feature, then we need to open/close a
+        # file in which GetValue results will be written
+        if any(isinstance(action, GetValue) for action in actions):
+            actions = [FileOpen(self.value_file)] + actions
+            actions += [FileClose(self.value_file)]
+
+        failure_log_open = self.make_failure_log_open()
+        indexed_actions = list(self.enumerate_actions(actions))
+        self.driver_chunks = []
+        if self.driver_chunk_size is not None and \
+                not self.collect_failures and \
+                self.can_split_driver(actions):
+            # main only calls the chunk functions, which share the model
+            # through a global "top"
+            chunk_size = self.driver_chunk_size
+            main_body = ""
+            globals_ = f"V{self.circuit_name}* top;\n"
+            for start in range(0, len(indexed_actions), chunk_size):
+                function_name = self.make_chunk(
+                    indexed_actions[start:start + chunk_size], includes_src)
+                main_body += f"  {function_name}();\n"
+                globals_ += f"void {function_name}();\n"
+            top_init = f"top = new V{self.circuit_name};"
+        else:
+            main_body = "".join(f"  {line}\n" for line in failure_log_open)
+            for i, action in indexed_actions:
+                code = self.generate_action_code(i, action)
+                for line in code:
+                    main_body += f"  {line}\n"
+            globals_ = ""
+            top_init = f"V{self.circuit_name}* top = new V{self.circuit_name};"
+
+        for i in range(num_tests):
+            main_body += self.add_assumptions(circuit, actions, i)
+            code = self.make_eval(i, Eval())
+            for line in code:
+                main_body += f"  {line}\n"
+            main_body += self.add_guarantees(circuit, actions, i)
+
+        for line in self.make_failure_log_close():
+            main_body += f"  {line}\n"
+
         src = src_tpl.format(
             includes=includes_src,
+            globals=globals_,
+            top_init=top_init,
             main_body=main_body,
             circuit_name=self.circuit_name,
+            tracer_def=self.tracer_def,
+            wide_hex_def=wide_hex_def,
+            trace_depth=self.trace_depth,
+            trace_scope=self.trace_scope_src,
+            trace_ext=TRACE_FORMATS[self.trace_format][2],
             kratos_start_call=kratos_start_call,
             kratos_exit_call=kratos_exit_call
         )
 
         return src
 
+    @property
+    def trace_header(self):
+        return TRACE_FORMATS[self.trace_format][1]
+
+    @property
+    def tracer_def(self):
+        return tracer_tpl.format(
+            tracer_class=TRACE_FORMATS[self.trace_format][0])
+
+    @property
+    def trace_scope_src(self):
+        # restrict the traced signals to the scope (must precede open)
+        if self.trace_scope is None:
+            return ""
+        return f'\n  tracer->dumpvars(0, "{self.trace_scope}");'
+
+    @staticmethod
+    def can_split_driver(actions):
+        # Variables and file handles are local to main, so actions using them
+        # must stay in a single function
+        return not any(isinstance(action, (FileOpen, Var))
+                       for action in actions)
+
+    def make_chunk(self, indexed_actions, includes_src):
+        k = len(self.driver_chunks) + 1
+        function_name = f"fault_driver_chunk_{k}"
+        body = ""
+        for i, action in indexed_actions:
+            for line in self.generate_action_code(i, action):
+                body += f"  {line}\n"
+        src = chunk_tpl.format(
+            includes=includes_src,
+            first=indexed_actions[0][0],
+            last=indexed_actions[-1][0],
+            circuit_name=self.circuit_name,
+            tracer_def=self.tracer_def,
+            wide_hex_def=wide_hex_def,
+            function_name=function_name,
+            body=body
+        )
+        self.driver_chunks.append((f"{self.circuit_name}_driver_{k}", src))
+        return function_name
+
+    @property
+    def stimulus_file(self):
+        return self.directory / Path(f"{self.circuit_name}_stimulus.bin")
+
+    def generate_stream_code(self, actions, num_tests):
+        if num_tests > 0:
+            raise NotImplementedError("Assumptions and guarantees are not "
+                                      "supported by the data-driven driver")
+        ports = stream_ports(self.circuit)
+        with open(self.stimulus_file, "wb") as f:
+            f.write(encode_stimulus(actions, ports))
+        includes = [
+            f'"V{self.circuit_name}.h"',
+            '"verilated.h"',
+            '<iostream>',
+            f'<{self.trace_header}>',
+            '<sys/types.h>',
+            '<sys/stat.h>',
+        ]
+        if self.coverage:
+            includes += ["\"verilated_cov.h\""]
+        tracer_class, _, trace_ext = TRACE_FORMATS[self.trace_format]
+        return generate_stream_driver(self.circuit_name, ports, includes,
+                                      self.stimulus_file.name,
+                                      self.value_file.name,
+                                      tracer_class=tracer_class,
+                                      trace_ext=trace_ext,
+                                      trace_depth=self.trace_depth,
+                                      trace_scope=self.trace_scope_src)
+
     def generate_test_bench(self, actions, verilator_includes=None,
                             num_tests=0, _circuit=None):
         # Set default
         if verilator_includes is None:
             verilator_includes = []
         # Write the verilator driver to file.
-        src = self.generate_code(actions, verilator_includes, num_tests,
-                                 _circuit)
+        if self.data_driven:
+            src = self.generate_stream_code(actions, num_tests)
+        else:
+            src = self.generate_code(actions, verilator_includes, num_tests,
+                                     _circuit)
         driver_file = self.directory / Path(f"{self.circuit_name}_driver.cpp")
-        with open(driver_file, "w") as f:
-            f.write(src)
+        self._write_source(driver_file, src)
+        for name, chunk_src in self.driver_chunks:
+            self._write_source(self.directory / f"{name}.cpp", chunk_src)
         return driver_file
 
+    @staticmethod
+    def _write_source(filename, src):
+        # Leave an unchanged file untouched so that make does not rebuild it
+        if not (filename.is_file() and filename.read_text() == src):
+            with open(filename, "w") as f:
+                f.write(src)
+
     def run(self, actions, verilator_includes=None, num_tests=0,
             _circuit=None):
 
+        if self.pgo_training is not None and not self.pgo_trained:
+            self.train_pgo_profile(verilator_includes)
+
         self.generate_test_bench(actions, verilator_includes, num_tests,
                                  _circuit)
 
@@ -730,28 +1227,173 @@ if (!({expr_str})) {{
         else:
             env = None
 
-        # Run makefile created by verilator
-        make_cmd = verilator_make_cmd(self.circuit_name)
-        subprocess_run(make_cmd, cwd=self.directory, disp_type=self.disp_type)
+        self.build_executable()
 
         # create the logs folder if necessary
         logs = Path(self.directory) / "logs"
         if not os.path.isdir(logs):
             os.mkdir(logs)
 
-        # Run the executable created by verilator and write the standard
-        # output to a logfile for later review or processing
-        exe_cmd = [f'./obj_dir/V{self.circuit_name}']
-        result = subprocess_run(exe_cmd, cwd=self.directory,
-                                disp_type=self.disp_type,
-                                env=env)
+        # Run the executable created by verilator, streaming its output to a
+        # logfile for later review or processing
         log = Path(self.directory) / 'obj_dir' / f'{self.circuit_name}.log'
-        with open(log, 'w') as f:
-            f.write(result.stdout)
+        subprocess_run(self.exe_cmd(), cwd=self.directory,
+                       disp_type=self.disp_type, env=env, log_file=log,
+                       timeout=self.timeout, job_slots=self.sim_job_slots)
 
         # post-process GetValue actions
         self.post_process_get_value_actions(actions)
 
+        # report all failed expects at once
+        self.check_failure_log()
+
+    def tune_threads(self, comp_args, tuning_actions, thread_counts=None):
+        """
+        Runs `tuning_actions` on models verilated with each of
+        `thread_counts` threads and returns the fastest number of threads
+        (None for the single-threaded model).  The result is recorded in the
+        build directory and reused as long as the design does not change.
+        """
+        if thread_counts is None:
+            thread_counts = [1]
+            while thread_counts[-1] * 2 <= available_cores():
+                thread_counts.append(thread_counts[-1] * 2)
+        tuning_actions = getattr(tuning_actions, 'actions', tuning_actions)
+
+        record_file = self.directory / "verilator_threads.json"
+        key = hash_build_inputs(
+            verilator_comp_cmd(**comp_args),
+            self.verilator_version,
+            self.directory / comp_args['verilog_filename'],
+            [self.directory / lib for lib in self.include_verilog_libraries],
+            thread_counts,
+            [str(action) for action in tuning_actions]
+        )
+        if record_file.is_file():
+            with open(record_file) as f:
+                record = json.load(f)
+            if record["key"] == key:
+                return record["threads"]
+
+        obj_dir = self.directory / "obj_dir"
+        timings = {}
+        for count in thread_counts:
+            # a single thread is benchmarked with the non-threaded model
+            threads = count if count > 1 else None
+            shutil.rmtree(obj_dir, ignore_errors=True)
+            comp_cmd = verilator_comp_cmd(threads=threads, **comp_args)
+            subprocess_run(comp_cmd, cwd=self.directory, shell=True,
+                           disp_type=self.disp_type, job_slots=1)
+            self.generate_test_bench(tuning_actions)
+            self.make(self.opt_flags())
+            # hold a job slot per thread so that the timing isn't skewed by
+            # other jobs on the host
+            with hold_job_slots(count):
+                start = time.perf_counter()
+                subprocess_run(self.exe_cmd(), cwd=self.directory,
+                               disp_type=self.disp_type)
+                timings[count] = time.perf_counter() - start
+            logging.info(f"{self.circuit_name} with {count} thread(s): "
+                         f"{timings[count]:.3f}s")
+        shutil.rmtree(obj_dir, ignore_errors=True)
+
+        best = min(timings, key=timings.get)
+        threads = best if best > 1 else None
+        with open(record_file, "w") as f:
+            json.dump({"key": key, "threads": threads, "timings": timings},
+                      f, indent=2)
+        return threads
+
+    def exe_cmd(self):
+        exe_cmd = [f'./obj_dir/V{self.circuit_name}']
+        if self.data_driven:
+            exe_cmd += [self.stimulus_file.name, self.value_file.name]
+        return exe_cmd
+
+    def pgo_training_actions(self):
+        if self.pgo_training is None:
+            return None
+        # accept Testers as well as lists of actions
+        training_actions = getattr(self.pgo_training, 'actions',
+                                   self.pgo_training)
+        return [str(action) for action in training_actions]
+
+    def opt_flags(self, profile_generate=False):
+        flags = []
+        if profile_generate:
+            flags += ['-fprofile-generate']
+        elif self.pgo_training is not None:
+            flags += ['-fprofile-use', '-fprofile-correction']
+        if self.lto:
+            flags += ['-flto']
+        if self.march_native:
+            flags += ['-march=native']
+        return flags
+
+    def train_pgo_profile(self, verilator_includes=None):
+        """
+        Builds the model with profiling instrumentation and runs the training
+        test, which writes the profile used by the following builds
+        """
+        training_actions = getattr(self.pgo_training, 'actions',
+                                   self.pgo_training)
+        includes = list(verilator_includes) if verilator_includes else []
+        self.generate_test_bench(training_actions, includes)
+        self.make(self.opt_flags(profile_generate=True), always_make=True)
+        logging.info(f"Running PGO training test of {self.circuit_name}")
+        subprocess_run(self.exe_cmd(), cwd=self.directory,
+                       disp_type=self.disp_type, job_slots=self.sim_job_slots)
+
+        # The profile of the training driver does not match the drivers of
+        # the tests, so only the profile of the model is kept
+        obj_dir = self.directory / "obj_dir"
+        for profile in obj_dir.glob(f"{self.circuit_name}_driver*.gcda"):
+            profile.unlink()
+        self.pgo_trained = True
+        self.pgo_rebuild = True
+
+    @property
+    def sim_job_slots(self):
+        # a simulation holds a job slot per thread of the model
+        return self.threads if self.threads is not None else 1
+
+    def make(self, opt_flags, always_make=False):
+        # Run makefile created by verilator
+        user_classes = None
+        if self.driver_chunks:
+            user_classes = [f"{self.circuit_name}_driver"]
+            user_classes += [name for name, _ in self.driver_chunks]
+        # make runs one job per host-wide job slot it gets
+        with hold_job_slots(1, extra=available_cores() - 1) as jobs:
+            make_cmd = verilator_make_cmd(self.circuit_name, user_classes,
+                                          opt_flags=opt_flags,
+                                          always_make=always_make, jobs=jobs)
+            if self.lto:
+                # index the LTO objects in the archive of the model
+                make_cmd += ['AR=gcc-ar']
+            subprocess_run(make_cmd, cwd=self.directory,
+                           disp_type=self.disp_type)
+
+    def build_executable(self):
+        # Rebuild everything with the profile right after the PGO training
+        self.make(self.opt_flags(), always_make=self.pgo_rebuild)
+        self.pgo_rebuild = False
+
+        # Save the compiled model for later builds of the same design
+        if self.build_cache is not None:
+            self.build_cache.store(self.build_cache_key,
+                                   self.directory / "obj_dir",
+                                   ignore=self.build_cache_ignore)
+
+    def build_cache_ignore(self, src, names):
+        # Only the verilated model is cached, not the test-specific driver,
+        # executable, or logs
+        driver = f"{self.circuit_name}_driver"
+        return [name for name in names
+                if name in (f"V{self.circuit_name}",
+                            f"{self.circuit_name}.log")
+                or name.startswith(driver)]
+
     def add_assumptions(self, circuit, actions, i):
         main_body = ""
         for port in circuit.interface.ports.values():
@@ -813,12 +1455,4 @@ class SynchronousVerilatorTarget(VerilatorTarget):
         self.clock = verilator_name(clock.name)
 
     def make_step(self, i, action):
-        code = []
-        for _ in range(action.steps):
-            code.append("#if VM_TRACE")
-            code.append("tracer->dump(main_time);")
-            code.append("#endif")
-            code.append(f"top->{self.clock} ^= 1;")
-            code.append("top->eval();")
-            code.append("main_time += 5;")
-        return code
+        return self.make_clock_toggles(i, self.clock, action)
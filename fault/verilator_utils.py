@@ -1,17 +1,23 @@
-from .subprocess_run import subprocess_run
+from .tools import tool_version, which
 import os
 
 
-def verilator_version(disp_type='on_error'):
-    # assemble the command
-    cmd = ['verilator', '--version']
+# Tracer class, header, and file extension of the supported waveform formats
+TRACE_FORMATS = {
+    'vcd': ('VerilatedVcdC', 'verilated_vcd_c.h', 'vcd'),
+    'fst': ('VerilatedFstC', 'verilated_fst_c.h', 'fst'),
+}
 
-    # run the command and parse out the version number
-    result = subprocess_run(cmd, shell=True, disp_type=disp_type)
-    version = float(result.stdout.split()[1])
 
-    # return version number
-    return version
+def verilator_version(disp_type='on_error'):
+    # the version is probed once per process (see fault.tools)
+    version = tool_version('verilator', disp_type=disp_type)
+    if version is None:
+        if which('verilator') is None:
+            raise FileNotFoundError('verilator was not found on the PATH')
+        raise ValueError('Could not parse the output of '
+                         '"verilator --version"')
+    return float(version)
 
 
 def verilator_comp_cmd(top=None, verilog_filename=None,
@@ -19,7 +25,8 @@ def verilator_comp_cmd(top=None, verilog_filename=None,
                        include_directories=None,
                        driver_filename=None, verilator_flags=None,
                        coverage=False, use_kratos=False,
-                       defines=None, parameters=None):
+                       defines=None, parameters=None, savable=False,
+                       threads=None):
     # set defaults
     if include_verilog_libraries is None:
         include_verilog_libraries = []
@@ -75,16 +82,35 @@ def verilator_comp_cmd(top=None, verilog_filename=None,
         retval += ["--vpi"]
     if coverage:
         retval += ["--coverage"]
+    # allow saving and restoring the state of the model
+    if savable:
+        retval += ["--savable"]
+    # multi-threaded model
+    if threads is not None:
+        retval += ["--threads", f"{threads}"]
 
     # return the command
     return retval
 
 
-def verilator_make_cmd(top):
+def verilator_make_cmd(top, user_classes=None, opt_flags=None,
+                       always_make=False, jobs=None):
     cmd = []
     cmd += ['make']
     cmd += ['-C', 'obj_dir']
-    cmd += ['-j']
+    # unbounded unless the number of parallel jobs is given
+    cmd += ['-j' if jobs is None else f'-j{jobs}']
+    # rebuild all objects, e.g. when changing the optimization flags
+    if always_make:
+        cmd += ['-B']
     cmd += ['-f', f'V{top}.mk']
     cmd += [f'V{top}']
+    # override the list of driver files passed to verilator with --exe, so
+    # that drivers split into several files are compiled in parallel
+    if user_classes is not None:
+        cmd += [f'VM_USER_CLASSES={" ".join(user_classes)}']
+    # additional flags for compiling and linking the model and driver
+    if opt_flags:
+        cmd += [f'OPT={" ".join(opt_flags)}']
+        cmd += [f'LDFLAGS={" ".join(opt_flags)}']
     return cmd
@@ -6,7 +6,19 @@ from pathlib import Path
 import fault.actions as actions
 from fault.util import flatten
 import os
+import threading
 from fault.select_path import SelectPath
+from fault.loop_compression import CompressedLoop, compress_actions
+from fault.failure_log import read_failure_log
+from fault.fault_errors import ExpectFailures
+import fault.value_file as value_file
+from fault.magma_cache import magma_cache_key, compile_cached
+import logging
+
+
+# magma keeps global compilation state, so targets built concurrently (e.g.,
+# by compile_async) take turns compiling their circuits
+magma_compile_lock = threading.Lock()
 
 
 class VerilogTarget(Target):
@@ -22,7 +34,10 @@ class VerilogTarget(Target):
     def __init__(self, circuit, circuit_name=None, directory="build/",
                  skip_compile=False, include_verilog_libraries=None,
                  magma_output="verilog", magma_opts=None, coverage=False,
-                 use_kratos=False, value_file_name='get_value_file.txt'):
+                 use_kratos=False, value_file_name='get_value_file.txt',
+                 compress_loops=False, collect_failures=False,
+                 get_value_format='text', use_magma_cache=False,
+                 build_cache_dir=None):
         super().__init__(circuit)
 
         self.circuit_name = circuit_name
@@ -55,26 +70,68 @@ class VerilogTarget(Target):
         self.verilog_file = Path(f"{self.circuit_name}.{suffix}")
         # Optionally compile this module to verilog first.
         if not self.skip_compile:
-            prefix = os.path.splitext(self.directory / self.verilog_file)[0]
-            m.compile(prefix, self.circuit, output=self.magma_output,
-                      **self.magma_opts)
-            if use_kratos:
-                # kratos generates SystemVerilog file
-                # Until magma/coreir can generate sv suffix, we have to move
-                # the files around
-                os.rename(prefix + ".v", prefix + ".sv")
+            def compile_circuit(prefix):
+                with magma_compile_lock:
+                    m.compile(prefix, self.circuit, output=self.magma_output,
+                              **self.magma_opts)
+                if use_kratos:
+                    # kratos generates SystemVerilog file
+                    # Until magma/coreir can generate sv suffix, we have to
+                    # move the files around
+                    os.rename(prefix + ".v", prefix + ".sv")
+
+            if use_magma_cache:
+                # reuse the files generated for the same circuit and options
+                basename = os.path.splitext(self.verilog_file)[0]
+                key = magma_cache_key(self.circuit, str(self.verilog_file),
+                                      self.magma_output, self.magma_opts)
+                if compile_cached(compile_circuit, self.directory, basename,
+                                  key, build_cache_dir):
+                    logging.info(f"Restored generated Verilog of "
+                                 f"{self.circuit_name} from build cache")
+            else:
+                compile_circuit(
+                    os.path.splitext(self.directory / self.verilog_file)[0])
             if not (self.directory / self.verilog_file).is_file():
                 raise Exception(f"Compiling {self.circuit} failed")
 
         self.assumptions = []
         self.guarantees = []
 
-        # set up value file for storing user-accessible resuls
+        # set up value file for storing user-accessible resuls, either as
+        # lines of text or as binary slots (see fault.value_file)
+        if get_value_format == 'text':
+            value_file_mode = 'w'
+        elif get_value_format == 'binary':
+            value_file_name = os.path.splitext(value_file_name)[0] + '.bin'
+            value_file_mode = 'wb'
+        else:
+            raise ValueError(f'Unknown get_value_format: {get_value_format}')
+        self.get_value_format = get_value_format
         value_file_path = (Path(self.directory) / value_file_name).resolve()
         self.value_file = File(name=str(value_file_path), tester=None,
-                               mode='w', chunk_size=None, endianness=None)
+                               mode=value_file_mode, chunk_size=None,
+                               endianness=None)
+        # GetValue actions of the last run
+        self.get_value_actions = []
         # coverage
         self.coverage = coverage
+        # replace runs of repeated actions by loops over constant tables
+        self.compress_loops = compress_loops
+
+        # log failed expects instead of stopping at the first one
+        self.collect_failures = collect_failures
+        failure_file_path = (Path(self.directory) /
+                             'failure_log.bin').resolve()
+        self.failure_file = File(name=str(failure_file_path), tester=None,
+                                 mode='wb', chunk_size=None, endianness=None)
+        # names of the ports referred to by the records of the failure log
+        self.failure_ports = []
+        # failures found by the last run if collect_failures is set
+        self.failures = []
+        # index of the first action passed to run in the whole test (a shard
+        # of a test starts at a nonzero offset), used in failure reports
+        self.action_offset = 0
 
     @abstractmethod
     def compile_expression(self, value):
@@ -163,8 +220,31 @@ class VerilogTarget(Target):
             return self.make_get_value(i, action)
         elif isinstance(action, actions.Assert):
             return self.make_assert(i, action)
+        elif isinstance(action, actions.Checkpoint):
+            return self.make_checkpoint(i, action)
+        elif isinstance(action, actions.Restore):
+            return self.make_restore(i, action)
+        elif isinstance(action, actions.TraceOn):
+            return self.make_trace_on(i, action)
+        elif isinstance(action, actions.TraceOff):
+            return self.make_trace_off(i, action)
+        elif isinstance(action, actions.ShardBoundary):
+            # only marks where the test may be split (see
+            # SystemVerilogTarget.run_shards)
+            return []
+        elif isinstance(action, CompressedLoop):
+            return self.make_compressed_loop(i, action)
         raise NotImplementedError(action)
 
+    def enumerate_actions(self, actions):
+        """
+        Returns (index, action) pairs for the top-level actions of the test
+        bench, compressing repeated actions into loops if enabled
+        """
+        if self.compress_loops:
+            return compress_actions(actions, offset=self.action_offset)
+        return enumerate(actions, self.action_offset)
+
     @abstractmethod
     def make_poke(self, i, action):
         pass
@@ -208,6 +288,27 @@ class VerilogTarget(Target):
         # return code representing the for loop
         return self.make_block(i, 'for', cond, action.actions)
 
+    def make_compressed_loop(self, i, action):
+        code = []
+        if action.table is not None:
+            code += self.make_table(action.table_name, action.table)
+        loop_code = self.make_loop(i, actions.Loop(action.n_iter,
+                                                   action.loop_var, []))
+        body = []
+        for j, body_action in enumerate(action.body):
+            # pass the index of the original action so that failures are
+            # reported the same way as without compression
+            body += [f'{self.TAB}{line}' for line in
+                     self.generate_action_code(action.index(j), body_action)]
+        return code + loop_code[:-1] + body + loop_code[-1:]
+
+    def make_table(self, name, rows):
+        """
+        Declare a constant two-dimensional table `name` of unsigned 64-bit
+        integers (used by compressed loops).  Returns a list of lines of code.
+        """
+        raise NotImplementedError()
+
     @abstractmethod
     def make_join(self, i, action):
         pass
@@ -265,6 +366,22 @@ class VerilogTarget(Target):
     def make_assert(self, i, action):
         pass
 
+    def make_checkpoint(self, i, action):
+        raise NotImplementedError(f"{action} is not supported by "
+                                  f"{type(self).__name__}")
+
+    def make_restore(self, i, action):
+        raise NotImplementedError(f"{action} is not supported by "
+                                  f"{type(self).__name__}")
+
+    def make_trace_on(self, i, action):
+        raise NotImplementedError(f"{action} is not supported by "
+                                  f"{type(self).__name__}")
+
+    def make_trace_off(self, i, action):
+        raise NotImplementedError(f"{action} is not supported by "
+                                  f"{type(self).__name__}")
+
     def make_block(self, i, name, cond, actions, label=None):
         '''
         Generic function that creates a properly indented code block.  This
@@ -302,12 +419,74 @@ class VerilogTarget(Target):
     def post_process_get_value_actions(self, all_actions):
         get_value_actions = [action for action in all_actions
                              if isinstance(action, actions.GetValue)]
-        if len(get_value_actions) > 0:
+        self.get_value_actions = get_value_actions
+        if len(get_value_actions) == 0:
+            return
+        if self.get_value_format == 'binary':
+            value_file.fill_get_values(self.value_file.name,
+                                       get_value_actions)
+        else:
             with open(self.value_file.name, 'r') as f:
                 lines = f.readlines()
             for line, action in zip(lines, get_value_actions):
                 action.update_from_line(line)
 
+    def get_value_arrays(self, mmap=False):
+        '''
+        Returns a dictionary mapping the name of each port sampled by the
+        GetValue actions of the last run to a NumPy array of its samples.
+        Requires get_value_format="binary".
+        '''
+        if self.get_value_format != 'binary':
+            raise ValueError('get_value_arrays requires '
+                             'get_value_format="binary"')
+        return value_file.get_value_arrays(self.value_file.name,
+                                           self.get_value_actions, mmap=mmap)
+
+    def make_failure_log_open(self):
+        '''
+        Returns code opening the failure log if failures are collected.  Must
+        be called before generating the code of the actions.
+        '''
+        self.failure_ports = []
+        if not self.collect_failures:
+            return []
+        return self.make_file_open(0, actions.FileOpen(self.failure_file))
+
+    def make_failure_log_close(self):
+        '''Returns code closing the failure log if failures are collected'''
+        if not self.collect_failures:
+            return []
+        return self.make_file_close(0, actions.FileClose(self.failure_file))
+
+    def failure_port_id(self, name):
+        '''Index of port `name` in the records of the failure log'''
+        name = str(name)
+        if name not in self.failure_ports:
+            self.failure_ports.append(name)
+        return self.failure_ports.index(name)
+
+    def make_failure_record(self, i, port, kind, fields):
+        '''
+        Returns code appending a record for a failed expect of action `i` on
+        `port` to the failure log (see `fault.failure_log`).  `fields` are the
+        expressions of the values stored for `kind`, where None stands for a
+        missing bound of a range check.
+        '''
+        raise NotImplementedError()
+
+    def check_failure_log(self):
+        '''
+        Reads the failure log written by the last run (if failures are
+        collected) and raises ExpectFailures if any expect failed
+        '''
+        if not self.collect_failures:
+            return
+        self.failures = read_failure_log(self.failure_file.name,
+                                         self.failure_ports)
+        if self.failures:
+            raise ExpectFailures(self.failures)
+
     @staticmethod
     def in_var(file):
         '''Name of variable used to read in contents of file.'''
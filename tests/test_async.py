@@ -0,0 +1,73 @@
+import asyncio
+import os
+import tempfile
+import pytest
+import fault
+import fault.async_run
+import fault.config
+from .common import TestBasicClkCircuit, TestByteCircuit
+
+
+def make_tester(circ, value):
+    tester = fault.Tester(circ)
+    tester.circuit.I = value
+    tester.eval()
+    tester.circuit.O.expect(value)
+    return tester
+
+
+def test_compile_and_run_async():
+    testers = [make_tester(TestByteCircuit, value) for value in range(4)]
+    testers.append(make_tester(TestBasicClkCircuit, 1))
+
+    async def main():
+        await asyncio.gather(*(
+            tester.compile_and_run_async("verilator", tmp_dir=True,
+                                         flags=["-Wno-fatal"])
+            for tester in testers))
+
+    fault.async_run.set_max_concurrency(2)
+    try:
+        asyncio.run(main())
+    finally:
+        fault.async_run.set_max_concurrency(None)
+
+
+def test_run_async_failure():
+    tester = make_tester(TestByteCircuit, 3)
+    tester.circuit.O.expect(4)
+
+    async def main(directory):
+        await tester.compile_async("verilator", directory=directory,
+                                   flags=["-Wno-fatal"])
+        await tester.run_async("verilator")
+
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        with pytest.raises(AssertionError):
+            asyncio.run(main(tempdir))
+
+
+def test_compile_and_run_async_callee_file_dir():
+    file_dir = os.path.dirname(os.path.abspath(__file__))
+    testers = [make_tester(TestByteCircuit, value) for value in range(2)]
+
+    async def main(directories):
+        await asyncio.gather(*(
+            tester.compile_and_run_async("verilator", directory=directory,
+                                         flags=["-Wno-fatal"])
+            for tester, directory in zip(testers, directories)))
+
+    with tempfile.TemporaryDirectory(dir=file_dir) as tempdir:
+        # relative to this file, not to the asyncio module scheduling the
+        # coroutines
+        directories = [os.path.join(os.path.basename(tempdir), f"async_{k}")
+                       for k in range(2)]
+        fault.config.set_test_dir('callee_file_dir')
+        try:
+            asyncio.run(main(directories))
+        finally:
+            fault.config.set_test_dir('normal')
+        for k in range(2):
+            driver = os.path.join(tempdir, f"async_{k}",
+                                  "ByteCircuit_driver.cpp")
+            assert os.path.isfile(driver)
@@ -0,0 +1,73 @@
+import struct
+import tempfile
+import pytest
+import fault
+from fault.failure_log import (read_failure_log, parse_failure_messages,
+                               FAILURE_VALUE, FAILURE_REAL, FAILURE_RANGE)
+from fault.fault_errors import ExpectFailures
+from .common import pytest_sim_params, TestByteCircuit
+
+
+def pytest_generate_tests(metafunc):
+    pytest_sim_params(metafunc, 'system-verilog', 'verilator')
+
+
+def test_read_failure_log():
+    data = struct.pack("<IHBQQ", 3, 1, FAILURE_VALUE, 0x12, 0x34)
+    data += struct.pack("<IHBdd", 7, 0, FAILURE_REAL, 1.5, 2.5)
+    data += struct.pack("<IHBddd", 9, 0, FAILURE_RANGE, 0.5, 1.0,
+                        float("nan"))
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        filename = f"{tempdir}/failure_log.bin"
+        with open(filename, "wb") as f:
+            f.write(data)
+        failures = read_failure_log(filename, ["a", "b"])
+    assert [(f.index, f.port) for f in failures] == [(3, "b"), (7, "a"),
+                                                     (9, "a")]
+    assert str(failures[0]) == \
+        "Failed on action=3 checking port b.  Expected 0x34, got 0x12."
+    assert (failures[1].got, failures[1].expected) == (1.5, 2.5)
+    assert (failures[2].above, failures[2].below) == (1.0, None)
+
+
+def test_parse_failure_messages():
+    text = (
+        "ERROR: tb.sv:30: Failed on action=3 checking port b.  Expected 34, "
+        "got 12.\n"
+        "       Time: 5 Scope: Foo_tb\n"
+        "Failed on action=7 checking port a with traceback t.py:8.  "
+        "Expected 0.500000 to 1.000000, got 1.500000.\n"
+        "Failed on action=9 checking port a.  Expected 0f, got xx\n"
+        "custom message.\n"
+    )
+    failures = parse_failure_messages(text)
+    assert [(f.index, f.port) for f in failures] == [(3, "b"), (7, "a"),
+                                                     (9, "a")]
+    assert str(failures[0]) == \
+        "Failed on action=3 checking port b.  Expected 0x34, got 0x12."
+    assert (failures[1].above, failures[1].below) == (0.5, 1.0)
+    assert (failures[2].expected, failures[2].got) == (0xf, "xx")
+
+
+def test_collect_failures(target, simulator):
+    circ = TestByteCircuit
+    tester = fault.Tester(circ)
+    for i in range(8):
+        tester.circuit.I = i
+        tester.eval()
+        # every other expect fails
+        tester.circuit.O.expect(i + (i % 2))
+    kwargs = {}
+    if target == "verilator":
+        kwargs["flags"] = ["-Wno-fatal"]
+    else:
+        kwargs["simulator"] = simulator
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        with pytest.raises(ExpectFailures) as excinfo:
+            tester.compile_and_run(target, directory=tempdir,
+                                   collect_failures=True, **kwargs)
+    failures = excinfo.value.failures
+    assert [f.index for f in failures] == [5, 11, 17, 23]
+    assert all(f.port == "O" for f in failures)
+    assert [(f.got, f.expected) for f in failures] == \
+        [(i, i + 1) for i in range(1, 8, 2)]
@@ -1,6 +1,10 @@
 from pathlib import Path
+import tempfile
+import numpy as np
 import fault
 import magma as m
+from fault.actions import GetValue
+from fault.value_file import fill_get_values, get_value_arrays
 from .common import pytest_sim_params
 
 
@@ -44,3 +48,44 @@ def test_get_value_digital(target, simulator):
     for a, b_meas in zip(stim, output):
         b_expct = model(a)
         assert b_meas.value == b_expct
+
+
+def test_get_value_digital_binary(target, simulator):
+    tester = fault.Tester(MyAdder)
+    stim = list(range(16))
+    output = []
+    for a in stim:
+        tester.poke(MyAdder.a, a)
+        tester.eval()
+        output.append(tester.get_value(MyAdder.b))
+
+    kwargs = dict(
+        target=target,
+        get_value_format='binary'
+    )
+    if target == 'system-verilog':
+        kwargs['simulator'] = simulator
+    elif target == 'verilator':
+        kwargs['flags'] = ['-Wno-fatal']
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run(directory=tempdir, **kwargs)
+        arrays = tester.targets[target].get_value_arrays(mmap=True)
+        assert list(arrays) == ['b']
+        assert arrays['b'].tolist() == [(a + 1) % 16 for a in stim]
+        del arrays
+
+    for a, b_meas in zip(stim, output):
+        assert b_meas.value == (a + 1) % 16
+
+
+def test_value_file_columns():
+    a, b = MyAdder.a, MyAdder.b
+    get_value_actions = [GetValue(a), GetValue(b), GetValue(a), GetValue(b)]
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        filename = Path(tempdir) / 'values.bin'
+        np.array([1, 2, 3, 4], dtype='<u8').tofile(filename)
+        fill_get_values(filename, get_value_actions)
+        assert [action.value for action in get_value_actions] == [1, 2, 3, 4]
+        arrays = get_value_arrays(filename, get_value_actions)
+        assert arrays['a'].tolist() == [1, 3]
+        assert arrays['b'].tolist() == [2, 4]
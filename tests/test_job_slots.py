@@ -0,0 +1,30 @@
+import threading
+import time
+from fault.job_slots import hold_job_slots
+
+
+def test_job_slots(tmp_path, monkeypatch):
+    monkeypatch.setenv("FAULT_JOB_SLOTS", "2")
+    monkeypatch.setenv("FAULT_JOB_SLOT_DIR", str(tmp_path))
+    entered = []
+
+    def job():
+        with hold_job_slots() as num:
+            entered.append(num)
+
+    with hold_job_slots(1, extra=4) as num:
+        # extra slots are limited by the total
+        assert num == 2
+        thread = threading.Thread(target=job)
+        thread.start()
+        time.sleep(0.2)
+        # all slots are taken, so the job waits
+        assert entered == []
+    thread.join(timeout=10)
+    assert entered == [1]
+
+
+def test_job_slots_disabled(monkeypatch):
+    monkeypatch.setenv("FAULT_JOB_SLOTS", "0")
+    with hold_job_slots(1, extra=3) as num:
+        assert num == 4
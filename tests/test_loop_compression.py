@@ -0,0 +1,155 @@
+import os
+import tempfile
+import pytest
+import fault
+from fault.actions import Poke, Expect, Eval, Print, If, Step
+from fault.loop_compression import CompressedLoop, compress_actions
+from .common import TestByteCircuit, TestBasicClkCircuit
+
+
+def make_vector_tester(circ, values, bad_index=None):
+    tester = fault.Tester(circ)
+    for i, value in enumerate(values):
+        tester.circuit.I = value
+        tester.eval()
+        if i == bad_index:
+            value += 1
+        tester.circuit.O.expect(value)
+    return tester
+
+
+def test_compress_actions():
+    circ = TestByteCircuit
+    actions = [Print("start\n")]
+    for i in range(10):
+        actions += [Poke(circ.I, i), Eval(), Expect(circ.O, i)]
+    actions += [Poke(circ.I, 3), Eval()]
+    result = compress_actions(actions)
+    assert [i for i, _ in result] == [0, 1, 31, 32]
+    loop = result[1][1]
+    assert isinstance(loop, CompressedLoop)
+    assert loop.n_iter == 10
+    assert len(loop.body) == 3
+    assert loop.table == [[i, i] for i in range(10)]
+
+
+def test_compress_actions_constant_columns():
+    circ = TestBasicClkCircuit
+    actions = []
+    for i in range(8):
+        actions += [Poke(circ.I, 1), Eval(), Expect(circ.O, i % 2)]
+    loop = compress_actions(actions)[0][1]
+    # the poked value is the same in every iteration, so it stays inline
+    assert loop.body[0].value == 1
+    assert loop.table == [[i % 2] for i in range(8)]
+
+
+def test_compress_actions_constant_run():
+    circ = TestBasicClkCircuit
+    actions = []
+    for i in range(8):
+        actions += [Poke(circ.I, 1), Step(circ.CLK, 2)]
+    loop = compress_actions(actions)[0][1]
+    assert isinstance(loop, CompressedLoop)
+    assert loop.n_iter == 8
+    # nothing varies across iterations, so no table is needed
+    assert loop.table is None
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        target = fault.system_verilog_target.SystemVerilogTarget(
+            circ, directory=tempdir, simulator="ncsim", compress_loops=True)
+        src = target.generate_code(actions, {})
+    assert "fault_table_0" not in src
+    assert src.count("I <=") == 1
+
+
+def test_compress_actions_dont_care():
+    circ = TestByteCircuit
+    actions = []
+    for i in range(8):
+        value = fault.AnyValue if i % 3 == 0 else i
+        actions += [Poke(circ.I, i), Eval(), Expect(circ.O, value)]
+    loop = compress_actions(actions)[0][1]
+    assert isinstance(loop, CompressedLoop)
+    assert loop.n_iter == 8
+    # the expect is only checked in iterations where the care column is set
+    assert isinstance(loop.body[2], If)
+    assert loop.table == [[i, 0 if i % 3 == 0 else i, int(i % 3 != 0)]
+                          for i in range(8)]
+
+
+def test_compress_actions_short_runs():
+    circ = TestByteCircuit
+    actions = []
+    for i in range(3):
+        actions += [Poke(circ.I, i), Eval(), Expect(circ.O, i)]
+    assert [i for i, _ in compress_actions(actions)] == list(range(9))
+
+
+def test_verilator_compress_loops(capsys):
+    circ = TestByteCircuit
+    values = list(range(0, 256, 3))
+    tester = make_vector_tester(circ, values)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run("verilator", directory=tempdir,
+                               flags=["-Wno-fatal"], compress_loops=True)
+        with open(f"{tempdir}/{circ.name}_driver.cpp") as f:
+            src = f.read()
+        assert "fault_table_0" in src
+        assert src.count("top->I =") == 1
+
+    tester = make_vector_tester(circ, values, bad_index=20)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        with pytest.raises(AssertionError):
+            tester.compile_and_run("verilator", directory=tempdir,
+                                   flags=["-Wno-fatal"], compress_loops=True)
+    # the failing action is reported with its original index
+    assert "i        : 62" in capsys.readouterr().out
+
+
+def test_system_verilog_compress_loops():
+    circ = TestByteCircuit
+    tester = make_vector_tester(circ, range(8))
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        target = fault.system_verilog_target.SystemVerilogTarget(
+            circ, directory=tempdir, simulator="ncsim", compress_loops=True)
+        src = target.generate_code(tester.actions, {})
+    assert "logic [63:0] fault_table_0 [0:7][0:1]" in src
+    assert src.count("I <=") == 1
+    assert "Failed on action=%0d" in src
+
+
+def test_system_verilog_vector_files():
+    circ = TestByteCircuit
+    tester = make_vector_tester(circ, range(8))
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        target = fault.system_verilog_target.SystemVerilogTarget(
+            circ, directory=tempdir, simulator="ncsim", vector_files=True)
+        src = target.generate_code(tester.actions, {})
+        assert "logic [0:1][63:0] fault_table_0 [0:7];" in src
+        assert "$readmemh(" in src
+        with open(os.path.join(tempdir, "fault_table_0.hex")) as f:
+            lines = f.read().splitlines()
+    assert lines[3] == f"{3:016x}{3:016x}"
+    assert src.count("I <=") == 1
+    # the path is relative to the directory the simulator runs in
+    assert '$readmemh("fault_table_0.hex", fault_table_0);' in src
+
+    # vivado simulates in its project directory and needs the full path
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        target = fault.system_verilog_target.SystemVerilogTarget(
+            circ, directory=tempdir, simulator="vivado", vector_files=True)
+        src = target.generate_code(tester.actions, {})
+        path = os.path.join(os.path.realpath(tempdir), "fault_table_0.hex")
+    assert f'$readmemh("{path}", fault_table_0);' in src
+
+
+def test_system_verilog_vector_files_constant_run():
+    circ = TestByteCircuit
+    tester = make_vector_tester(circ, [5] * 8)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        target = fault.system_verilog_target.SystemVerilogTarget(
+            circ, directory=tempdir, simulator="ncsim", vector_files=True)
+        src = target.generate_code(tester.actions, {})
+        assert not os.path.exists(os.path.join(tempdir, "fault_table_0.hex"))
+    assert "$readmemh(" not in src
+    assert "fault_table_0" not in src
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import pytest
+import fault
+from .common import TestBasicClkCircuit, TestByteCircuit
+
+
+def make_tester(value, expected):
+    tester = fault.Tester(TestByteCircuit)
+    tester.circuit.I = value
+    tester.eval()
+    tester.circuit.O.expect(expected)
+    return tester
+
+
+def test_run_regression():
+    testers = [make_tester(i, i) for i in range(6)]
+    # a failing test does not stop the other tests
+    testers[3] = make_tester(3, 4)
+    get_value = testers[5].get_value(TestByteCircuit.O)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        results = fault.run_regression(testers, directory=tempdir,
+                                       flags=["-Wno-fatal"], max_workers=3)
+    assert [result.passed for result in results] == \
+        [True, True, True, False, True, True]
+    assert "Port     : O" in results[3].stderr
+    assert get_value.value == 5
+
+
+def test_run_regression_stimulus_files():
+    circ = TestBasicClkCircuit
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        files = []
+        for value in range(2):
+            tester = fault.Tester(circ, circ.CLK)
+            tester.circuit.I = value
+            tester.step(2)
+            tester.circuit.O.expect(value)
+            files.append(f"{tempdir}/test_{value}.bin")
+            fault.write_stimulus_file(circ, tester.actions, files[-1])
+        results = fault.run_regression(files, circuit=circ,
+                                       directory=tempdir,
+                                       flags=["-Wno-fatal"])
+    assert [result.name for result in results] == ["test_0", "test_1"]
+    assert all(result.passed for result in results)
+
+
+def test_run_regression_same_file_names():
+    circ = TestBasicClkCircuit
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        files = []
+        for value in range(2):
+            tester = fault.Tester(circ, circ.CLK)
+            tester.circuit.I = value
+            tester.step(2)
+            tester.circuit.O.expect(value)
+            tester.get_value(circ.O)
+            os.makedirs(f"{tempdir}/dir_{value}")
+            files.append(f"{tempdir}/dir_{value}/test.bin")
+            fault.write_stimulus_file(circ, tester.actions, files[-1])
+        results = fault.run_regression(files, circuit=circ,
+                                       directory=tempdir,
+                                       flags=["-Wno-fatal"])
+        # each test writes its own value file
+        values = []
+        for k in range(2):
+            with open(f"{tempdir}/regression/{k}_test_values.txt") as f:
+                values.append(f.read().split())
+    assert [result.name for result in results] == ["test", "test"]
+    assert all(result.passed for result in results)
+    assert values[0] != values[1]
+
+
+def test_run_regression_mismatched_circuits():
+    testers = [make_tester(0, 0), fault.Tester(TestBasicClkCircuit)]
+    with pytest.raises(ValueError):
+        fault.run_regression(testers)
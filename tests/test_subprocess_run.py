@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import pytest
+from fault.subprocess_run import subprocess_run, SubprocessRunError
+
+
+def python_cmd(src):
+    return [sys.executable, "-c", src]
+
+
+def test_abort_on_error_pattern():
+    start = time.time()
+    with pytest.raises(AssertionError):
+        subprocess_run(python_cmd(
+            "import time\n"
+            "print('ERROR: mismatch', flush=True)\n"
+            "time.sleep(30)\n"), err_str="ERROR")
+    assert time.time() - start < 10
+
+
+def test_stop_on_message():
+    start = time.time()
+    with pytest.raises(SubprocessRunError) as e:
+        subprocess_run(python_cmd(
+            "import time\n"
+            "print('Error: at time 10', flush=True)\n"
+            "print('mismatch 1', flush=True)\n"
+            "print('Error: at time 20', flush=True)\n"
+            "print('mismatch 2', flush=True)\n"
+            "time.sleep(30)\n"), err_str="Error", stop_str="mismatch",
+            max_errors=2)
+    assert time.time() - start < 10
+    # the process was stopped after the second message was received
+    assert e.value.result.stdout.splitlines()[-1] == "mismatch 2"
+
+
+def test_timeout():
+    start = time.time()
+    with pytest.raises(AssertionError):
+        subprocess_run(python_cmd("import time; time.sleep(30)"), timeout=1)
+    assert time.time() - start < 10
+
+
+def test_log_file(tmp_path):
+    log = tmp_path / "run.log"
+    result = subprocess_run(python_cmd(
+        "for i in range(10000): print(i)"), log_file=log, tail_lines=2)
+    # the full output is in the log, only its tail in memory
+    assert result.stdout == "9998\n9999"
+    with open(log) as f:
+        assert len(f.readlines()) == 10000
+
+
+def test_timeout_stops_shell_children():
+    # with shell=True, the command runs in a child of /bin/sh, which has to
+    # be stopped as well
+    with pytest.raises(SubprocessRunError) as e:
+        subprocess_run(["sh", "-c", "sleep 30 & echo $!; wait"], shell=True,
+                       timeout=1)
+    pid = int(e.value.result.stdout.splitlines()[-1])
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.1)
+    else:
+        assert False, "child of the shell is still running"
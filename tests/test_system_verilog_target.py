@@ -62,3 +62,135 @@ def test_waves(simulator, waveform_type, use_sva):
                                **kwargs)
         assert not os.path.exists(os.path.join(_dir,
                                                f"waveforms.{waveform_type}"))
+
+
+def test_reuse_snapshot():
+    if not shutil.which("iverilog"):
+        pytest.skip("Skipping snapshot test because iverilog is not "
+                    "available")
+    circ = TestBasicClkCircuit
+    tester = fault.Tester(circ, circ.CLK)
+    tester.circuit.I = 1
+    tester.step(2)
+    tester.circuit.O.expect(1)
+    # the files written by the test bench do not change its cache key
+    value = tester.get_value(circ.O)
+    with tempfile.TemporaryDirectory(dir=".") as cache_dir:
+        kwargs = dict(target="system-verilog", simulator="iverilog",
+                      reuse_snapshot=True, build_cache_dir=cache_dir,
+                      collect_failures=True)
+        with tempfile.TemporaryDirectory(dir=".") as _dir:
+            tester.compile_and_run(directory=_dir, **kwargs)
+            vvp = os.path.join(_dir, "fault_snapshot",
+                               f"{circ.name}_tb")
+            mtime = os.stat(vvp).st_mtime_ns
+            # same testbench, so the compiled design is run again as is
+            tester.compile_and_run(directory=_dir, **kwargs)
+            assert os.stat(vvp).st_mtime_ns == mtime
+
+        # a new build directory restores the design from the build cache
+        with tempfile.TemporaryDirectory(dir=".") as _dir:
+            tester.compile_and_run(directory=_dir, **kwargs)
+            vvp = os.path.join(_dir, "fault_snapshot", f"{circ.name}_tb")
+            assert os.stat(vvp).st_mtime_ns == mtime
+            assert value.value == 1
+
+
+def test_snapshot_keys_simulator_version(monkeypatch):
+    circ = TestBasicClkCircuit
+    with tempfile.TemporaryDirectory(dir=".") as _dir:
+        target = fault.system_verilog_target.SystemVerilogTarget(
+            circ, directory=_dir, simulator="ncsim", reuse_snapshot=True)
+        keys = []
+        for version in ["15.20-s012", "15.20-s084"]:
+            monkeypatch.setattr(fault.system_verilog_target, "tool_version",
+                                lambda tool: version)
+            keys.append(target.snapshot_keys([], []))
+    # snapshots compiled by another version of the simulator are not reused
+    assert keys[0][0] != keys[1][0]
+
+
+def test_shards():
+    if not shutil.which("iverilog"):
+        pytest.skip("Skipping shard test because iverilog is not available")
+    circ = TestBasicClkCircuit
+    tester = fault.Tester(circ, circ.CLK)
+    values = []
+    for k in range(3):
+        tester.shard()
+        for i in range(4):
+            tester.circuit.I = (k + i) % 2
+            tester.step(2)
+            values.append(tester.get_value(circ.O))
+    # fails in the last shard
+    tester.circuit.O.expect(0)
+    kwargs = dict(target="system-verilog", simulator="iverilog",
+                  collect_failures=True)
+    with tempfile.TemporaryDirectory(dir=".") as _dir:
+        with pytest.raises(fault.fault_errors.ExpectFailures) as expected:
+            tester.compile_and_run(directory=_dir, **kwargs)
+    with tempfile.TemporaryDirectory(dir=".") as _dir:
+        with pytest.raises(fault.fault_errors.ExpectFailures) as e:
+            tester.compile_and_run(directory=_dir, shard_jobs=2, **kwargs)
+        for k in range(3):
+            assert os.path.isdir(os.path.join(_dir, f"shard_{k}"))
+        assert os.path.isfile(os.path.join(_dir, "shards.log"))
+    # failures are reported as in a single simulation
+    assert [f.index for f in e.value.failures] == \
+        [f.index for f in expected.value.failures]
+    assert [v.value for v in values] == [(k + i) % 2 for k in range(3)
+                                         for i in range(4)]
+
+
+@pytest.mark.parametrize("max_errors", [1, 2, None])
+def test_max_errors(max_errors):
+    if not shutil.which("iverilog"):
+        pytest.skip("Skipping max_errors test because iverilog is not "
+                    "available")
+    circ = TestBasicClkCircuit
+    tester = fault.Tester(circ, circ.CLK)
+    for i in range(4):
+        tester.circuit.I = 0
+        tester.step(2)
+        tester.circuit.O.expect(1)
+    with tempfile.TemporaryDirectory(dir=".") as _dir:
+        with pytest.raises(fault.fault_errors.ExpectFailures) as e:
+            tester.compile_and_run(target="system-verilog",
+                                   simulator="iverilog", directory=_dir,
+                                   max_errors=max_errors)
+    failures = e.value.failures
+    assert len(failures) == (4 if max_errors is None else max_errors)
+    assert all((f.port, f.expected, f.got) == ("O", 1, 0) for f in failures)
+
+
+def test_dump_scope_and_windows():
+    circ = TestBasicClkCircuit
+    tester = fault.Tester(circ, circ.CLK)
+    tester.circuit.I = 0
+    tester.step(2)
+    tester.trace_off()
+    tester.step(10)
+    tester.trace_on()
+    tester.circuit.I = 1
+    tester.step(2)
+    with tempfile.TemporaryDirectory(dir=".") as _dir:
+        target = fault.system_verilog_target.SystemVerilogTarget(
+            circ, directory=_dir, simulator="ncsim", dump_waveforms=True,
+            dump_scope="inst0", dump_depth=1)
+        # dumping through TCL probes cannot be paused, so the test bench
+        # dumps the waveforms itself
+        src = target.generate_code(tester.actions, {})
+        assert "$dumpvars(1, dut.inst0);" in src
+        assert src.index("$dumpoff;") < src.index("$dumpon;")
+        with open(os.path.join(_dir, target.write_cadence_tcl())) as f:
+            assert "probe" not in f.read()
+
+        # without pauses, the scope is passed to the probe
+        target = fault.system_verilog_target.SystemVerilogTarget(
+            circ, directory=_dir, simulator="ncsim", dump_waveforms=True,
+            dump_scope="inst0", dump_depth=1)
+        src = target.generate_code(tester.actions[:3], {})
+        assert "$dumpvars" not in src
+        with open(os.path.join(_dir, target.write_cadence_tcl())) as f:
+            assert (f"probe -create {circ.name}_tb.dut.inst0 -all -vcd "
+                    f"-depth 1") in f.read()
@@ -633,6 +633,42 @@ def test_tester_file_io_chunk_size_4_little_endian(target, simulator):
                 assert file.read(4) == bytes([i, 0, 0, 0])
 
 
+def test_tester_file_io_bulk(target, simulator):
+    with tempfile.TemporaryDirectory(dir=".") as _dir:
+        test_file_in = (Path(_dir) / 'test_file_in.raw').resolve()
+        test_file_out = (Path(_dir) / 'test_file_out.raw').resolve()
+
+        # every byte of the chunks is significant (and some have the top bit
+        # set), so the bytes must be assembled in the right order
+        values = [0x80FF7F01 + 0x01010101 * i for i in range(64)]
+        with open(test_file_in, "wb") as file:
+            for value in values:
+                file.write(value.to_bytes(4, "little"))
+
+        circ = TestUInt32Circuit
+        tester = fault.Tester(circ)
+        tester.zero_inputs()
+        file_in = tester.file_open(str(test_file_in), "r", chunk_size=4)
+        file_out = tester.file_open(str(test_file_out), "w", chunk_size=4,
+                                    endianness="big")
+        loop = tester.loop(len(values))
+        loop.poke(circ.I, loop.file_read(file_in))
+        loop.eval()
+        loop.file_write(file_out, circ.O)
+        tester.file_close(file_in)
+        tester.file_close(file_out)
+
+        if target == "verilator":
+            tester.compile_and_run(target, directory=_dir, flags=["-Wno-fatal"])
+        else:
+            tester.compile_and_run(target, directory=_dir, simulator=simulator,
+                                   magma_opts={"sv": True})
+
+        with open(test_file_out, "rb") as file:
+            for value in values:
+                assert file.read(4) == value.to_bytes(4, "big")
+
+
 def test_tester_while(target, simulator):
     circ = TestArrayCircuit
     tester = fault.Tester(circ)
@@ -1,3 +1,5 @@
+import operator
+import tempfile
 from fault import PythonTester
 from ..common import AndCircuit, SimpleALU, TestTupleCircuit, \
     TestNestedArraysCircuit, TestNestedArrayTupleCircuit
@@ -83,3 +85,47 @@ def test_tester_nested_array_tuple():
     tester.poke(TestNestedArrayTupleCircuit.I, val)
     tester.eval()
     tester.expect(TestNestedArrayTupleCircuit.O, val)
+
+
+def test_interactive_verilator_clock():
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester = PythonTester(SimpleALU, SimpleALU.CLK, backend="verilator",
+                              backend_opts={"directory": tempdir,
+                                            "flags": ["-Wno-fatal"]})
+        tester.circuit.a = 0xDEAD
+        tester.circuit.b = 0xBEEF
+        tester.circuit.CLK = 0
+        for i, op in enumerate([operator.add, operator.sub, operator.mul]):
+            tester.circuit.config_data = i
+            tester.circuit.config_en = 1
+            tester.step(2)
+            tester.circuit.c.expect(op(BitVector[16](0xDEAD),
+                                       BitVector[16](0xBEEF)))
+        assert tester.peek(SimpleALU.c[0]) == 1
+        tester.simulator.close()
+
+
+def test_interactive_verilator_counter():
+    Counter4 = DefineCounter(4)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester = PythonTester(Counter4, Counter4.CLK, backend="verilator",
+                              backend_opts={"directory": tempdir,
+                                            "flags": ["-Wno-fatal"]})
+        tester.CLK = 0
+        tester.wait_until_high(Counter4.O[3])
+        tester.circuit.O.expect(1 << 3)
+        tester.wait_until_low(Counter4.O[3])
+        tester.circuit.O.expect(0)
+        tester.simulator.close()
+
+
+def test_interactive_verilator_nested_array_tuple():
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester = PythonTester(TestNestedArrayTupleCircuit,
+                              backend="verilator",
+                              backend_opts={"directory": tempdir})
+        val = (BitVector.random(4), BitVector.random(4))
+        tester.poke(TestNestedArrayTupleCircuit.I, val)
+        tester.eval()
+        tester.expect(TestNestedArrayTupleCircuit.O, val)
+        tester.simulator.close()
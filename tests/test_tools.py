@@ -0,0 +1,45 @@
+import os
+import pytest
+import fault
+import fault.tools
+import fault.verilator_utils
+from fault.user_cfg import FaultConfig
+
+
+def test_tool_versions_cached(monkeypatch):
+    fault.tools.clear_tool_cache()
+    versions = fault.tool_versions()
+    assert set(versions) == set(fault.tools.TOOL_VERSION_PROBES)
+
+    # installed tools are not probed again
+    def fail(*args, **kwargs):
+        raise AssertionError("tool probed twice")
+    monkeypatch.setattr(fault.tools, "subprocess_run", fail)
+    assert fault.tool_versions() == versions
+
+
+def test_config_file_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open("fault.yml", "w") as f:
+        f.write("add_env_vars:\n  FAULT_TEST_VAR: 1\n")
+    assert FaultConfig().get_sim_env()["FAULT_TEST_VAR"] == "1"
+
+    # changes to the file are picked up once its mtime changes
+    with open("fault.yml", "w") as f:
+        f.write("add_env_vars:\n  FAULT_TEST_VAR: 2\n")
+    mtime = os.stat("fault.yml").st_mtime_ns
+    os.utime("fault.yml", ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+    assert FaultConfig().get_sim_env()["FAULT_TEST_VAR"] == "2"
+
+
+def test_verilator_version_errors(monkeypatch):
+    monkeypatch.setattr(fault.verilator_utils, "tool_version",
+                        lambda tool, disp_type: None)
+    monkeypatch.setattr(fault.verilator_utils, "which", lambda tool: None)
+    with pytest.raises(FileNotFoundError):
+        fault.verilator_utils.verilator_version()
+    # installed, but printing an unexpected version string
+    monkeypatch.setattr(fault.verilator_utils, "which",
+                        lambda tool: "/usr/bin/verilator")
+    with pytest.raises(ValueError):
+        fault.verilator_utils.verilator_version()
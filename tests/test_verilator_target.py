@@ -1,11 +1,13 @@
 import tempfile
+import pytest
 import magma as m
 import fault
 from hwtypes import BitVector
 from fault.actions import Poke, Expect, Eval, Step, Print, Peek
 from fault.tester import Tester
 import os.path
-from .common import TestBasicCircuit, TestBasicClkCircuit
+from .common import (TestBasicCircuit, TestBasicClkCircuit,
+                     TestUInt128Circuit, SimpleALU)
 
 
 def test_verilator_peeks():
@@ -70,3 +72,285 @@ def test_verilator_trace():
         target.run(actions)
         assert os.path.isfile(f"{tempdir}/logs/BasicClkCircuit.vcd"), \
             "Expected VCD to exist"
+
+
+def test_verilator_build_cache():
+    circ = TestBasicClkCircuit
+    tester = Tester(circ, circ.CLK)
+    tester.poke(circ.I, 1)
+    tester.step(2)
+    tester.expect(circ.O, 1)
+    flags = ["-Wno-lint"]
+    with tempfile.TemporaryDirectory(dir=".") as cache_dir:
+        with tempfile.TemporaryDirectory(dir=".") as tempdir:
+            tester.compile_and_run(target="verilator", directory=tempdir,
+                                   flags=flags, use_build_cache=True,
+                                   build_cache_dir=cache_dir)
+            obj_filename = os.path.join(tempdir, "obj_dir",
+                                        "VBasicClkCircuit__ALL.a")
+            mtime = os.path.getmtime(obj_filename)
+
+        # a fresh build of the same design should reuse the cached model
+        with tempfile.TemporaryDirectory(dir=".") as tempdir:
+            tester.compile_and_run(target="verilator", directory=tempdir,
+                                   flags=flags, use_build_cache=True,
+                                   build_cache_dir=cache_dir)
+            obj_filename = os.path.join(tempdir, "obj_dir",
+                                        "VBasicClkCircuit__ALL.a")
+            assert os.path.getmtime(obj_filename) == mtime
+
+        # changing the verilator flags results in a new cache entry
+        with tempfile.TemporaryDirectory(dir=".") as tempdir:
+            tester.compile_and_run(target="verilator", directory=tempdir,
+                                   flags=flags + ["-Wno-fatal"],
+                                   use_build_cache=True,
+                                   build_cache_dir=cache_dir)
+        assert len(os.listdir(os.path.join(cache_dir, "verilator"))) == 2
+
+
+def test_verilator_data_driven():
+    circ = TestUInt128Circuit
+    flags = ["-Wno-lint"]
+
+    def make_tester(value):
+        tester = Tester(circ)
+        tester.circuit.I = value
+        tester.eval()
+        tester.circuit.O.expect(value)
+        tester.circuit.O[3].expect((value >> 3) & 1)
+        tester.print("O[0]=%d\n", circ.O[0])
+        get_value = tester.get_value(circ.O)
+        return tester, get_value
+
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        value = (1 << 127) | 0xDEADBEEF
+        tester, get_value = make_tester(value)
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=flags, data_driven=True)
+        assert get_value.value == value
+        log = os.path.join(tempdir, "obj_dir", "UInt128Circuit.log")
+        with open(log) as f:
+            assert "O[0]=1" in f.read()
+        exe = os.path.join(tempdir, "obj_dir", "VUInt128Circuit")
+        mtime = os.path.getmtime(exe)
+
+        # a different stimulus reuses the compiled driver
+        tester, get_value = make_tester(0xCAFE)
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=flags, data_driven=True,
+                               skip_compile=True, skip_verilator=True)
+        assert get_value.value == 0xCAFE
+        assert os.path.getmtime(exe) == mtime
+
+        tester = Tester(circ)
+        tester.circuit.I = 1
+        tester.eval()
+        tester.circuit.O.expect(2)
+        with pytest.raises(AssertionError):
+            tester.compile_and_run(target="verilator", directory=tempdir,
+                                   flags=flags, data_driven=True,
+                                   skip_compile=True, skip_verilator=True)
+
+
+def test_verilator_driver_chunks():
+    circ = TestBasicClkCircuit
+    tester = Tester(circ, circ.CLK)
+    for i in range(10):
+        tester.poke(circ.I, i % 2)
+        tester.step(2)
+        tester.expect(circ.O, i % 2)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=["-Wno-lint"], driver_chunk_size=8)
+        # 31 actions (including the clock initialization) in 4 chunks
+        for k in range(1, 5):
+            obj = f"BasicClkCircuit_driver_{k}.o"
+            assert os.path.isfile(os.path.join(tempdir, "obj_dir", obj))
+        assert not os.path.isfile(
+            os.path.join(tempdir, "BasicClkCircuit_driver_5.cpp"))
+
+        tester.expect(circ.O, 0)
+        with pytest.raises(AssertionError):
+            tester.compile_and_run(target="verilator", directory=tempdir,
+                                   flags=["-Wno-lint"], driver_chunk_size=8)
+
+
+def test_verilator_checkpoint_restore():
+    circ = SimpleALU
+    # preamble: configure the ALU to subtract, then save the state
+    tester = Tester(circ, circ.CLK)
+    tester.circuit.config_data = 1
+    tester.circuit.config_en = 1
+    tester.step(2)
+    tester.checkpoint("configured.ckpt")
+
+    # start from the saved configuration instead of replaying the preamble
+    warm_tester = Tester(circ, circ.CLK)
+    warm_tester.restore("configured.ckpt")
+    warm_tester.circuit.a = 5
+    warm_tester.circuit.b = 3
+    warm_tester.eval()
+    warm_tester.circuit.c.expect(2)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=["-Wno-fatal"], savable=True)
+        assert os.path.isfile(os.path.join(tempdir, "configured.ckpt"))
+        warm_tester.compile_and_run(target="verilator", directory=tempdir,
+                                    flags=["-Wno-fatal"], savable=True)
+
+        with pytest.raises(ValueError):
+            warm_tester.compile_and_run(target="verilator",
+                                        directory=tempdir,
+                                        flags=["-Wno-fatal"])
+
+
+def test_verilator_pgo():
+    circ = TestBasicClkCircuit
+    training = Tester(circ, circ.CLK)
+    for i in range(100):
+        training.poke(circ.I, i % 2)
+        training.step(2)
+    tester = Tester(circ, circ.CLK)
+    tester.poke(circ.I, 1)
+    tester.step(2)
+    tester.expect(circ.O, 1)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=["-Wno-lint"], pgo_training=training)
+        obj_dir = os.path.join(tempdir, "obj_dir")
+        profiles = [name for name in os.listdir(obj_dir)
+                    if name.endswith(".gcda")]
+        # only the profile of the model is kept
+        assert profiles
+        assert not any(name.startswith("BasicClkCircuit_driver")
+                       for name in profiles)
+
+
+def test_verilator_threads_auto():
+    circ = TestBasicClkCircuit
+    tuning = Tester(circ, circ.CLK)
+    for i in range(100):
+        tuning.poke(circ.I, i % 2)
+        tuning.step(2)
+    tester = Tester(circ, circ.CLK)
+    tester.poke(circ.I, 1)
+    tester.step(2)
+    tester.expect(circ.O, 1)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=["-Wno-lint"], threads="auto",
+                               thread_tuning_actions=tuning,
+                               thread_counts=[1, 2])
+        record = os.path.join(tempdir, "verilator_threads.json")
+        assert os.path.isfile(record)
+        mtime = os.path.getmtime(record)
+        # the recorded choice is reused
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=["-Wno-lint"], threads="auto",
+                               thread_tuning_actions=tuning,
+                               thread_counts=[1, 2])
+        assert os.path.getmtime(record) == mtime
+
+
+@pytest.mark.parametrize("trace_format", ["vcd", "fst"])
+def test_verilator_trace_window(trace_format):
+    circ = TestBasicClkCircuit
+    tester = Tester(circ, circ.CLK)
+    tester.trace_off()
+    for i in range(20):
+        if i == 16:
+            tester.trace_on()
+        tester.poke(circ.I, i % 2)
+        tester.step(2)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=["-Wno-lint", "--trace"],
+                               trace_format=trace_format, trace_depth=1)
+        waveform = f"{tempdir}/logs/BasicClkCircuit.{trace_format}"
+        assert os.path.isfile(waveform)
+        if trace_format == "vcd":
+            with open(waveform) as f:
+                times = [line for line in f if line.startswith("#")]
+            # only the last 4 iterations (and the final dump) are traced
+            assert len(times) <= 4 * 3 + 1
+
+
+def test_verilator_step_loop():
+    circ = TestBasicClkCircuit
+    tester = Tester(circ, circ.CLK)
+    tester.poke(circ.I, 1)
+    tester.step(100000)
+    tester.expect(circ.O, 1)
+    # O does not change while the clock toggles, so all steps are run
+    tester.poke(circ.I, 0)
+    tester.step(100000, watch=circ.O)
+    tester.expect(circ.O, 0)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=["-Wno-lint"])
+        driver = os.path.join(tempdir, "BasicClkCircuit_driver.cpp")
+        with open(driver) as f:
+            assert len(f.readlines()) < 200
+
+
+def test_verilator_step_watch():
+    class Counter(m.Circuit):
+        io = m.IO(count=m.Out(m.UInt[3])) + m.ClockIO()
+        count = m.Register(m.UInt[3])()
+        io.count @= count(count.O + 1)
+
+    tester = Tester(Counter, Counter.CLK)
+    # count changes on the first rising edge, which stops the step
+    tester.step(100, watch=Counter.count)
+    tester.expect(Counter.count, 1)
+    # only changes of the watched bit stop the step
+    tester.step(100, watch=Counter.count[2])
+    tester.expect(Counter.count, 4)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=["-Wno-lint"])
+
+
+def test_verilator_wide_expect(capsys):
+    circ = TestUInt128Circuit
+    value = (0x0123456789ABCDEF << 64) | 0xFEDCBA9876543210
+    tester = Tester(circ)
+    tester.circuit.I = value
+    tester.eval()
+    tester.circuit.O.expect(value)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=["-Wno-lint"])
+        driver = os.path.join(tempdir, "UInt128Circuit_driver.cpp")
+        with open(driver) as f:
+            # one assert per expect, regardless of the width of the port
+            assert f.read().count("if (!(") == 1
+
+        tester.circuit.O.expect(value ^ 1)
+        with pytest.raises(AssertionError):
+            tester.compile_and_run(target="verilator", directory=tempdir,
+                                   flags=["-Wno-lint"])
+    out = capsys.readouterr().out
+    assert "0x123456789abcdeffedcba9876543211" in out
+
+
+def test_magma_cache():
+    circ = TestBasicClkCircuit
+    tester = Tester(circ, circ.CLK)
+    tester.poke(circ.I, 1)
+    tester.step(2)
+    tester.expect(circ.O, 1)
+    with tempfile.TemporaryDirectory(dir=".") as cache_dir:
+        with tempfile.TemporaryDirectory(dir=".") as tempdir:
+            tester.compile_and_run(target="verilator", directory=tempdir,
+                                   flags=["-Wno-lint"], use_magma_cache=True,
+                                   build_cache_dir=cache_dir)
+        assert len(os.listdir(os.path.join(cache_dir, "magma"))) == 1
+
+        # the generated Verilog is restored instead of compiled again
+        with tempfile.TemporaryDirectory(dir=".") as tempdir:
+            tester.compile_and_run(target="verilator", directory=tempdir,
+                                   flags=["-Wno-lint"], use_magma_cache=True,
+                                   build_cache_dir=cache_dir)
+            assert os.path.isfile(os.path.join(tempdir, "BasicClkCircuit.v"))
+        assert len(os.listdir(os.path.join(cache_dir, "magma"))) == 1